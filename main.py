@@ -1,16 +1,49 @@
+import time
+_inicio = time.perf_counter() # antes das importacoes do hub, para medir a inicializacao inteira
+import argparse
 import os
 from smart_home.core.cli import CLI
 from smart_home.core.hub import SmartHomeHub
+_importado = time.perf_counter()
+
+# Fases de CLI.metricas_inicio, na ordem em que acontecem
+FASES_INICIO = [
+    ('hub', 'hub (logger e observers)'),
+    ('leitura', 'leitura da configuracao'),
+    ('classes', 'classes de dispositivos (FSM e esquemas)'),
+    ('dispositivos', 'criacao dos dispositivos'),
+    ('estados', 'estados iniciais (FSM)'),
+    ('notificacao', 'notificacao dos observers'),
+]
+
+def mostrar_perfil_inicio(cli, pronto: float):
+    # Tempo de cada fase ate o menu; as que nao aconteceram (ex.: sem configuracao) ficam de fora
+    fases = [('importacao dos modulos', _importado - _inicio)]
+    fases += [(rotulo, cli.metricas_inicio[fase]) for fase, rotulo in FASES_INICIO if fase in cli.metricas_inicio]
+    print("\n--- Perfil de inicializacao ---")
+    for rotulo, segundos in fases:
+        print(f"{rotulo:<42} {segundos * 1e3:8.1f}ms")
+    print(f"{'total ate o menu':<42} {(pronto - _inicio) * 1e3:8.1f}ms")
+
 def main():
-    # Define o caminho padrão para o arquivo de configuração JSON
-    config_path = os.path.join('data', 'configuracao.log.json')
-    
+    parser = argparse.ArgumentParser(description="Smart Home Hub CLI")
+    parser.add_argument('--config', type=str, default=os.path.join('data', 'configuracao.log.json'),
+                        help='Caminho para o arquivo de configuracao JSON.')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Mostra o tempo de cada fase da inicializacao antes do menu.')
+    parser.add_argument('--fast-start', action='store_true',
+                        help='Cria cada dispositivo (e a FSM dele) so no primeiro uso.')
+    args = parser.parse_args()
+
     # Garante que o diretório 'data' existe
-    os.makedirs(os.path.dirname(config_path), exist_ok=True)
-    
+    os.makedirs(os.path.dirname(args.config) or '.', exist_ok=True)
+    os.makedirs('data', exist_ok=True) # log de eventos e observers
+
     # Cria a instância da CLI passando o caminho da configuração
-    cli = CLI(config_path)
-    
+    cli = CLI(args.config, inicio_rapido=args.fast_start)
+    if args.profile_startup:
+        mostrar_perfil_inicio(cli, time.perf_counter())
+
     # Executa o principal da CLI
     cli.run()
 if __name__ == '__main__':
@@ -1,8 +1,13 @@
-from .dispositivos import Dispositivo, TipoDispositivo, ValidacaoAtributo
-from .hub import Hub
+from .dispositivos import Dispositivo, TipoDispositivo, ValidacaoAtributo, TabelaComandos
+from .hub import SmartHomeHub
 from .cli import CLI
-from .erros import SmartHomeError, TransicaoInvalida, ConfigInvalida, ValidacaoAtributo
-from .eventos import Evento, EventoDispositivo, EventoHub
-from .logger import Logger
-from .observers import Observer, ConsoleObserver, FileObserver  
+from .erros import SmartHomeError, TransicaoInvalida, ConfigInvalida, ValidacaoAtributo, ComandoInvalido
+from .eventos import Evento, EventoDispositivo, EventoHub, EventoLote
+from .logger import Logger, Durabilidade, FormatoLog
+from .segmentos import Particao
+from .registro import RegistroTipos, registrar_tipo, classe_do_tipo
+from .relatorios import BackendRelatorios
+from .cache_relatorios import CacheRelatorios
+from .exportacao import ExportadorRelatorios
+from .observers import Observer, ObserverAssincrono, ConsoleObserver, FileObserver  
 from .dispositivos import Dispositivo, TipoDispositivo, ValidacaoAtributo
\ No newline at end of file
@@ -0,0 +1,143 @@
+# cache dos resultados de relatorios
+import sys
+from collections import OrderedDict
+from threading import Lock
+
+
+def _tamanho(obj) -> int:
+    """Estimativa em bytes da memoria de um resultado (dicts, listas e valores simples)."""
+    tamanho = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        tamanho += sum(_tamanho(chave) + _tamanho(valor) for chave, valor in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        tamanho += sum(_tamanho(item) for item in obj)
+    return tamanho
+
+
+class CacheRelatorios:
+    """Cache LRU de resultados de relatorios, limitado em entradas e em bytes.
+
+    As entradas valem para uma assinatura do log e do conjunto de
+    dispositivos (ver SmartHomeHub._assinatura_relatorios); quando ela muda,
+    todas sao descartadas. Cada entrada guarda tambem os ids dos dispositivos
+    cujos atributos ela leu: invalidar_dispositivos descarta so as que leram
+    algum dos alterados. Resultados que dependem do instante atual (intervalos ainda
+    abertos) sao guardados como uma funcao que os recalcula sem reler o log.
+    Os resultados sao compartilhados entre as chamadas: nao devem ser alterados.
+    """
+    def __init__(self, max_entradas: int = 128, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict() # {chave: (resultado, recalcular ou None, tamanho, ids lidos)}
+        self._assinatura = None
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0     # entradas descartadas pelo LRU
+        self.invalidacoes = 0 # vezes em que a assinatura mudou com entradas guardadas
+        self.descartes_alteracao = 0 # entradas descartadas por invalidar_dispositivos
+        self._lock = Lock()
+
+    def _invalidar(self, assinatura):
+        if self._entradas:
+            self.invalidacoes += 1
+        self._entradas.clear()
+        self.bytes = 0
+        self._assinatura = assinatura
+
+    def obter(self, chave, assinatura):
+        """Resultado guardado para a chave com esta assinatura, ou None."""
+        with self._lock:
+            if assinatura != self._assinatura:
+                self._invalidar(assinatura)
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.faltas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+        resultado, recalcular, _, _ = entrada
+        return recalcular() if recalcular is not None else resultado
+
+    def guardar(self, chave, assinatura, resultado, recalcular=None, dispositivos: frozenset = frozenset()):
+        """Guarda o resultado (e, se ele depende do instante, a funcao que o refaz) e remove os menos usados.
+
+        `dispositivos` sao os ids cujos atributos o resultado leu (ver invalidar_dispositivos).
+        """
+        tamanho = _tamanho(resultado)
+        with self._lock:
+            if assinatura != self._assinatura:
+                self._invalidar(assinatura)
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            if tamanho <= self.max_bytes: # maior que o limite inteiro: nem guarda
+                self._entradas[chave] = (resultado, recalcular, tamanho, dispositivos)
+                self.bytes += tamanho
+            while len(self._entradas) > self.max_entradas or self.bytes > self.max_bytes:
+                _, (_, _, removido, _) = self._entradas.popitem(last=False)
+                self.bytes -= removido
+                self.remocoes += 1
+
+    def invalidar_dispositivos(self, dev_ids):
+        """Descarta so as entradas que leram atributos de algum destes dispositivos."""
+        with self._lock:
+            for chave, (_, _, tamanho, lidos) in list(self._entradas.items()):
+                if not lidos.isdisjoint(dev_ids):
+                    del self._entradas[chave]
+                    self.bytes -= tamanho
+                    self.descartes_alteracao += 1
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+            self._assinatura = None
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'remocoes': self.remocoes,
+                'invalidacoes': self.invalidacoes,
+                'descartes_alteracao': self.descartes_alteracao,
+                'entradas': len(self._entradas),
+                'bytes': self.bytes,
+            }
+
+
+# benchmark: consultas repetidas de um painel
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import time
+    from smart_home.core.dispositivos import TipoDispositivo
+    from smart_home.core.hub import SmartHomeHub
+    from smart_home.core.logger import Logger
+    from smart_home.core.relatorios import EstadoRelatorios
+
+    with tempfile.TemporaryDirectory() as pasta:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        hub = SmartHomeHub()
+        hub.observers = []
+        hub.estado_relatorios = EstadoRelatorios(None)
+        for i in range(50):
+            hub.adicionar_dispositivo(f"tomada_{i}", TipoDispositivo.TOMADA, f"Tomada {i}", {'potencia_w': 100 + i})
+        hub.logger.log_events([(f"tomada_{i % 50}", 'ligar' if i % 100 < 50 else 'desligar', 'off', 'on', True, '')
+                               for i in range(100_000)])
+        for cache in (None, CacheRelatorios()):
+            hub.cache_relatorios = cache
+            t = time.perf_counter()
+            hub.gerar_todos_relatorios()
+            primeira = time.perf_counter() - t
+            n = 1000
+            t = time.perf_counter()
+            for _ in range(n):
+                hub.gerar_todos_relatorios()
+            repetida = (time.perf_counter() - t) / n
+            print(f"{'com cache' if cache else 'sem cache':>9}: primeira {primeira * 1e3:.1f}ms | "
+                  f"repetida {repetida * 1e6:.1f}us")
+        print(hub.cache_relatorios.estatisticas())
@@ -1,18 +1,39 @@
 import argparse
+import time
+from datetime import datetime
 from smart_home.core.hub import SmartHomeHub
+from .exportacao import ExportadorRelatorios
 from .persistencia import Persistencia
-from .erros import TransicaoInvalida, ValidacaoAtributo, ConfigInvalida
-from smart_home.dispositivos import Dispositivo, TipoDispositivo, ValidacaoAtributo
+from .registro import TIPOS
+from .erros import TransicaoInvalida, ValidacaoAtributo, ConfigInvalida, ComandoInvalido
+from .dispositivos import Dispositivo, TipoDispositivo
 class CLI:
-    def __init__(self, config_path):
+    def __init__(self, config_path, atraso_salvamento: float = None, inicio_rapido: bool = False):
+        # inicio_rapido=True so guarda os dados de cada dispositivo na carga: o objeto e a FSM
+        # dele sao criados no primeiro uso (SmartHomeHub com sob_demanda=True)
+        inicio = time.perf_counter()
         self.persistencia = Persistencia(config_path)
-        self.hub = SmartHomeHub()
+        self.hub = SmartHomeHub(sob_demanda=inicio_rapido)
+        self.exportador = ExportadorRelatorios(self.hub)
+        self.metricas_inicio = {'hub': time.perf_counter() - inicio} # tempos de cada fase da inicializacao (segundos)
         self._carregar_configuracao()
+        # Com atraso_salvamento (segundos), as alteracoes sao salvas sozinhas depois desse tempo sem mudancas
+        if atraso_salvamento is not None:
+            self.hub.ativar_salvamento_automatico(self.persistencia, atraso_salvamento)
 
     def _carregar_configuracao(self):
         try:
+            inicio = time.perf_counter()
             config = self.persistencia.carregar_configuracao()
+            lido = time.perf_counter()
+            importacao = TIPOS.tempo_importacao
             self.hub.carregar_configuracao(config)
+            # A carga inclui a importacao dos modulos de tipos ainda nao usados, medida a parte
+            importacao = TIPOS.tempo_importacao - importacao
+            carga = self.hub.metricas_carga
+            self.metricas_inicio.update(leitura=lido - inicio, classes=importacao,
+                                        dispositivos=carga['dispositivos'] - importacao,
+                                        estados=carga['estados'], notificacao=carga['notificacao'])
             print(f"Configuracao carregada de {self.persistencia.config_path}")
         except FileNotFoundError:
             print(f"Arquivo de configuracao '{self.persistencia.config_path}' nao encontrado. Iniciando com configuracao vazia.")
@@ -21,8 +42,8 @@ class CLI:
 
     def _salvar_configuracao(self):
         try:
-            config = self.hub.obter_configuracao()
-            self.persistencia.salvar_configuracao(config)
+            # So os dispositivos e rotinas alterados desde o ultimo salvamento sao serializados de novo
+            self.persistencia.salvar_alteracoes(self.hub)
             print("Configuracao salva.")
         except Exception as e:
             print(f"Erro ao salvar configuracao: {e}")
@@ -42,9 +63,10 @@ class CLI:
             print(f"\n--- Detalhes do Dispositivo: {device.nome} ({device.id}) ---")
             print(f"Tipo: {device.tipo.name}")
             print(f"Estado: {device.estado}")
-            if hasattr(device, 'atributos') and device.atributos:
+            atributos = device.esquema.codificar(device)
+            if atributos:
                 print("Atributos:")
-                for attr, value in device.atributos.items():
+                for attr, value in atributos.items():
                     print(f"  - {attr}: {value}")
             if hasattr(device, 'tentativas_invalidas'): # Porta
                 print(f"  - Tentativas invalidas: {device.tentativas_invalidas}")
@@ -54,33 +76,60 @@ class CLI:
         else:
             print(f"Dispositivo com ID '{dev_id}' nao encontrado.")
 
+    @staticmethod
+    def _ler_com_opcoes(prompt: str, opcoes) -> str:
+        """input() com TAB completando entre `opcoes`, quando o readline existe (nao no Windows)."""
+        try:
+            import readline # importado so aqui, para nao pesar na inicializacao
+        except ImportError:
+            return input(prompt).strip()
+        opcoes = list(opcoes)
+        def completar(texto, indice):
+            candidatos = [opcao for opcao in opcoes if opcao.startswith(texto)]
+            return candidatos[indice] if indice < len(candidatos) else None
+        anterior = readline.get_completer()
+        readline.set_completer(completar)
+        readline.parse_and_bind('tab: complete')
+        try:
+            return input(prompt).strip()
+        finally:
+            readline.set_completer(anterior)
+
     def _executar_comando(self):
-        dev_id = input("ID do dispositivo: ").strip()
-        comando = input("Comando: ").strip()
-        args_str = input("Argumentos (k=v separados por espaco) ou ENTER: ").strip()
+        dev_id = self._ler_com_opcoes("ID do dispositivo: ", self.hub.dispositivos)
+        device = self.hub.dispositivos.get(dev_id) # no modo sob demanda, ainda sem criar o dispositivo
+        if not device:
+            print(f"Dispositivo com ID '{dev_id}' nao encontrado.")
+            return
+        # Comandos, estados validos e argumentos vem da tabela de comandos da classe
+        tabela = device.comandos
+        disponiveis = tabela.disponiveis(device)
+        print(f"Comandos no estado '{device.estado}': {', '.join(disponiveis) or 'nenhum'}")
+        comando = self._ler_com_opcoes("Comando: ", tabela.nomes())
+        info = tabela.get(comando)
+        if info is None:
+            print(f"Comando '{comando}' nao disponivel para o dispositivo '{dev_id}'.")
+            return
         args = {}
-        if args_str:
+        # Fora dos estados validos nao ha o que perguntar: o hub recusa o comando pelo estado
+        for argumento in info.argumentos.values() if comando in disponiveis else ():
+            opcional = '' if argumento.obrigatorio else ', ENTER = padrao'
+            texto = input(f"{argumento.nome} ({argumento.descricao()}{opcional}): ").strip()
+            if not texto and not argumento.obrigatorio:
+                continue
             try:
-                args = dict(item.split("=") for item in args_str.split())
-                # Tentar converter valores para tipos apropriados (int, float, bool)
-                for k, v in args.items():
-                    if v.isdigit():
-                        args[k] = int(v)
-                    elif v.replace('.', '', 1).isdigit():
-                        args[k] = float(v)
-                    elif v.lower() in ['true', 'false']:
-                        args[k] = v.lower() == 'true'
+                args[argumento.nome] = argumento.converter(texto)
             except ValueError:
-                print("Formato de argumentos invalido. Use 'chave=valor'.")
+                print(f"Valor '{texto}' invalido para o argumento '{argumento.nome}'.")
                 return
 
         try:
             self.hub.executar_comando(dev_id, comando, **args)
             print(f"[EVENTO] ComandoExecutado: {{'id': '{dev_id}', 'comando': '{comando}', 'args': {args}}}")
-        except TransicaoInvalida as e:
+        except (TransicaoInvalida, ComandoInvalido) as e:
             print(f"Erro: {e}")
-        except AttributeError:
-            print(f"Comando '{comando}' nao disponivel para o dispositivo '{dev_id}'.")
+        except ValidacaoAtributo as e:
+            print(f"Erro de validacao: {e}")
         except Exception as e:
             print(f"Erro inesperado ao executar comando: {e}")
 
@@ -96,7 +145,9 @@ class CLI:
 
         try:
             # Tentar converter o valor para o tipo correto
-            if hasattr(device, atributo):
+            if atributo in device.esquema.atributos or atributo in device.esquema.validadores:
+                valor = device.esquema.converter_texto(atributo, valor_str)
+            elif hasattr(device, atributo):
                 current_value = getattr(device, atributo)
                 if isinstance(current_value, int):
                     valor = int(valor_str)
@@ -110,6 +161,7 @@ class CLI:
                 valor = valor_str # Se o atributo não existe ainda, assume string ou tenta inferir
 
             setattr(device, atributo, valor)
+            self.hub.marcar_alterado(dev_id)
             print(f"Atributo '{atributo}' do dispositivo '{dev_id}' alterado para '{valor}'.")
         except ValidacaoAtributo as e:
             print(f"Erro de validacao: {e}")
@@ -130,6 +182,47 @@ class CLI:
         except Exception as e:
             print(f"Erro inesperado ao executar rotina: {e}")
 
+    def _imprimir_relatorio(self, nome: str, relatorio):
+        if nome == 'consumo_tomadas':
+            print("\n--- Relatorio de Consumo por Tomada ---")
+            for item in relatorio:
+                print(f"ID: {item['id_dispositivo']}, Consumo Total: {item['total_wh']:.2f} Wh")
+        elif nome == 'tempo_luz_ligada':
+            print("\n--- Relatorio de Tempo de Luz Ligada ---")
+            for item in relatorio:
+                print(f"ID: {item['id_dispositivo']}, Tempo Ligado: {item['tempo_total_horas']:.2f} horas")
+        elif nome == 'tempo_tocando_caixa_som':
+            print("\n--- Relatorio de Tempo de Caixa de Som ---")
+            for item in relatorio:
+                print(f"ID: {item['id_dispositivo']}, Tempo Tocando: {item['tempo_total_segundos'] / 3600:.2f} horas")
+        elif nome == 'modos_ar_condicionado':
+            print("\n---  Relatorio de Modos de Ar Condicionado ---")
+            if relatorio:
+                for modo, count in relatorio.items():
+                    print(f"Modo: {modo}, Usos: {count}")
+            else:
+                print("Nenhum dado de modos de ar condicionado encontrado.")
+        elif nome == 'temperatura_media_termostato':
+            print("\n--- Relatorio de Temperatura Media de Termostato ---")
+            if relatorio['temperatura_media'] is not None:
+                print(f"Temperatura Média: {relatorio['temperatura_media']:.2f}°C")
+            else:
+                print("Nenhum termostato encontrado ou dados de temperatura.")
+        elif nome == 'dispositivos_mais_usados':
+            print("\n--- Relatorio de Dispositivos Mais Usados ---")
+            for item in relatorio:
+                print(f"ID: {item['id_dispositivo']}, Eventos: {item['num_eventos']}")
+
+    def _ler_periodo(self) -> dict:
+        # Janela opcional [inicio, fim) dos relatorios; vazio = sem limite
+        periodo = {}
+        for campo, texto in [('inicio', "inicio do periodo (AAAA-MM-DD[THH:MM:SS], vazio = todo o log): "),
+                             ('fim', "fim do periodo, exclusivo (vazio = ate agora): ")]:
+            valor = input(texto).strip()
+            if valor:
+                periodo[campo] = datetime.fromisoformat(valor)
+        return periodo
+
     def _gerar_relatorio(self):
         print("\n--- Gerar Relatorio ---")
         print("Tipos de relatorio disponiveis:")
@@ -139,77 +232,83 @@ class CLI:
         print("4. Ar condicionado")
         print("5. Termostato")
         print("6. Dispositivos mais usados")
+        print("7. Todos os relatorios")
+        print("8. Exportar relatorios em CSV")
         opcao = input("Escolha o tipo de relatorio: ").strip()
 
+        geradores = {
+            '1': ('consumo_tomadas', self.hub.gerar_relatorio_consumo_tomadas),
+            '2': ('tempo_luz_ligada', self.hub.gerar_relatorio_tempo_luz_ligada),
+            '3': ('tempo_tocando_caixa_som', self.hub.gerar_relatorio_tempo_tocando_caixa_som),
+            '4': ('modos_ar_condicionado', self.hub.gerar_relatorio_modos_ar_condicionado),
+            '5': ('temperatura_media_termostato', self.hub.gerar_relatorio_temperatura_media_termostato),
+            '6': ('dispositivos_mais_usados', self.hub.gerar_relatorio_dispositivos_mais_usados),
+        }
         try:
-            if opcao == '1':
-                relatorio = self.hub.gerar_relatorio_consumo_tomadas()
-                print("\n--- Relatorio de Consumo por Tomada ---")
-                for item in relatorio:
-                    print(f"ID: {item['id_dispositivo']}, Consumo Total: {item['total_wh']:.2f} Wh")
-            elif opcao == '2':
-                relatorio = self.hub.gerar_relatorio_tempo_luz_ligada()
-                print("\n--- Relatorio de Tempo de Luz Ligada ---")
-                for item in relatorio:
-                    print(f"ID: {item['id_dispositivo']}, Tempo Ligado: {item['tempo_total_horas']:.2f} horas")
-            elif opcao == '3':
-                relatorio = self.hub.gerar_relatorio_tempo_tocando_caixa_som()
-                print("\n--- Relatorio de Tempo de Caixa de Som ---")
-                for item in relatorio:
-                    print(f"ID: {item['id_dispositivo']}, Tempo Ligado: {item['tempo_total_horas']:.2f} horas")
-            elif opcao == '4':
-                relatorio = self.hub.gerar_relatorio_modos_ar_condicionado()
-                print("\n---  Relatorio de Modos de Ar Condicionado ---")
-                if relatorio:
-                    for modo, count in relatorio.items():
-                        print(f"Modo: {modo}, Usos: {count}")
-                else:
-                    print("Nenhum dado de modos de ar condicionado encontrado.")
-            elif opcao == '5':
-                relatorio = self.hub.gerar_relatorio_temperatura_media_termostato()
-                print("\n--- Relatorio de Temperatura Media de Termostato ---")
-                if relatorio['temperatura_media'] is not None:
-                    print(f"Temperatura Média: {relatorio['temperatura_media']:.2f}°C")
-                else:
-                    print("Nenhum termostato encontrado ou dados de temperatura.")
-            elif opcao == '6':
-                relatorio = self.hub.gerar_relatorio_dispositivos_mais_usados()
-                print("\n--- Relatorio de Dispositivos Mais Usados ---")
-                for item in relatorio:
-                    print(f"ID: {item['id_dispositivo']}, Eventos: {item['num_eventos']}")
+            periodo = {}
+            if opcao in ('1', '2', '3', '4', '6', '7'):
+                periodo = self._ler_periodo()
+            if opcao in geradores:
+                nome, gerar = geradores[opcao]
+                self._imprimir_relatorio(nome, gerar(**periodo))
+            elif opcao == '7':
+                # Uma unica leitura do log para todos os relatorios
+                for nome, relatorio in self.hub.gerar_todos_relatorios(**periodo).items():
+                    self._imprimir_relatorio(nome, relatorio)
+            elif opcao == '8':
+                self._exportar_relatorios({chave: nome for chave, (nome, _) in geradores.items()})
             else:
                 print("Opcao de relatorio invalida.")
         except Exception as e:
             print(f"Erro ao gerar relatorio: {e}")
 
 
+    def _exportar_relatorios(self, nomes: dict):
+        escolha = input("Relatorio a exportar (1-6, 7 = todos): ").strip()
+        if escolha not in nomes and escolha != '7':
+            print("Opcao de relatorio invalida.")
+            return
+        periodo = self._ler_periodo()
+        compactar = input("Compactar com gzip? (s/N): ").strip().lower() == 's'
+        extensao = '.csv.gz' if compactar else '.csv'
+        if escolha == '7':
+            pasta = input("Pasta de destino (vazio = data): ").strip() or 'data'
+            for caminho, total in self.exportador.exportar_todos(pasta, compactar=compactar, **periodo).items():
+                print(f"{total} linha(s) exportada(s) para {caminho}")
+        else:
+            padrao = 'data/relatorio' + extensao
+            caminho = input(f"Arquivo de destino (vazio = {padrao}): ").strip() or padrao
+            total = self.exportador.exportar(nomes[escolha], caminho, compactar=compactar, **periodo)
+            print(f"{total} linha(s) exportada(s) para {caminho}")
+
     def _adicionar_dispositivo(self):
         print("\n--- Adicionar Dispositivo ---")
-        print(f"Tipos suportados: {', '.join([t.name for t in TipoDispositivo])}")
-        tipo_str = input("tipo: ").strip().upper()
+        print(f"Tipos suportados: {', '.join(TIPOS.nomes())}")
+        tipo = input("tipo: ").strip().upper()
         try:
-            tipo = TipoDispositivo[tipo_str]
-        except KeyError:
-            print(f"Tipo de dispositivo '{tipo_str}' invalido.")
+            classe = self.hub.classe_do_tipo(tipo)
+        except ValueError:
+            print(f"Tipo de dispositivo '{tipo}' invalido.")
             return
 
         dev_id = input("id (sem espacos): ").strip()
         nome = input("nome: ").strip()
 
         atributos = {}
-        #coletar atributos específicos de cada tipo de dispositivo
-        if tipo == TipoDispositivo.LUZ:
-            brilho_str = input("brilho (0-100) [50]: ").strip()
-            atributos['brilho'] = int(brilho_str) if brilho_str else 50
-            cor_str = input("cor [QUENTE/FRIA/NEUTRA] [QUENTE]: ").strip().upper()
-            atributos['cor'] = cor_str if cor_str else "QUENTE"
-        elif tipo == TipoDispositivo.TOMADA:
-            potencia_str = input("potencia_w (int >= 0): ").strip()
-            atributos['potencia_w'] = int(potencia_str) if potencia_str else 0
+        #coletar os atributos persistidos do tipo (ENTER mantem o padrao)
+        try:
+            esquema = classe.esquema
+            for attr in esquema.atributos:
+                valor_str = input(f"{attr} ({esquema.descricao(attr)}) [padrao]: ").strip()
+                if valor_str:
+                    atributos[attr] = esquema.converter_texto(attr, valor_str)
+        except ValueError as e:
+            print(f"Valor invalido: {e}")
+            return
 
         try:
             self.hub.adicionar_dispositivo(dev_id, tipo, nome, atributos)
-            print(f"[EVENTO] DispositivoAdicionado: {{'id': '{dev_id}', 'tipo': '{tipo.name}'}}")
+            print(f"[EVENTO] DispositivoAdicionado: {{'id': '{dev_id}', 'tipo': '{tipo}'}}")
             print(f"dispositivo {dev_id} adicionado.")
         except ValueError as e:
             print(f"Erro ao adicionar dispositivo: {e}")
@@ -263,6 +362,7 @@ class CLI:
             elif opcao == '9':
                 self._remover_dispositivo()
             elif opcao == '10':
+                self.hub.desativar_salvamento_automatico()
                 self._salvar_configuracao()
                 print("saindo...")
                 break
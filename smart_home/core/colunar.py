@@ -0,0 +1,460 @@
+# armazenamento colunar de dispositivos, para frotas muito grandes
+import sys
+from array import array
+from collections.abc import Mapping
+from smart_home.core.dispositivos import ValidarInteiro, ValidarEnum
+from smart_home.core.erros import ValidacaoAtributo
+
+# atributos da classe base, guardados em colunas proprias
+_ATRIBUTOS_BASE = ('id', 'nome', 'tipo', '_estado_codigo')
+
+
+class _ColunaInteiro:
+    """Atributo ValidarInteiro guardado em array('h') ou array('i'), com a mesma validacao."""
+    def __init__(self, nome: str, validador: ValidarInteiro):
+        self.nome = nome
+        self.validador = validador
+
+    def __get__(self, visao, owner):
+        if visao is None:
+            return self
+        return visao._colunas.dados[self.nome][visao._i]
+
+    def __set__(self, visao, valor):
+        valor = self.validador.validar(valor)
+        try:
+            visao._colunas.dados[self.nome][visao._i] = valor
+        except OverflowError:
+            raise ValidacaoAtributo(f"O atributo '{self.nome}' excede o limite do armazenamento colunar.")
+        if visao._ao_alterar is not None:
+            visao._ao_alterar(visao.id)
+
+
+class _ColunaEnum:
+    """Atributo ValidarEnum guardado como codigo (indice do membro) em array('b')."""
+    def __init__(self, nome: str, validador: ValidarEnum):
+        self.nome = nome
+        self.validador = validador
+        self.membros = tuple(validador.enum_class)
+        self.codigos = {membro: codigo for codigo, membro in enumerate(self.membros)}
+
+    def __get__(self, visao, owner):
+        if visao is None:
+            return self
+        return self.membros[visao._colunas.dados[self.nome][visao._i]]
+
+    def __set__(self, visao, valor):
+        visao._colunas.dados[self.nome][visao._i] = self.codigos[self.validador.validar(valor)]
+        if visao._ao_alterar is not None:
+            visao._ao_alterar(visao.id)
+
+
+class _ColunaSimples:
+    """Atributo int/float sem validacao (ex.: tentativas_invalidas, consumo_wh)."""
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def __get__(self, visao, owner):
+        if visao is None:
+            return self
+        return visao._colunas.dados[self.nome][visao._i]
+
+    def __set__(self, visao, valor):
+        visao._colunas.dados[self.nome][visao._i] = valor
+
+
+class _ColunaEsparsa:
+    """Atributo de qualquer tipo; so guarda as linhas com valor diferente do padrao."""
+    def __init__(self, nome: str, padrao):
+        self.nome = nome
+        self.padrao = padrao
+
+    def __get__(self, visao, owner):
+        if visao is None:
+            return self
+        return visao._colunas.dados[self.nome].get(visao._i, self.padrao)
+
+    def __set__(self, visao, valor):
+        if valor == self.padrao:
+            visao._colunas.dados[self.nome].pop(visao._i, None)
+        else:
+            visao._colunas.dados[self.nome][visao._i] = valor
+
+
+class VisaoColunar:
+    """Visao leve (so `__slots__`) de uma linha das colunas, com a API de Dispositivo.
+
+    As visoes sao criadas sob demanda pelo ArmazemColunar e nao guardam
+    dados: comandos, FSM e validacao sao os da classe do dispositivo, mas
+    cada atributo le e escreve direto na coluna correspondente.
+    """
+    __slots__ = ('_colunas', '_i')
+
+    def __init__(self, colunas, i: int):
+        self._colunas = colunas
+        self._i = i
+
+    @property
+    def id(self):
+        return self._colunas.id(self._i)
+
+    @property
+    def nome(self):
+        return self._colunas.nome(self._i)
+
+    @nome.setter
+    def nome(self, value):
+        self._colunas.definir_nome(self._i, value)
+
+    @property
+    def _ao_alterar(self):
+        return self._colunas.armazem.ao_alterar
+
+    @property
+    def _estado_codigo(self):
+        return self._colunas.estados[self._i]
+
+    @_estado_codigo.setter
+    def _estado_codigo(self, value):
+        self._colunas.estados[self._i] = value
+
+
+class _NomesForaDoPadrao:
+    """Nomes que fogem do padrao do tipo: dict {linha: nome} enquanto sao poucos, lista quando passam de 1/8 das linhas."""
+    def __init__(self):
+        self._dados = {}
+
+    def get(self, i: int):
+        dados = self._dados
+        if type(dados) is dict:
+            return dados.get(i)
+        return dados[i] if i < len(dados) else None
+
+    def definir(self, i: int, nome, linhas: int):
+        """Guarda o nome da linha (None = segue o padrao)."""
+        dados = self._dados
+        if type(dados) is dict:
+            if nome is None:
+                dados.pop(i, None)
+                return
+            dados[i] = nome
+            if len(dados) > 64 and len(dados) * 8 > linhas: # a lista custa um ponteiro por linha
+                lista = [None] * linhas
+                for linha, valor in dados.items():
+                    lista[linha] = valor
+                self._dados = lista
+            return
+        if i >= len(dados):
+            dados.extend([None] * (i + 1 - len(dados)))
+        dados[i] = nome
+
+    def tamanho_bytes(self) -> int:
+        """Memoria da estrutura (sem as strings), para o benchmark."""
+        return sys.getsizeof(self._dados)
+
+
+class ColunasTipo:
+    """Colunas de todos os dispositivos de uma mesma classe.
+
+    O id de cada linha e guardado como (codigo do prefixo, numero), ex.:
+    'luz_17' -> (codigo de 'luz_', 17); ids fora desse formato ficam em
+    `ids_outros`. O nome so e guardado quando foge do padrao do tipo, tirado
+    do primeiro dispositivo: um texto fixo ('Luz') ou um texto seguido do
+    numero do id ('Luz 17' para 'luz_17').
+    """
+    def __init__(self, classe, numero: int, armazem):
+        # Um prototipo define os atributos da classe e seus valores padrao
+        prototipo = classe('_prototipo', '')
+        self.classe = classe
+        self.armazem = armazem
+        self.numero = numero # posicao no ArmazemColunar, guardada nos 3 bits baixos do indice
+        self.prefixos = array('H') # codigo do prefixo do id no armazem; 0 = id em ids_outros (ou linha livre)
+        self.numeros = array('i')
+        self.ids_outros = {} # {linha: dev_id} dos ids fora do formato prefixo + numero
+        self.nome_padrao = None # (texto, com numero do id)
+        self.nomes_fora = _NomesForaDoPadrao()
+        self.estados = array('b')
+        self.padroes = {}
+        self.dados = {}
+        self._livres = [] # linhas liberadas por remocoes, reutilizadas em novas insercoes
+
+        descritores = {'__slots__': (), 'tipo': prototipo.tipo}
+        for nome, valor in vars(prototipo).items():
+            if nome in _ATRIBUTOS_BASE:
+                continue
+            validador = getattr(classe, nome, None)
+            if isinstance(validador, ValidarInteiro):
+                pequeno = (validador.min_val is not None and validador.max_val is not None
+                           and -2 ** 15 <= validador.min_val and validador.max_val < 2 ** 15)
+                self.dados[nome] = array('h' if pequeno else 'i')
+                descritores[nome] = _ColunaInteiro(nome, validador)
+                self.padroes[nome] = valor
+            elif isinstance(validador, ValidarEnum):
+                descritores[nome] = _ColunaEnum(nome, validador)
+                self.dados[nome] = array('b')
+                self.padroes[nome] = descritores[nome].codigos[valor]
+            elif type(valor) in (int, float):
+                self.dados[nome] = array('i' if type(valor) is int else 'd')
+                descritores[nome] = _ColunaSimples(nome)
+                self.padroes[nome] = valor
+            else:
+                self.dados[nome] = {}
+                descritores[nome] = _ColunaEsparsa(nome, valor)
+        self.estado_inicial = prototipo._estado_codigo
+        self.visao = type(f"{classe.__name__}Colunar", (VisaoColunar, classe), descritores)
+
+    def id(self, i: int):
+        """Id da linha, ou None se ela foi removida."""
+        codigo = self.prefixos[i]
+        if codigo:
+            return f"{self.armazem.prefixos[codigo]}{self.numeros[i]}"
+        return self.ids_outros.get(i)
+
+    def nome(self, i: int) -> str:
+        nome = self.nomes_fora.get(i)
+        if nome is not None:
+            return nome
+        texto, com_numero = self.nome_padrao
+        return f"{texto}{self.numeros[i]}" if com_numero else texto
+
+    def definir_nome(self, i: int, nome: str):
+        if self.nome_padrao is None:
+            # O primeiro dispositivo define o padrao: termina com o numero do id ou e um texto fixo
+            sufixo = str(self.numeros[i]) if self.prefixos[i] else None
+            if sufixo is not None and nome.endswith(sufixo):
+                self.nome_padrao = (sys.intern(nome[:-len(sufixo)]), True)
+            else:
+                self.nome_padrao = (sys.intern(nome), False)
+        texto, com_numero = self.nome_padrao
+        if com_numero:
+            segue = self.prefixos[i] != 0 and nome == f"{texto}{self.numeros[i]}"
+        else:
+            segue = nome == texto
+        self.nomes_fora.definir(i, None if segue else sys.intern(nome), len(self.estados))
+
+    def inserir(self, dev_id: str, chave, nome: str) -> int:
+        """Nova linha para o dispositivo; `chave` e (codigo do prefixo, numero) ou None (ver _IndiceIds.chave)."""
+        codigo, numero = chave if chave is not None else (0, 0)
+        if self._livres:
+            i = self._livres.pop()
+            self.prefixos[i] = codigo
+            self.numeros[i] = numero
+            self.estados[i] = self.estado_inicial
+            for atributo, coluna in self.dados.items():
+                if isinstance(coluna, dict):
+                    coluna.pop(i, None)
+                else:
+                    coluna[i] = self.padroes[atributo]
+        else:
+            i = len(self.estados)
+            self.prefixos.append(codigo)
+            self.numeros.append(numero)
+            self.estados.append(self.estado_inicial)
+            for atributo, coluna in self.dados.items():
+                if not isinstance(coluna, dict):
+                    coluna.append(self.padroes[atributo])
+        if chave is None:
+            self.ids_outros[i] = dev_id
+        self.definir_nome(i, nome)
+        return i
+
+    def remover(self, i: int):
+        self.prefixos[i] = 0
+        self.ids_outros.pop(i, None)
+        self.nomes_fora.definir(i, None, len(self.estados))
+        for coluna in self.dados.values():
+            if isinstance(coluna, dict):
+                coluna.pop(i, None)
+        self._livres.append(i)
+
+
+_ZERO = array('i', [0])
+
+
+class _IndiceIds:
+    """Indice dev_id -> codigo (linha * 8 + numero do tipo), sem hash nem strings por dispositivo.
+
+    Ids no formato prefixo + numero ('luz_17') sao achados por enderecamento
+    direto: uma tabela array('i') por prefixo, indexada pelo numero. Ids fora
+    desse formato, com zeros a esquerda ou com numero muito alem da
+    quantidade de dispositivos (tabela esparsa) ficam num dict.
+    """
+    _DIGITOS = '0123456789'
+
+    def __init__(self):
+        self.prefixos = [None] # codigo -> prefixo; 0 fica livre para "fora do formato"
+        self._tabelas = {}     # {prefixo: (codigo, array('i') numero -> codigo + 1)}
+        self._outros = {}      # {dev_id: codigo}
+        self.tamanho = 0
+
+    def _decompor(self, dev_id):
+        # 'luz_17' -> ('luz_', 17); None se nao ha como refazer o id a partir do numero
+        if type(dev_id) is not str:
+            return None
+        prefixo = dev_id.rstrip(self._DIGITOS)
+        digitos = dev_id[len(prefixo):]
+        if not digitos or len(digitos) > 9 or (digitos[0] == '0' and len(digitos) > 1):
+            return None
+        return prefixo, int(digitos)
+
+    def chave(self, dev_id: str):
+        """(codigo do prefixo, numero) com que o id novo vai para as tabelas, ou None (vai para o dict)."""
+        decomposto = self._decompor(dev_id)
+        if decomposto is None:
+            return None
+        prefixo, numero = decomposto
+        entrada = self._tabelas.get(prefixo)
+        if entrada is None:
+            if len(self.prefixos) > 0xFFFF:
+                return None
+            entrada = self._tabelas[prefixo] = (len(self.prefixos), array('i'))
+            self.prefixos.append(sys.intern(prefixo))
+        codigo, tabela = entrada
+        # A tabela cresce ate o numero; numeros muito alem do total de dispositivos deixariam buracos demais
+        if numero >= len(tabela) and numero >= 2 * self.tamanho + 1024:
+            return None
+        return codigo, numero
+
+    def obter(self, dev_id) -> int:
+        decomposto = self._decompor(dev_id)
+        if decomposto is not None:
+            entrada = self._tabelas.get(decomposto[0])
+            if entrada is not None:
+                tabela, numero = entrada[1], decomposto[1]
+                if numero < len(tabela) and tabela[numero]:
+                    return tabela[numero] - 1
+        return self._outros.get(dev_id, -1) if self._outros else -1
+
+    def inserir(self, dev_id: str, chave, codigo: int):
+        if chave is None:
+            self._outros[dev_id] = codigo
+        else:
+            tabela = self._tabelas[self.prefixos[chave[0]]][1]
+            numero = chave[1]
+            if numero >= len(tabela):
+                tabela.extend(_ZERO * (numero + 1 - len(tabela)))
+            tabela[numero] = codigo + 1
+        self.tamanho += 1
+
+    def remover(self, dev_id: str) -> int:
+        codigo = self._outros.pop(dev_id, None)
+        if codigo is None:
+            prefixo, numero = self._decompor(dev_id)
+            tabela = self._tabelas[prefixo][1]
+            codigo = tabela[numero] - 1
+            tabela[numero] = 0
+        self.tamanho -= 1
+        return codigo
+
+    def tamanho_bytes(self) -> int:
+        """Memoria das tabelas e do dict (sem as strings), para o benchmark."""
+        return sum(sys.getsizeof(tabela) for _, tabela in self._tabelas.values()) + sys.getsizeof(self._outros)
+
+
+class ArmazemColunar(Mapping):
+    """Substituto de `SmartHomeHub.dispositivos` que guarda os dispositivos em colunas.
+
+    Funciona como um dict {dev_id: dispositivo}, mas os valores sao visoes
+    criadas na hora; cada dispositivo custa algumas posicoes de arrays em vez
+    de um objeto com __dict__. Os ids e nomes sao refeitos a partir dos
+    codigos (ver ColunasTipo), entao as strings devolvidas sao novas a cada
+    leitura. A iteracao e agrupada por tipo de dispositivo.
+    """
+    def __init__(self):
+        self._tipos = []   # [ColunasTipo]
+        self._por_classe = {}
+        self._indice = _IndiceIds()
+        self.prefixos = self._indice.prefixos # codigo -> prefixo dos ids, lido pelas colunas
+        self.ao_alterar = None # vale para todas as visoes (ver Dispositivo._ao_alterar)
+
+    def adicionar(self, dev_id: str, classe, nome: str):
+        if dev_id in self:
+            raise ValueError(f"Dispositivo com ID '{dev_id}' ja existe.")
+        colunas = self._por_classe.get(classe)
+        if colunas is None:
+            if len(self._tipos) == 8:
+                raise ValueError("O armazenamento colunar suporta no maximo 8 classes de dispositivo.")
+            colunas = self._por_classe[classe] = ColunasTipo(classe, len(self._tipos), self)
+            self._tipos.append(colunas)
+        chave = self._indice.chave(dev_id)
+        i = colunas.inserir(dev_id, chave, nome)
+        self._indice.inserir(dev_id, chave, i * 8 + colunas.numero)
+        return colunas.visao(colunas, i)
+
+    def __getitem__(self, dev_id: str):
+        codigo = self._indice.obter(dev_id)
+        if codigo < 0:
+            raise KeyError(dev_id)
+        colunas = self._tipos[codigo & 7]
+        return colunas.visao(colunas, codigo >> 3)
+
+    def __iter__(self):
+        prefixos = self.prefixos
+        for colunas in self._tipos:
+            outros = colunas.ids_outros
+            for i, (codigo, numero) in enumerate(zip(colunas.prefixos, colunas.numeros)):
+                if codigo:
+                    yield f"{prefixos[codigo]}{numero}"
+                elif i in outros:
+                    yield outros[i]
+
+    def __len__(self):
+        return self._indice.tamanho
+
+    def __contains__(self, dev_id):
+        return self._indice.obter(dev_id) >= 0
+
+    def pop(self, dev_id: str, *padrao):
+        if dev_id not in self:
+            if padrao:
+                return padrao[0]
+            raise KeyError(dev_id)
+        # A visao devolvida ainda le tipo e estado, ate a linha ser reutilizada
+        device = self[dev_id]
+        codigo = self._indice.remover(dev_id)
+        self._tipos[codigo & 7].remover(codigo >> 3)
+        return device
+
+
+# benchmark de memoria: objetos x colunas
+if __name__ == '__main__':
+    import gc
+    import tracemalloc
+    from smart_home.dispositivos.luz import Luz
+    from smart_home.dispositivos.tomada import Tomada
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    # mesmos ids nos dois casos, numerados por tipo como numa configuracao real (luz_0, tomada_0, luz_1, ...)
+    ids = [f"luz_{i // 2}" if i % 2 else f"tomada_{i // 2}" for i in range(n)]
+
+    def objetos():
+        return {dev_id: (Luz if dev_id[0] == 'l' else Tomada)(dev_id, "Dispositivo") for dev_id in ids}
+
+    def colunas():
+        armazem = ArmazemColunar()
+        for dev_id in ids:
+            armazem.adicionar(dev_id, Luz if dev_id[0] == 'l' else Tomada, "Dispositivo")
+        return armazem
+
+    medidas = {}
+    for nome, construir in [('objetos', objetos), ('colunar', colunas)]:
+        gc.collect()
+        tracemalloc.start()
+        dispositivos = construir()
+        memoria, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        medidas[nome] = memoria / n
+        print(f"{nome:>8}: {memoria / n:8.1f} bytes por dispositivo ({memoria / 2 ** 20:.1f} MiB para {n})")
+    print(f"reducao: {medidas['objetos'] / medidas['colunar']:.1f}x")
+
+    # Onde ficam os bytes do colunar
+    partes = {'indice de ids': dispositivos._indice.tamanho_bytes()}
+    for tipo in dispositivos._tipos:
+        partes['ids'] = (partes.get('ids', 0) + sys.getsizeof(tipo.prefixos) + sys.getsizeof(tipo.numeros)
+                         + sys.getsizeof(tipo.ids_outros))
+        partes['nomes'] = partes.get('nomes', 0) + tipo.nomes_fora.tamanho_bytes()
+        partes['estados'] = partes.get('estados', 0) + sys.getsizeof(tipo.estados)
+        for atributo, coluna in tipo.dados.items():
+            partes[atributo] = partes.get(atributo, 0) + sys.getsizeof(coluna)
+    print(' | '.join(f"{parte} {tamanho / n:.1f}" for parte, tamanho in
+                     sorted(partes.items(), key=lambda item: -item[1])) + " (bytes por dispositivo)")
@@ -0,0 +1,157 @@
+# despacho assincrono de eventos para os observers
+import time
+from collections import deque
+from enum import Enum
+from threading import Condition, Lock, Thread
+from smart_home.core.eventos import Evento
+
+
+class PoliticaTransbordo(Enum):
+    """O que fazer quando a fila de um observer esta cheia."""
+    BLOQUEAR = "BLOQUEAR"                 # quem notifica espera abrir espaco
+    DESCARTAR_ANTIGO = "DESCARTAR_ANTIGO" # descarta o evento mais antigo da fila
+    DESCARTAR_NOVO = "DESCARTAR_NOVO"     # descarta o evento que esta chegando
+
+
+class FilaObserver:
+    """Fila limitada e ordenada de um unico observer, esvaziada por uma thread propria."""
+    def __init__(self, observer, capacidade: int, politica: PoliticaTransbordo):
+        self.observer = observer
+        self.capacidade = capacidade
+        self.politica = politica
+        self._fila = deque()
+        self._cond = Condition()
+        self._em_entrega = False
+        self._ativa = True
+        self.entregues = 0
+        self.descartados = 0
+        self.erros = 0
+        self.lag_ultimo = 0.0 # segundos entre enfileirar e entregar
+        self.lag_max = 0.0
+        self._thread = Thread(target=self._executar, name=f"observer-{type(observer).__name__}", daemon=True)
+        self._thread.start()
+
+    def colocar(self, evento: Evento) -> bool:
+        """Enfileira o evento; False se a fila ja foi parada (a thread nao o entregaria)."""
+        with self._cond:
+            if not self._ativa:
+                return False
+            if len(self._fila) >= self.capacidade:
+                if self.politica == PoliticaTransbordo.DESCARTAR_NOVO:
+                    self.descartados += 1
+                    return True
+                if self.politica == PoliticaTransbordo.DESCARTAR_ANTIGO:
+                    self._fila.popleft()
+                    self.descartados += 1
+                else:
+                    while len(self._fila) >= self.capacidade and self._ativa:
+                        self._cond.wait()
+                    if not self._ativa: # parada enquanto esperava espaco
+                        return False
+            self._fila.append((evento, time.monotonic()))
+            self._cond.notify_all()
+            return True
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while not self._fila and self._ativa:
+                    self._cond.wait()
+                if not self._fila:
+                    return # parada e fila vazia
+                evento, enfileirado = self._fila.popleft()
+                self._em_entrega = True
+                self._cond.notify_all() # libera quem espera em BLOQUEAR
+            try:
+                self.lag_ultimo = time.monotonic() - enfileirado
+                self.lag_max = max(self.lag_max, self.lag_ultimo)
+                self.observer.update(evento)
+                self.entregues += 1
+            except Exception:
+                self.erros += 1
+            finally:
+                with self._cond:
+                    self._em_entrega = False
+                    self._cond.notify_all()
+
+    def drain(self, timeout: float = None) -> bool:
+        """Espera a fila esvaziar e o evento em entrega terminar."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._fila or self._em_entrega:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+        return True
+
+    def parar(self):
+        with self._cond:
+            self._ativa = False
+            self._cond.notify_all()
+        self._thread.join()
+
+    def estatisticas(self) -> dict:
+        return {
+            'observer': type(self.observer).__name__,
+            'profundidade': len(self._fila),
+            'entregues': self.entregues,
+            'descartados': self.descartados,
+            'erros': self.erros,
+            'lag_ultimo_s': self.lag_ultimo,
+            'lag_max_s': self.lag_max,
+        }
+
+
+class DespachanteAssincrono:
+    """Entrega eventos aos observers em threads, com uma fila ordenada por observer.
+
+    notificar() so enfileira, entao executar um comando nao espera pelo I/O
+    dos observers (print no console, escrita em arquivo).
+    """
+    def __init__(self, capacidade: int = 1000, politica: PoliticaTransbordo = PoliticaTransbordo.BLOQUEAR):
+        if capacidade < 1:
+            raise ValueError("A capacidade da fila deve ser >= 1.")
+        self.capacidade = capacidade
+        self.politica = PoliticaTransbordo(politica)
+        self._filas = {} # {id(observer): FilaObserver}
+        self._lock = Lock()
+        self._parado = False
+
+    def _fila(self, observer) -> FilaObserver:
+        """Fila do observer, criada no primeiro evento; None depois de parar()."""
+        fila = self._filas.get(id(observer))
+        if fila is None:
+            with self._lock:
+                fila = self._filas.get(id(observer))
+                if fila is None and not self._parado:
+                    fila = FilaObserver(observer, self.capacidade, self.politica)
+                    self._filas[id(observer)] = fila
+        return fila
+
+    def notificar(self, observers: list, evento: Evento):
+        """Enfileira o evento para cada observer.
+
+        Depois de parar() (inclusive por outra thread no meio da chamada), o
+        evento e entregue na thread de quem notifica, como sem despachante,
+        em vez de ficar numa fila que ninguem mais esvazia.
+        """
+        for observer in observers:
+            fila = self._fila(observer)
+            if fila is None or not fila.colocar(evento):
+                observer.update(evento)
+
+    def drain(self, timeout: float = None) -> bool:
+        """Espera todos os eventos enfileirados serem entregues."""
+        return all([fila.drain(timeout) for fila in list(self._filas.values())])
+
+    def parar(self):
+        """Entrega o que estiver pendente e encerra as threads."""
+        with self._lock:
+            self._parado = True
+            filas, self._filas = list(self._filas.values()), {}
+        for fila in filas:
+            fila.parar()
+
+    def estatisticas(self) -> list:
+        return [fila.estatisticas() for fila in list(self._filas.values())]
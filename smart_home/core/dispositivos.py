@@ -1,8 +1,10 @@
 
-from abc import ABC, abstractmethod
+import inspect
+from abc import ABC
 from enum import Enum
-from transitions import Machine
-from .erros import ValidacaoAtributo
+from operator import attrgetter
+from .erros import ComandoInvalido, TransicaoInvalida, ValidacaoAtributo
+from .fsm import TabelaFSM
 
 # Enum para tipos de dispositivos
 class TipoDispositivo(Enum):
@@ -28,14 +30,19 @@ class ValidarInteiro:
             return self
         return instance.__dict__.get(self.name)
 
-    def __set__(self, instance, value):
+    def validar(self, value) -> int:
         if not isinstance(value, int):
             raise ValidacaoAtributo(f"O atributo '{self.name}' deve ser um numero inteiro.")
         if self.min_val is not None and value < self.min_val:
             raise ValidacaoAtributo(f"O atributo '{self.name}' deve ser maior ou igual a {self.min_val}.")
         if self.max_val is not None and value > self.max_val:
             raise ValidacaoAtributo(f"O atributo '{self.name}' deve ser menor ou igual a {self.max_val}.")
-        instance.__dict__[self.name] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = self.validar(value)
+        if instance._ao_alterar is not None:
+            instance._ao_alterar(instance.id)
 
 class ValidarEnum:
     def __init__(self, enum_class):
@@ -50,51 +57,331 @@ class ValidarEnum:
             return self
         return instance.__dict__.get(self.name)
 
-    def __set__(self, instance, value):
+    def validar(self, value):
         if isinstance(value, self.enum_class):
-            instance.__dict__[self.name] = value
+            return value
         elif isinstance(value, str):
             try:
-                instance.__dict__[self.name] = self.enum_class[value.upper()]
+                return self.enum_class[value.upper()]
             except KeyError:
                 raise ValidacaoAtributo(f"Valor '{value}' invalido para o atributo '{self.name}'. Valores permitidos: {[e.name for e in self.enum_class]}.")
         else:
             raise ValidacaoAtributo(f"O atributo '{self.name}' deve ser um membro de {self.enum_class.__name__} ou uma string correspondente.")
 
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = self.validar(value)
+        if instance._ao_alterar is not None:
+            instance._ao_alterar(instance.id)
+
+
+class EsquemaDispositivo:
+    """Atributos persistidos de uma classe de dispositivo, com o codificador montado uma vez por classe.
+
+    Por padrao sao os descritores ValidarInteiro/ValidarEnum da classe, na
+    ordem de declaracao; a classe pode listar outros em `persistidos` (ex.:
+    propriedades). codificar(device) devolve o dict "atributos" da
+    configuracao, com enums pelo nome; decodificar(device, atributos) aplica
+    um dict desses pelos descritores da classe, validando cada valor.
+    """
+    def __init__(self, classe):
+        self.classe = classe
+        self.validadores = {} # {atributo: ValidarInteiro/ValidarEnum}
+        for base in reversed(classe.__mro__):
+            for nome, valor in vars(base).items():
+                if isinstance(valor, (ValidarInteiro, ValidarEnum)):
+                    self.validadores[nome] = valor
+        self.atributos = tuple(self.validadores) if classe.persistidos is None else tuple(classe.persistidos)
+        # __set__ do descritor que a classe usa de fato (ex.: as colunas da visao colunar)
+        self._definir = {}
+        for nome in (*self.validadores, *self.atributos):
+            descritor = getattr(classe, nome, None)
+            if hasattr(type(descritor), '__set__'):
+                self._definir[nome] = descritor.__set__
+        self.codificar = self._montar_codificador()
+
+    def _montar_codificador(self):
+        # Um unico attrgetter le todos os atributos ('cor.name' para enums), sem laco por atributo
+        nomes = self.atributos
+        if not nomes:
+            return lambda device: {}
+        ler = attrgetter(*(f"{nome}.name" if isinstance(self.validadores.get(nome), ValidarEnum) else nome
+                           for nome in nomes))
+        if len(nomes) == 1:
+            nome, = nomes
+            return lambda device: {nome: ler(device)}
+        return lambda device: dict(zip(nomes, ler(device)))
+
+    def decodificar(self, device, atributos: dict):
+        """Aplica os atributos de uma configuracao ao dispositivo."""
+        self._aplicar(device, atributos, False)
+
+    def validar(self, registro, atributos: dict):
+        """Como decodificar, mas so valida; propriedades (ex.: ligado) ainda sao aplicadas ao registro.
+
+        Usado pelos RegistroDispositivo do modo sob demanda, que guardam o
+        dict de atributos sem copiar os valores.
+        """
+        self._aplicar(registro, atributos, True)
+
+    def _aplicar(self, device, atributos: dict, so_validar: bool):
+        for nome, valor in atributos.items():
+            try:
+                validador = self.validadores.get(nome)
+                if so_validar and validador is not None:
+                    validador.validar(valor)
+                    continue
+                definir = self._definir.get(nome)
+                if definir is not None:
+                    definir(device, valor)
+                elif not so_validar:
+                    setattr(device, nome, valor)
+            except ValidacaoAtributo as e:
+                raise ValidacaoAtributo(f"Erro ao definir atributo '{nome}' para {device.id}: {e}")
+            except AttributeError:
+                print(f"Aviso: Atributo '{nome}' nao existe para o dispositivo '{device.tipo.name}'.")
+
+    def converter_texto(self, nome: str, texto: str):
+        """Valor digitado (ex.: na CLI) para o tipo do atributo; a validacao fica com o descritor."""
+        validador = self.validadores.get(nome)
+        if isinstance(validador, ValidarInteiro):
+            return int(texto)
+        if isinstance(validador, ValidarEnum):
+            return texto.upper()
+        if texto.lower() in ('true', 'false'):
+            return texto.lower() == 'true'
+        return texto
+
+    def descricao(self, nome: str) -> str:
+        """Faixa ou valores aceitos pelo atributo, para prompts."""
+        validador = self.validadores.get(nome)
+        if validador is not None:
+            return _descrever(validador)
+        return "true/false" if isinstance(getattr(self.classe, nome, None), property) else "texto"
+
+
+def _descrever(validador) -> str:
+    # Faixa de um ValidarInteiro ou membros de um ValidarEnum
+    if isinstance(validador, ValidarInteiro):
+        if validador.min_val is not None and validador.max_val is not None:
+            return f"{validador.min_val}-{validador.max_val}"
+        if validador.min_val is not None:
+            return f"int >= {validador.min_val}"
+        if validador.max_val is not None:
+            return f"int <= {validador.max_val}"
+        return "int"
+    return '/'.join(membro.name for membro in validador.enum_class)
+
+
+# Anotacoes de argumentos conferidas por isinstance (um float aceita int)
+_TIPOS_ARGUMENTO = {int: int, float: (int, float), bool: bool, str: str}
+
+
+class ArgumentoComando:
+    """Um argumento aceito por um comando: tipo anotado e, se houver, o descritor do atributo que ele define."""
+    __slots__ = ('nome', 'tipo', 'validador', 'obrigatorio')
+
+    def __init__(self, nome: str, tipo, validador, obrigatorio: bool):
+        self.nome = nome
+        self.tipo = tipo
+        self.validador = validador # ValidarInteiro/ValidarEnum, ou None
+        self.obrigatorio = obrigatorio
+
+    def validar(self, valor):
+        if self.validador is not None:
+            self.validador.validar(valor)
+        elif self.tipo in _TIPOS_ARGUMENTO and not isinstance(valor, _TIPOS_ARGUMENTO[self.tipo]):
+            raise ValidacaoAtributo(f"O argumento '{self.nome}' deve ser do tipo {self.tipo.__name__}.")
+
+    def converter(self, texto: str):
+        """Valor digitado (ex.: na CLI) para o tipo do argumento; ValueError se nao converte."""
+        if isinstance(self.validador, ValidarInteiro) or self.tipo is int:
+            return int(texto)
+        if isinstance(self.validador, ValidarEnum):
+            return texto.upper()
+        if self.tipo is float:
+            return float(texto)
+        if self.tipo is bool:
+            if texto.lower() not in ('true', 'false'):
+                raise ValueError(texto)
+            return texto.lower() == 'true'
+        return texto
+
+    def descricao(self) -> str:
+        """Faixa ou valores aceitos, para prompts."""
+        if self.validador is not None:
+            return _descrever(self.validador)
+        if self.tipo is bool:
+            return "true/false"
+        return self.tipo.__name__ if self.tipo in _TIPOS_ARGUMENTO else "texto"
+
+
+class ComandoDispositivo:
+    """Um comando de uma classe de dispositivo: metodo, argumentos e estados em que vale."""
+    __slots__ = ('nome', 'funcao', 'argumentos', 'obrigatorios', 'extras', 'validos', 'origens', 'atributo_evento')
+
+    def __init__(self, nome: str, funcao, argumentos: dict, extras: bool, fsm, atributo_evento: str = None):
+        self.nome = nome
+        self.funcao = funcao # chamada como funcao(device, **kwargs)
+        self.argumentos = argumentos # {nome: ArgumentoComando}, na ordem da assinatura
+        self.obrigatorios = frozenset(nome for nome, argumento in argumentos.items() if argumento.obrigatorio)
+        self.extras = extras # o metodo aceita **kwargs: argumentos fora da assinatura nao sao recusados
+        # Um comando que e trigger da FSM so vale nos estados de origem das regras do trigger;
+        # os demais valem em qualquer estado (o proprio metodo confere, se precisar)
+        por_origem = fsm.regras.get(nome) if fsm is not None else None
+        estados = fsm.estados if fsm is not None else ()
+        self.validos = tuple(regra is not None for regra in por_origem) if por_origem else (True,) * len(estados)
+        self.origens = tuple(estado for estado, valido in zip(estados, self.validos) if valido)
+        # Atributo cujo valor vai como origem/destino do evento e do log, no lugar do estado (ex.: modo)
+        self.atributo_evento = atributo_evento
+
+    def valor_evento(self, device) -> str:
+        """Estado do dispositivo ou, com atributo_evento, o valor desse atributo (enums pelo nome)."""
+        if self.atributo_evento is None:
+            return device.estado
+        valor = getattr(device, self.atributo_evento)
+        return valor.name if isinstance(valor, Enum) else str(valor)
+
+
+class TabelaComandos:
+    """Comandos de uma classe de dispositivo, montados uma vez por classe.
+
+    Comandos sao os metodos publicos das subclasses de Dispositivo que nao
+    sao callbacks da FSM. Os argumentos vem da assinatura: um argumento com
+    o nome de um atributo validado (ou mapeado em `argumentos_comandos`) usa
+    o descritor desse atributo; os demais, a anotacao de tipo. verificar()
+    recusa comando, estado ou argumentos invalidos so com consultas na
+    tabela, sem chamar o metodo.
+    """
+    def __init__(self, classe):
+        self.classe = classe
+        fsm = classe._fsm
+        callbacks = set()
+        if fsm is not None:
+            callbacks.update(fsm.antes, fsm.depois)
+            for por_origem in fsm.regras.values():
+                for regra in filter(None, por_origem):
+                    callbacks.update(regra.before, regra.after)
+        atributos = classe.argumentos_comandos or {}
+        atributos_eventos = classe.atributos_eventos or {}
+        validadores = classe.esquema.validadores
+        self._comandos = {} # {nome: ComandoDispositivo}
+        for base in reversed(classe.__mro__):
+            if not (issubclass(base, Dispositivo) and base is not Dispositivo):
+                continue # os metodos de Dispositivo (disparar, callbacks) e de mixins nao sao comandos
+            for nome, valor in vars(base).items():
+                if nome.startswith('_') or nome in callbacks or not inspect.isfunction(valor):
+                    continue
+                argumentos = {}
+                extras = False
+                for parametro in list(inspect.signature(valor).parameters.values())[1:]:
+                    if parametro.kind == parametro.VAR_KEYWORD:
+                        extras = True
+                    elif parametro.kind in (parametro.POSITIONAL_OR_KEYWORD, parametro.KEYWORD_ONLY):
+                        tipo = None if parametro.annotation is parametro.empty else parametro.annotation
+                        validador = validadores.get(atributos.get(parametro.name, parametro.name))
+                        argumentos[parametro.name] = ArgumentoComando(parametro.name, tipo, validador,
+                                                                      parametro.default is parametro.empty)
+                self._comandos[nome] = ComandoDispositivo(nome, valor, argumentos, extras, fsm,
+                                                          atributos_eventos.get(nome))
+
+    def get(self, nome: str):
+        """ComandoDispositivo com esse nome, ou None."""
+        return self._comandos.get(nome)
+
+    def nomes(self) -> list:
+        return list(self._comandos)
+
+    def disponiveis(self, device) -> list:
+        """Nomes dos comandos que valem no estado atual do dispositivo."""
+        codigo = device._estado_codigo
+        return [nome for nome, comando in self._comandos.items() if comando.validos[codigo]]
+
+    def verificar(self, device, nome: str, kwargs: dict) -> ComandoDispositivo:
+        """O comando, se ele existe, vale no estado atual e aceita os argumentos; senao levanta
+        ComandoInvalido (comando ou nomes de argumentos), TransicaoInvalida (estado) ou
+        ValidacaoAtributo (valor de argumento).
+        """
+        comando = self._comandos.get(nome)
+        if comando is None:
+            raise ComandoInvalido(f"Comando '{nome}' nao disponivel para o dispositivo '{device.id}'.")
+        if not comando.validos[device._estado_codigo]:
+            raise TransicaoInvalida(f"Falha ao executar comando '{nome}' em '{device.id}': nao e possivel a partir "
+                                    f"do estado '{device.estado}'. Estados validos: {list(comando.origens)}.")
+        argumentos = comando.argumentos
+        for chave, valor in kwargs.items():
+            argumento = argumentos.get(chave)
+            if argumento is None:
+                if comando.extras:
+                    continue
+                raise ComandoInvalido(f"Argumento '{chave}' nao aceito pelo comando '{nome}' do dispositivo "
+                                      f"'{device.id}'. Argumentos: {list(argumentos)}.")
+            try:
+                argumento.validar(valor)
+            except ValidacaoAtributo as e:
+                raise ValidacaoAtributo(f"Argumento '{chave}' invalido para '{nome}' em '{device.id}': {e}")
+        if not comando.obrigatorios <= kwargs.keys():
+            faltando = [chave for chave in argumentos if chave in comando.obrigatorios and chave not in kwargs]
+            raise ComandoInvalido(f"Faltam argumentos para o comando '{nome}' do dispositivo '{device.id}': {faltando}.")
+        return comando
+
 
 # Classe base abstrata para todos os dispositivos
 class Dispositivo(ABC):
+    # Cada subclasse declara sua FSM nestes atributos; a tabela e compilada
+    # uma unica vez, na criacao da classe, e compartilhada pelas instancias.
+    estados = ()
+    estado_inicial = None
+    transicoes = ()
+    _fsm = None
+    # Atributos salvos na configuracao; None = os descritores ValidarInteiro/ValidarEnum (ver EsquemaDispositivo)
+    persistidos = None
+    esquema = None
+    # {argumento de comando: atributo cujo descritor o valida}, para nomes diferentes (ver TabelaComandos)
+    argumentos_comandos = None
+    # {comando: atributo} cujo evento registra o valor do atributo em vez do estado (ex.: o modo novo)
+    atributos_eventos = None
+    comandos = None
+    # Chamado com o id a cada escrita num atributo validado; o hub liga o dos seus dispositivos (marcar_alterado)
+    _ao_alterar = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'estados' in cls.__dict__:
+            cls._fsm = TabelaFSM(cls.estados, cls.transicoes, cls.estado_inicial,
+                                 antes='on_exit_state', depois='on_enter_state')
+        cls.esquema = EsquemaDispositivo(cls)
+        cls.comandos = TabelaComandos(cls)
+
     def __init__(self, id: str, nome: str, tipo: TipoDispositivo):
         self.id = id
         self.nome = nome
         self.tipo = tipo
-        self.estado = None 
-        self.machine = None 
+        self._estado_codigo = self._fsm.inicial
 
-    @abstractmethod
-    def _setup_fsm(self):
-        """Configura a máquina de estados para o dispositivo."""
-        pass
+    def disparar(self, trigger: str, *args, **kwargs):
+        """Dispara um trigger da FSM do dispositivo."""
+        return self._fsm.disparar(self, trigger, *args, **kwargs)
 
     def __repr__(self):
         return f"{self.tipo.name}(id='{self.id}', nome='{self.nome}', estado='{self.estado}')"
 
-    def on_enter_state(self, event):
+    def on_enter_state(self, transicao):
         """Callback genérico para quando um estado é entrado."""
-        print(f"[{self.id}] Entrou no estado: {self.estado}")
+        print(f"[{self.id}] Entrou no estado: {transicao.destino}")
 
 
-    def on_exit_state(self, event):
+    def on_exit_state(self, transicao):
         """Callback genérico para quando um estado é saído."""
-        print(f"[{self.id}] Saiu do estado: {event.state.name}")
+        print(f"[{self.id}] Saiu do estado: {transicao.origem}")
 
 
     # Propriedade para acessar o estado da FSM
     @property
     def estado(self):
-        return self._estado
+        return self._fsm.estados[self._estado_codigo]
 
     @estado.setter
     def estado(self, value):
-        self._estado = value
+        # Define o estado diretamente, sem callbacks (ex.: ao carregar a configuracao)
+        self._estado_codigo = self._fsm.codigo(value)
 
@@ -13,4 +13,11 @@ class ConfigInvalida(SmartHomeError):
 
 class ValidacaoAtributo(SmartHomeError):
     """Exceção levantada quando a validação de um atributo falha."""
-    pass
\ No newline at end of file
+    pass
+
+class ComandoInvalido(SmartHomeError, AttributeError):
+    """Exceção levantada quando o comando ou os argumentos não existem para o dispositivo.
+
+    Também é AttributeError, como o erro que o hub levantava antes.
+    """
+    pass
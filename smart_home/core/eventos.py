@@ -1,13 +1,28 @@
 # tipos de eventos do hub
 import datetime
+import json
 from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 @dataclass
 class Evento:
-    tipo: str
-    dados: Dict[str, Any]
-    
+    # Campos so por nome: tipo/dados sao preenchidos pelas subclasses no __post_init__
+    tipo: str = field(default="", kw_only=True)
+    dados: Dict[str, Any] = field(default_factory=dict, kw_only=True)
+    timestamp: datetime.datetime = field(default_factory=datetime.datetime.now, kw_only=True)
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Representacao comum a todos os eventos, usada pelos observers."""
+        return {
+            "timestamp": self.timestamp.isoformat(),
+            "tipo": self.tipo,
+            "dados": self.dados
+        }
+
+    def serializar(self) -> str:
+        # default=str cobre datetime e Enum dentro de dados/args
+        return json.dumps(self.para_dict(), default=str, ensure_ascii=False)
+
 @dataclass
 class EventoDispositivo(Evento):
     id_dispositivo: str
@@ -29,7 +44,6 @@ class EventoDispositivo(Evento):
 
 @dataclass
 class EventoHub(Evento):
-    timestamp: datetime.datetime = field(default_factory=datetime.datetime.now)
     acao: str = ""
     detalhes: Dict[str, Any] = field(default_factory=dict)
 
@@ -41,3 +55,12 @@ class EventoHub(Evento):
             "timestamp": self.timestamp
         }
 
+@dataclass
+class EventoLote(Evento):
+    """Varios EventoDispositivo entregues aos observers numa unica notificacao."""
+    eventos: List[EventoDispositivo] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.tipo = "Lote"
+        self.dados = {"total": len(self.eventos)}
+
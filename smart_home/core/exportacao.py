@@ -0,0 +1,116 @@
+# exportacao de relatorios em CSV (opcionalmente compactado com gzip)
+import csv
+import gzip
+import io
+import os
+from smart_home.core.relatorios import AGREGADORES
+
+COLUNAS_PERIODO = ('inicio_periodo', 'fim_periodo')
+# Colunas de cada relatorio no CSV; os relatorios do log levam os limites da janela (vazios sem janela)
+ESQUEMAS = {agregador.nome: agregador.colunas + COLUNAS_PERIODO for agregador in AGREGADORES}
+ESQUEMAS['temperatura_media_termostato'] = ('temperatura_media',)
+
+
+class ExportadorRelatorios:
+    """Grava relatorios do hub em CSV linha a linha, direto dos geradores de SmartHomeHub.linhas_relatorios.
+
+    As linhas sao formatadas em blocos de `linhas_por_bloco` e cada bloco vai
+    para o arquivo numa unica escrita, entao so um bloco fica na memoria.
+    Caminhos terminados em .gz sao compactados com gzip. Cada arquivo e
+    escrito num temporario e renomeado no fim: um relatorio exportado nunca
+    fica pela metade.
+    """
+    def __init__(self, hub, linhas_por_bloco: int = 1000):
+        self.hub = hub
+        self.linhas_por_bloco = linhas_por_bloco
+
+    def _gravar(self, caminho: str, colunas: tuple, linhas, compactar: bool = None) -> int:
+        if compactar is None:
+            compactar = caminho.endswith('.gz')
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        temporario = caminho + '.tmp'
+        texto = io.StringIO()
+        writer = csv.DictWriter(texto, fieldnames=colunas, restval='')
+        writer.writeheader()
+        total = 0
+        try:
+            with open(temporario, 'wb') as arquivo:
+                # filename: o nome guardado no cabecalho gzip e o final, nao o do temporario
+                saida = gzip.GzipFile(filename=caminho, mode='wb', fileobj=arquivo) if compactar else arquivo
+                with saida:
+                    for linha in linhas:
+                        writer.writerow(linha)
+                        total += 1
+                        if total % self.linhas_por_bloco == 0:
+                            saida.write(texto.getvalue().encode('utf-8'))
+                            texto.seek(0)
+                            texto.truncate()
+                    saida.write(texto.getvalue().encode('utf-8'))
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return total
+
+    def exportar(self, nome: str, caminho: str, inicio=None, fim=None, compactar: bool = None) -> int:
+        """Exporta um relatorio (ver ESQUEMAS) para `caminho`; devolve o numero de linhas gravadas."""
+        linhas = self.hub.linhas_relatorios([nome], inicio, fim)[nome]
+        return self._gravar(caminho, ESQUEMAS[nome], linhas, compactar)
+
+    def exportar_todos(self, pasta: str, inicio=None, fim=None, compactar: bool = False) -> dict:
+        """Exporta todos os relatorios para <pasta>/relatorio_<nome>.csv[.gz] com uma unica leitura do log.
+
+        Devolve {caminho: numero de linhas}.
+        """
+        extensao = '.csv.gz' if compactar else '.csv'
+        gravados = {}
+        for nome, linhas in self.hub.linhas_relatorios(None, inicio, fim).items():
+            caminho = os.path.join(pasta, f"relatorio_{nome}{extensao}")
+            gravados[caminho] = self._gravar(caminho, ESQUEMAS[nome], linhas, compactar)
+        return gravados
+
+
+# benchmark: memoria da exportacao de um relatorio por dispositivo de uma frota grande
+if __name__ == '__main__':
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+    from smart_home.core.dispositivos import TipoDispositivo
+    from smart_home.core.hub import SmartHomeHub
+    from smart_home.core.logger import Logger
+    from smart_home.core.relatorios import EstadoRelatorios
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as pasta:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        hub = SmartHomeHub(colunar=True)
+        hub.observers = []
+        hub.estado_relatorios = EstadoRelatorios(None)
+        hub.cache_relatorios = None
+        for i in range(n):
+            hub.adicionar_dispositivo(f"luz_{i}", TipoDispositivo.LUZ, f"Luz {i}")
+        hub.logger.log_events([(f"luz_{i}", evento, 'off', 'on', True, '')
+                               for evento in ('ligar', 'desligar') for i in range(n)])
+        hub.gerar_relatorio_tempo_luz_ligada() # le o log uma vez; as medicoes abaixo partem do checkpoint
+
+        def em_lista(caminho):
+            # caminho anterior: o relatorio inteiro como lista de dicts, depois gravado
+            relatorio = hub.gerar_relatorio_tempo_luz_ligada()
+            with open(caminho, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=ESQUEMAS['tempo_luz_ligada'], restval='')
+                writer.writeheader()
+                writer.writerows(relatorio)
+
+        exportador = ExportadorRelatorios(hub)
+        for rotulo, exportar in [('lista em memoria', em_lista),
+                                 ('streaming', lambda caminho: exportador.exportar('tempo_luz_ligada', caminho)),
+                                 ('streaming gzip', lambda caminho: exportador.exportar('tempo_luz_ligada', caminho + '.gz'))]:
+            tracemalloc.start()
+            t = time.perf_counter()
+            exportar(os.path.join(pasta, 'relatorio.csv'))
+            tempo = time.perf_counter() - t
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{rotulo:>16}: {n} linhas em {tempo:.2f}s | pico de memoria {pico / 2**20:.1f} MiB")
@@ -0,0 +1,141 @@
+# maquina de estados leve, compilada uma vez por classe de dispositivo
+from typing import NamedTuple
+from smart_home.core.erros import TransicaoInvalida
+
+
+class Transicao(NamedTuple):
+    """Dados passados aos callbacks gerais da maquina (antes/depois de cada transicao)."""
+    trigger: str
+    origem: str
+    destino: str
+
+
+class _Regra(NamedTuple):
+    destino: int  # codigo do estado de destino; -1 = transicao interna (nao muda de estado)
+    before: tuple
+    after: tuple
+
+
+def _nomes(callbacks) -> tuple:
+    if not callbacks:
+        return ()
+    if isinstance(callbacks, str):
+        return (callbacks,)
+    return tuple(callbacks)
+
+
+class TabelaFSM:
+    """Tabela de estados e transicoes compartilhada por todas as instancias de uma classe.
+
+    Aceita o mesmo formato de transicoes da biblioteca `transitions`
+    (trigger/source/dest/before/after; source pode ser lista ou '*', dest None
+    indica transicao interna). As instancias guardam apenas o codigo (int) do
+    estado atual em `_estado_codigo`; disparar um trigger e uma consulta na
+    tabela pre-calculada trigger -> (codigo de origem -> regra).
+
+    Ordem dos callbacks, como em `transitions`: `antes` da maquina, before da
+    transicao, troca de estado, after da transicao, `depois` da maquina.
+    Os callbacks da transicao recebem os argumentos do trigger; os da maquina
+    recebem um `Transicao`.
+    """
+    def __init__(self, estados, transicoes, inicial: str, antes=None, depois=None):
+        self.estados = tuple(estados)
+        self.codigos = {nome: codigo for codigo, nome in enumerate(self.estados)}
+        if inicial not in self.codigos:
+            raise ValueError(f"Estado inicial '{inicial}' nao esta entre os estados {list(self.estados)}.")
+        self.inicial = self.codigos[inicial]
+        self.antes = _nomes(antes)
+        self.depois = _nomes(depois)
+
+        regras = {} # {trigger: [regra ou None por codigo de origem]}
+        for t in transicoes:
+            origens = t['source']
+            if origens == '*':
+                origens = self.estados
+            elif isinstance(origens, str):
+                origens = [origens]
+            destino = -1 if t.get('dest') is None else self.codigos[t['dest']]
+            regra = _Regra(destino, _nomes(t.get('before')), _nomes(t.get('after')))
+            por_origem = regras.setdefault(t['trigger'], [None] * len(self.estados))
+            for origem in origens:
+                if por_origem[self.codigos[origem]] is None: # a primeira regra declarada vence
+                    por_origem[self.codigos[origem]] = regra
+        self.regras = {trigger: tuple(por_origem) for trigger, por_origem in regras.items()}
+        self.triggers = frozenset(self.regras)
+
+    def codigo(self, estado: str) -> int:
+        try:
+            return self.codigos[estado]
+        except KeyError:
+            raise TransicaoInvalida(f"Estado '{estado}' invalido. Estados permitidos: {list(self.estados)}.")
+
+    def pode_disparar(self, codigo: int, trigger: str) -> bool:
+        por_origem = self.regras.get(trigger)
+        return por_origem is not None and por_origem[codigo] is not None
+
+    def disparar(self, model, trigger: str, *args, **kwargs) -> bool:
+        origem = model._estado_codigo
+        por_origem = self.regras.get(trigger)
+        regra = por_origem[origem] if por_origem is not None else None
+        if regra is None:
+            raise TransicaoInvalida(f"Nao e possivel disparar '{trigger}' a partir do estado '{self.estados[origem]}'.")
+
+        destino = origem if regra.destino < 0 else regra.destino
+        transicao = None
+        if self.antes or self.depois:
+            transicao = Transicao(trigger, self.estados[origem], self.estados[destino])
+        for nome in self.antes:
+            getattr(model, nome)(transicao)
+        for nome in regra.before:
+            getattr(model, nome)(*args, **kwargs)
+        model._estado_codigo = destino
+        for nome in regra.after:
+            getattr(model, nome)(*args, **kwargs)
+        for nome in self.depois:
+            getattr(model, nome)(transicao)
+        return True
+
+
+# benchmark: tabela compilada x uma transitions.Machine por dispositivo
+if __name__ == '__main__':
+    import sys
+    import time
+    from transitions import Machine
+    from smart_home.dispositivos.luz import Luz
+
+    class LuzSilenciosa(Luz):
+        # sem prints nos callbacks gerais, para medir so a FSM
+        def on_enter_state(self, transicao):
+            pass
+
+        def on_exit_state(self, transicao):
+            pass
+
+    class LuzTransitions:
+        def __init__(self):
+            self.machine = Machine(model=self, states=Luz.estados, initial=Luz.estado_inicial,
+                                   transitions=Luz.transicoes, model_attribute='estado', auto_transitions=False,
+                                   before_state_change='on_exit_state', after_state_change='on_enter_state')
+
+        def on_enter_state(self):
+            pass
+
+        def on_exit_state(self):
+            pass
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for nome, criar, disparar in [
+        ('tabela compilada', lambda i: LuzSilenciosa(f"luz_{i}", "Luz"), lambda d, t: d.disparar(t)),
+        ('transitions', lambda i: LuzTransitions(), lambda d, t: d.trigger(t)),
+    ]:
+        inicio = time.perf_counter()
+        dispositivos = [criar(i) for i in range(n)]
+        criacao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for d in dispositivos:
+            disparar(d, 'ligar')
+            disparar(d, 'desligar')
+        transicoes = time.perf_counter() - inicio
+        print(f"{nome:>16}: criar {n} dispositivos {criacao:.3f}s | "
+              f"{2 * n / transicoes:,.0f} transicoes/s")
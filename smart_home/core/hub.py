@@ -1,63 +1,189 @@
-from datetime import datetime
+import time
+from array import array
+from enum import IntEnum
+from functools import partial
+from threading import Lock
 from smart_home.core.dispositivos import TipoDispositivo, Dispositivo
 from smart_home.core.logger import Logger
-from smart_home.core.eventos import EventoDispositivo, EventoHub
+from smart_home.core.segmentos import normalizar_instante
+from smart_home.core.eventos import EventoDispositivo, EventoHub, EventoLote
 from smart_home.core.observers import ConsoleObserver, FileObserver
-from smart_home.core.erros import TransicaoInvalida, ValidacaoAtributo, ConfigInvalida
-
-from smart_home.dispositivos import ArCondicionado
-from smart_home.dispositivos.caixaSom import CaixaSom
-from smart_home.dispositivos.luz import Luz
-from smart_home.dispositivos.porta import Porta
-from smart_home.dispositivos.termostato import Termostato
-from smart_home.dispositivos.tomada import Tomada
-
-from collections import Counter # Adicionado para gerar relatórios
+from smart_home.core.despacho import DespachanteAssincrono, PoliticaTransbordo
+from smart_home.core.colunar import ArmazemColunar
+from smart_home.core.registro import TIPOS
+from smart_home.core.sob_demanda import ArmazemSobDemanda, RegistroDispositivo
+from smart_home.core.erros import TransicaoInvalida, ValidacaoAtributo, ConfigInvalida, ComandoInvalido
+from smart_home.core.cache_relatorios import CacheRelatorios
+from smart_home.core.persistencia import Persistencia, SalvamentoAutomatico
+from smart_home.core.relatorios import (AGREGADORES, BackendRelatorios, MotorRelatorios, EstadoRelatorios,
+                                        AgregadorIntervalos, AgregadorConsumoTomadas, AgregadorTempoLuzLigada,
+                                        AgregadorTempoCaixaSom, AgregadorModosArCondicionado,
+                                        AgregadorDispositivosMaisUsados)
+
+class StatusComando(IntEnum):
+    """Resultado de cada comando em executar_comandos_em_lote."""
+    OK = 0
+    TRANSICAO_INVALIDA = 1
+    COMANDO_INVALIDO = 2
+    DISPOSITIVO_INEXISTENTE = 3
+    ERRO = 4
+    NAO_EXECUTADO = 5
+    ARGUMENTO_INVALIDO = 6
 
 class SmartHomeHub:
-    def __init__(self):
-        self.dispositivos = {}
+    info_hub = {"nome": "Casa Exemplo", "versao": "1.0"} # bloco "hub" da configuracao salva
+
+    def __init__(self, colunar: bool = False, backend_relatorios: BackendRelatorios = BackendRelatorios.PYTHON,
+                 processos_relatorios: int = 1, sob_demanda: bool = False):
+        # colunar=True guarda os dispositivos em colunas compactas (ArmazemColunar),
+        # para hubs com centenas de milhares de dispositivos simulados
+        self.colunar = colunar
+        # sob_demanda=True guarda so os dados de cada dispositivo (RegistroDispositivo) e
+        # cria o objeto no primeiro obter_dispositivo/executar_comando (ArmazemSobDemanda)
+        if colunar and sob_demanda:
+            raise ValueError("Os modos colunar e sob_demanda nao podem ser usados juntos.")
+        self.sob_demanda = sob_demanda
+        # Escritas em atributos validados (ex.: potencia_w) chamam este bound method, unico e
+        # compartilhado pelos dispositivos, que marca o id como alterado (ver Dispositivo._ao_alterar)
+        self._ao_alterar = self._atributo_alterado
+        self._carregando = False
+        self.dispositivos = self._novo_armazenamento()
         self.rotinas = {}
         self.logger = Logger() # Singleton
+        self.estado_relatorios = EstadoRelatorios() # checkpoint incremental dos relatorios
+        # NUMPY calcula os relatorios sobre colunas do log; sem NumPy instalado, usa o PYTHON
+        self.backend_relatorios = BackendRelatorios(backend_relatorios)
+        # Com mais de um processo, logs grandes sao divididos em faixas processadas em paralelo
+        self.processos_relatorios = processos_relatorios
+        self.cache_relatorios = CacheRelatorios() # None desativa o cache
+        self._versao_dispositivos = 0 # muda a cada dispositivo adicionado ou removido
+        self.metricas_carga = {} # tempos da ultima carregar_configuracao
+        # O que mudou desde o ultimo Persistencia.salvar_alteracoes (ver retirar_alteracoes)
+        self._dispositivos_alterados = set()
+        self._rotinas_alteradas = set()
+        self._tudo_alterado = False
+        self._alterados_relatorios = set() # ids alterados desde a ultima consulta ao cache de relatorios
+        self._lock_alteracoes = Lock()
+        self.salvamento = None # SalvamentoAutomatico; None = so salva quando pedido
         self.observers = [ConsoleObserver(), FileObserver('data/eventos.log.csv')] 
+        self.despachante = None # None = observers chamados na mesma thread
+
+    def _novo_armazenamento(self):
+        if not (self.colunar or self.sob_demanda):
+            return {} # o aviso e ligado em cada dispositivo, em _criar_dispositivo
+        armazem = ArmazemColunar() if self.colunar else ArmazemSobDemanda()
+        armazem.ao_alterar = self._ao_alterar
+        return armazem
+
+    def _atributo_alterado(self, dev_id: str):
+        # Durante carregar_configuracao tudo ja conta como alterado e os relatorios sao invalidados pela versao
+        if not self._carregando:
+            self.marcar_alterado(dev_id)
 
     def _notificar_observadores(self, evento):
+        if self.despachante is not None:
+            self.despachante.notificar(self.observers, evento)
+            return
         for observer in self.observers:
             observer.update(evento)
 
-    def adicionar_dispositivo(self, dev_id: str, tipo: TipoDispositivo, nome: str, atributos: dict = None):
+    def ativar_despacho_assincrono(self, capacidade: int = 1000,
+                                   politica: PoliticaTransbordo = PoliticaTransbordo.BLOQUEAR):
+        """Passa a entregar eventos aos observers em threads, sem bloquear os comandos."""
+        self.desativar_despacho_assincrono()
+        self.despachante = DespachanteAssincrono(capacidade, politica)
+
+    def desativar_despacho_assincrono(self):
+        if self.despachante is not None:
+            self.despachante.parar()
+            self.despachante = None
+
+    def drain(self, timeout: float = None) -> bool:
+        """Espera os observers receberem todos os eventos pendentes."""
+        if self.despachante is None:
+            return True
+        return self.despachante.drain(timeout)
+
+    def ativar_salvamento_automatico(self, persistencia: Persistencia, atraso: float = 2.0,
+                                     atraso_maximo: float = 30.0):
+        """Passa a salvar a configuracao sozinho, `atraso` segundos depois da ultima alteracao."""
+        self.desativar_salvamento_automatico()
+        self.salvamento = SalvamentoAutomatico(self, persistencia, atraso, atraso_maximo)
+
+    def desativar_salvamento_automatico(self):
+        """Grava o que estiver pendente e para o salvamento automatico."""
+        if self.salvamento is not None:
+            self.salvamento.parar()
+            self.salvamento = None
+
+    def marcar_alterado(self, dev_id: str):
+        """Registra que a configuracao do dispositivo mudou (ex.: atributo alterado direto no objeto).
+
+        Alem de entrar no proximo salvamento, descarta os relatorios em cache que leram
+        o dispositivo. Escritas em atributos validados ja chamam este metodo sozinhas.
+        """
+        self._marcar_alterados((dev_id,))
+
+    def _marcar_alterados(self, dev_ids, rotinas=()):
+        with self._lock_alteracoes:
+            self._dispositivos_alterados.update(dev_ids)
+            self._rotinas_alteradas.update(rotinas)
+            if self.cache_relatorios is not None:
+                self._alterados_relatorios.update(dev_ids)
+        if self.salvamento is not None:
+            self.salvamento.agendar()
+
+    def retirar_alteracoes(self) -> tuple:
+        """Devolve e zera (ids de dispositivos alterados, nomes de rotinas alteradas, tudo alterado)."""
+        with self._lock_alteracoes:
+            alteracoes = (self._dispositivos_alterados, self._rotinas_alteradas, self._tudo_alterado)
+            self._dispositivos_alterados = set()
+            self._rotinas_alteradas = set()
+            self._tudo_alterado = False
+        return alteracoes
+
+    @staticmethod
+    def classe_do_tipo(tipo):
+        """Classe de dispositivo usada para o tipo (TipoDispositivo ou nome), importada no primeiro uso."""
+        return TIPOS.classe(tipo)
+
+    def _criar_dispositivo(self, dev_id: str, tipo: TipoDispositivo, nome: str, atributos: dict = None) -> Dispositivo:
+        """Cria o dispositivo com os atributos e o guarda no hub, sem eventos nem log."""
         if dev_id in self.dispositivos:
             raise ValueError(f"Dispositivo com ID '{dev_id}' ja existe.")
 
-        device = None
-        if tipo == TipoDispositivo.PORTA:
-            device = Porta(dev_id, nome)
-        elif tipo == TipoDispositivo.LUZ:
-            device = Luz(dev_id, nome)
-        elif tipo == TipoDispositivo.TOMADA:
-            device = Tomada(dev_id, nome)
-        
-        elif tipo == TipoDispositivo.TERMOSTATO:
-            device = Termostato(dev_id, nome)
-        elif tipo == TipoDispositivo.AR_CONDICIONADO:
-            device = ArCondicionado(dev_id, nome) 
-        elif tipo == TipoDispositivo.CAIXA_SOM:
-            device = CaixaSom(dev_id, nome)
+        classe = self.classe_do_tipo(tipo)
+        if self.colunar:
+            device = self.dispositivos.adicionar(dev_id, classe, nome)
+        elif self.sob_demanda:
+            # Os atributos ficam no dict recebido; aqui so sao validados
+            device = RegistroDispositivo(dev_id, nome, classe, atributos)
         else:
-            raise ValueError(f"Tipo de dispositivo '{tipo.name}' nao suportado.")
+            device = classe(dev_id, nome)
 
-        # Aplicar atributos iniciais, se houver
+        # Aplicar atributos iniciais, se houver (validados pelos descritores da classe)
         if atributos:
-            for attr, value in atributos.items():
-                try:
-                    setattr(device, attr, value)
-                except ValidacaoAtributo as e:
-                    raise ValidacaoAtributo(f"Erro ao definir atributo '{attr}' para {dev_id}: {e}")
-                except AttributeError:
-                    print(f"Aviso: Atributo '{attr}' nao existe para o dispositivo '{tipo.name}'.")
+            try:
+                if self.sob_demanda:
+                    classe.esquema.validar(device, atributos)
+                else:
+                    device.esquema.decodificar(device, atributos) # na visao colunar, o esquema das colunas
+            except ValidacaoAtributo:
+                if self.colunar:
+                    self.dispositivos.pop(dev_id)
+                raise
+
+        if not self.colunar:
+            if not self.sob_demanda:
+                device._ao_alterar = self._ao_alterar # depois dos atributos iniciais, que nao contam
+            self.dispositivos[dev_id] = device
+        self._versao_dispositivos += 1
+        return device
 
-        self.dispositivos[dev_id] = device
-        self._notificar_observadores(EventoHub(f"DispositivoAdicionado", {'id': dev_id, 'tipo': tipo.name}))
+    def adicionar_dispositivo(self, dev_id: str, tipo: TipoDispositivo, nome: str, atributos: dict = None):
+        device = self._criar_dispositivo(dev_id, tipo, nome, atributos)
+        self.marcar_alterado(dev_id)
+        self._notificar_observadores(EventoHub(f"DispositivoAdicionado", {'id': dev_id, 'tipo': device.tipo.name}))
         self.logger.log_event(dev_id, "adicionado", "N/A", device.estado if device.estado else "N/A") # Estado pode ser None inicialmente
 
 
@@ -65,189 +191,349 @@ class SmartHomeHub:
         if dev_id not in self.dispositivos:
             raise ValueError(f"Dispositivo com ID '{dev_id}' nao encontrado.")
         device = self.dispositivos.pop(dev_id)
+        self._versao_dispositivos += 1
+        self.marcar_alterado(dev_id)
         self._notificar_observadores(EventoHub(f"DispositivoRemovido", {'id': dev_id, 'tipo': device.tipo.name}))
         self.logger.log_event(dev_id, "removido", device.estado if device.estado else "N/A", "N/A")
 
     def obter_dispositivo(self, dev_id: str) -> Dispositivo:
+        if self.sob_demanda:
+            return self.dispositivos.materializar(dev_id)
         return self.dispositivos.get(dev_id)
 
     def executar_comando(self, dev_id: str, comando: str, **kwargs):
-        device = self.obter_dispositivo(dev_id)
+        device = self.dispositivos.get(dev_id)
         if not device:
             raise ValueError(f"Dispositivo com ID '{dev_id}' nao encontrado.")
-
-        estado_anterior = device.estado
+        # Comando, estado e argumentos conferidos na tabela da classe (ComandoInvalido, TransicaoInvalida
+        # ou ValidacaoAtributo), antes de log e observers; no modo sob demanda, antes de criar o dispositivo
+        info = device.comandos.verificar(device, comando, kwargs)
+        if self.sob_demanda:
+            device = self.dispositivos.materializar(dev_id)
+
+        # Origem/destino: o estado, ou o atributo que o comando altera (ex.: modo do ar-condicionado)
+        estado_anterior = info.valor_evento(device)
         try:
-            # Tenta chamar o método correspondente ao comando no dispositivo
-            method = getattr(device, comando)
-            method(**kwargs)
+            info.funcao(device, **kwargs)
             self._notificar_observadores(EventoDispositivo(
-                dev_id, comando, estado_anterior, device.estado, args=kwargs # Passar kwargs como args
+                dev_id, comando, estado_anterior, info.valor_evento(device), args=kwargs # Passar kwargs como args
             ))
-            self.logger.log_event(dev_id, comando, estado_anterior, device.estado)
-        except AttributeError:
-            raise AttributeError(f"Comando '{comando}' nao disponivel para o dispositivo '{dev_id}'.")
+            self.logger.log_event(dev_id, comando, estado_anterior, info.valor_evento(device))
         except TransicaoInvalida as e:
-            self.logger.log_event(dev_id, comando, estado_anterior, device.estado, sucesso=False, erro=str(e))
+            self.logger.log_event(dev_id, comando, estado_anterior, info.valor_evento(device), sucesso=False, erro=str(e))
             raise TransicaoInvalida(f"Falha ao executar comando '{comando}' em '{dev_id}': {e}")
         except Exception as e:
-            self.logger.log_event(dev_id, comando, estado_anterior, device.estado, sucesso=False, erro=str(e))
+            self.logger.log_event(dev_id, comando, estado_anterior, info.valor_evento(device), sucesso=False, erro=str(e))
             raise Exception(f"Erro inesperado ao executar comando '{comando}' em '{dev_id}': {e}")
-
-    def executar_rotina(self, rotina_nome: str):
+        finally:
+            # Mesmo um comando que falhou pode ter mudado atributos
+            self.marcar_alterado(dev_id)
+
+    def executar_comandos_em_lote(self, comandos, parar_no_erro: bool = False):
+        """Executa uma sequencia de (dev_id, comando, kwargs) com I/O agrupado.
+
+        Todas as linhas de log sao gravadas numa unica escrita e os observers
+        recebem um unico EventoLote com os comandos bem sucedidos. Com
+        parar_no_erro=True os comandos seguintes a primeira falha nao sao
+        executados. Devolve (status, erros): um array('b') com um StatusComando
+        por comando e um dict {indice: mensagem} das falhas.
+        """
+        comandos = list(comandos)
+        status = array('b', [StatusComando.NAO_EXECUTADO]) * len(comandos)
+        erros = {}
+        linhas_log = []
+        eventos = []
+
+        for i, (dev_id, comando, kwargs) in enumerate(comandos):
+            kwargs = kwargs or {}
+            device = self.dispositivos.get(dev_id)
+            info = None
+            if device is None:
+                status[i] = StatusComando.DISPOSITIVO_INEXISTENTE
+                erros[i] = f"Dispositivo com ID '{dev_id}' nao encontrado."
+            else:
+                # Recusados pela tabela de comandos: sem linha de log nem evento
+                try:
+                    info = device.comandos.verificar(device, comando, kwargs)
+                except ComandoInvalido as e:
+                    status[i] = StatusComando.COMANDO_INVALIDO
+                    erros[i] = str(e)
+                except TransicaoInvalida as e:
+                    status[i] = StatusComando.TRANSICAO_INVALIDA
+                    erros[i] = str(e)
+                except ValidacaoAtributo as e:
+                    status[i] = StatusComando.ARGUMENTO_INVALIDO
+                    erros[i] = str(e)
+            if info is not None:
+                if self.sob_demanda:
+                    device = self.dispositivos.materializar(dev_id)
+                estado_anterior = info.valor_evento(device)
+                try:
+                    info.funcao(device, **kwargs)
+                    destino = info.valor_evento(device)
+                    eventos.append(EventoDispositivo(dev_id, comando, estado_anterior, destino, args=kwargs))
+                    linhas_log.append((dev_id, comando, estado_anterior, destino, True, ""))
+                    status[i] = StatusComando.OK
+                except TransicaoInvalida as e:
+                    status[i] = StatusComando.TRANSICAO_INVALIDA
+                    erros[i] = f"Falha ao executar comando '{comando}' em '{dev_id}': {e}"
+                    linhas_log.append((dev_id, comando, estado_anterior, info.valor_evento(device), False, str(e)))
+                except Exception as e:
+                    status[i] = StatusComando.ERRO
+                    erros[i] = f"Erro inesperado ao executar comando '{comando}' em '{dev_id}': {e}"
+                    linhas_log.append((dev_id, comando, estado_anterior, info.valor_evento(device), False, str(e)))
+            if parar_no_erro and status[i] != StatusComando.OK:
+                break
+
+        if linhas_log:
+            self._marcar_alterados({linha[0] for linha in linhas_log})
+        if eventos:
+            self._notificar_observadores(EventoLote(eventos))
+        self.logger.log_events(linhas_log)
+        return status, erros
+
+    def executar_rotina(self, rotina_nome: str, paralelo: bool = False, max_paralelismo: int = None):
+        """Executa as acoes da rotina e devolve o resultado de cada uma, na ordem declarada.
+
+        Com paralelo=True as acoes rodam num pool de ate `max_paralelismo`
+        threads: acoes de um mesmo dispositivo continuam em sequencia, na ordem
+        da rotina, e dispositivos diferentes rodam em paralelo. Cada resultado
+        e um dict com id, comando, sucesso, erro e duracao_s.
+        """
         if rotina_nome not in self.rotinas:
             raise ValueError(f"Rotina '{rotina_nome}' nao encontrada.")
 
+        acoes = self.rotinas[rotina_nome]
         print(f"Executando rotina: {rotina_nome}")
         self._notificar_observadores(EventoHub(f"RotinaIniciada", {'nome': rotina_nome}))
 
-        for acao in self.rotinas[rotina_nome]:
+        resultados = [None] * len(acoes)
+        try:
+            if paralelo:
+                # Agrupa as acoes por dispositivo, mantendo a ordem declarada dentro de cada grupo
+                por_dispositivo = {}
+                for i, acao in enumerate(acoes):
+                    por_dispositivo.setdefault(acao['id'], []).append(i)
+                from concurrent.futures import ThreadPoolExecutor # ~15ms de importacao: so em rotinas paralelas
+                with ThreadPoolExecutor(max_workers=max_paralelismo) as pool:
+                    tarefas = [pool.submit(self._executar_acoes_rotina, acoes, indices, resultados)
+                               for indices in por_dispositivo.values()]
+                    for tarefa in tarefas:
+                        tarefa.result()
+            else:
+                self._executar_acoes_rotina(acoes, range(len(acoes)), resultados)
+        finally:
+            # Dispara so depois de todas as acoes terminarem, mesmo se alguma thread falhar
+            self._notificar_observadores(EventoHub(f"RotinaFinalizada", {'nome': rotina_nome}))
+        return resultados
+
+    def _executar_acoes_rotina(self, acoes: list, indices, resultados: list):
+        for i in indices:
+            acao = acoes[i]
             dev_id = acao['id']
             comando = acao['comando']
             argumentos = acao.get('argumentos', {})
+            inicio = time.perf_counter()
             try:
                 self.executar_comando(dev_id, comando, **argumentos)
+                sucesso, erro = True, ""
                 print(f"  - Executado: {comando} em {dev_id}")
             except Exception as e:
+                sucesso, erro = False, str(e)
                 print(f"  - Falha ao executar {comando} em {dev_id}: {e}")
                 # Decide se a rotina deve parar ou continuar em caso de erro
-
-        self._notificar_observadores(EventoHub(f"RotinaFinalizada", {'nome': rotina_nome}))
-
-    def carregar_configuracao(self, config: dict):
-        self.dispositivos = {}
+            resultados[i] = {'id': dev_id, 'comando': comando, 'sucesso': sucesso, 'erro': erro,
+                             'duracao_s': time.perf_counter() - inicio}
+
+    def carregar_configuracao(self, config: dict, em_lote: bool = True):
+        """Substitui os dispositivos e as rotinas pelos da configuracao.
+
+        Em lote (padrao), os dispositivos sao criados sem eventos nem linhas de
+        log individuais; no fim vao um unico EventoHub "ConfiguracaoCarregada"
+        e uma linha de log com o resumo. Com em_lote=False, cada dispositivo
+        passa por adicionar_dispositivo. Com sob_demanda=True, so os registros
+        sao guardados, com os dicts de atributos da configuracao (sem copia).
+        Os tempos de cada fase ficam em self.metricas_carga (segundos).
+        """
+        inicio = time.perf_counter()
+        self.dispositivos = self._novo_armazenamento()
+        self._versao_dispositivos += 1
         self.rotinas = {}
+        with self._lock_alteracoes:
+            self._tudo_alterado = True
+        adicionar = self._criar_dispositivo if em_lote else self.adicionar_dispositivo
 
-        if 'dispositivos' in config:
-            for dev_data in config['dispositivos']:
+        estados = [] # (dev_id, estado inicial), aplicados depois de criar todos
+        self._carregando = True # os atributos iniciais nao marcam os dispositivos como alterados
+        try:
+            for dev_data in config.get('dispositivos', ()):
                 try:
                     dev_id = dev_data['id']
-                    tipo = TipoDispositivo[dev_data['tipo']]
+                    tipo = dev_data['tipo'] # nome; a classe vem do registro de tipos (ver registro.TIPOS)
                     nome = dev_data['nome']
-                    estado_inicial = dev_data.get('estado')
                     atributos = dev_data.get('atributos', {})
-                    self.adicionar_dispositivo(dev_id, tipo, nome, atributos)
-                    # Se houver estado inicial, tentar aplicá-lo
-                    if estado_inicial and self.dispositivos[dev_id].estado != estado_inicial:
-                        try:
-                            # A máquina de estados precisa ser configurada antes de setar o estado
-                            if self.dispositivos[dev_id].machine:
-                                self.dispositivos[dev_id].machine.set_state(estado_inicial)
-                            else:
-                                print(f"Aviso: Máquina de estados não configurada para {dev_id}. Não foi possível definir o estado inicial.")
-                        except Exception as e:
-                            print(f"Aviso: Nao foi possivel definir estado inicial '{estado_inicial}' para {dev_id}: {e}")
+                    adicionar(dev_id, tipo, nome, atributos)
+                    if dev_data.get('estado'):
+                        estados.append((dev_id, dev_data['estado']))
                 except KeyError as e:
                     raise ConfigInvalida(f"Configuracao de dispositivo invalida: faltando chave {e} em {dev_data}")
                 except ValueError as e:
                     raise ConfigInvalida(f"Configuracao de dispositivo invalida: {e} em {dev_data}")
                 except ValidacaoAtributo as e:
                     raise ConfigInvalida(f"Erro de validacao de atributo ao carregar dispositivo {dev_id}: {e}")
+        finally:
+            self._carregando = False
+        criados = time.perf_counter()
+
+        # Se houver estado inicial, tentar aplicá-lo (direto, sem callbacks da FSM)
+        for dev_id, estado_inicial in estados:
+            device = self.dispositivos[dev_id]
+            if device.estado != estado_inicial:
+                try:
+                    device.estado = estado_inicial
+                except Exception as e:
+                    print(f"Aviso: Nao foi possivel definir estado inicial '{estado_inicial}' para {dev_id}: {e}")
+        aplicados = time.perf_counter()
 
         if 'rotinas' in config:
             self.rotinas = config['rotinas']
+        self.metricas_carga = {'dispositivos': criados - inicio, 'estados': aplicados - criados}
+        if em_lote:
+            resumo = {'dispositivos': len(self.dispositivos), 'rotinas': len(self.rotinas),
+                      'tempos': dict(self.metricas_carga)}
+            self._notificar_observadores(EventoHub("ConfiguracaoCarregada", resumo))
+            self.logger.log_event("hub", "configuracao_carregada", "N/A", f"{len(self.dispositivos)} dispositivos")
+        fim = time.perf_counter()
+        self.metricas_carga.update(notificacao=fim - aplicados, total=fim - inicio)
+
+    def definir_rotina(self, nome: str, acoes: list):
+        """Cria ou substitui uma rotina (lista de {'id', 'comando', 'argumentos'})."""
+        self.rotinas[nome] = acoes
+        self._marcar_alterados((), (nome,))
+
+    def remover_rotina(self, nome: str):
+        if nome not in self.rotinas:
+            raise ValueError(f"Rotina '{nome}' nao encontrada.")
+        del self.rotinas[nome]
+        self._marcar_alterados((), (nome,))
+
+    def configuracao_dispositivo(self, dev_id: str) -> dict:
+        """Dados persistidos de um dispositivo (ver obter_configuracao), ou None se ele nao existe."""
+        device = self.dispositivos.get(dev_id)
+        return None if device is None else self._configuracao_dispositivo(dev_id, device)
+
+    @staticmethod
+    def _configuracao_dispositivo(dev_id: str, device) -> dict:
+        return {
+            "id": dev_id,
+            "tipo": device.tipo.name,
+            "nome": device.nome,
+            "estado": device.estado,
+            "atributos": device.esquema.codificar(device) # atributos declarados pela classe (ver EsquemaDispositivo)
+        }
 
     def obter_configuracao(self) -> dict:
-        dispositivos_config = []
-        for dev_id, device in self.dispositivos.items():
-            dev_data = {
-                "id": dev_id,
-                "tipo": device.tipo.name,
-                "nome": device.nome,
-                "estado": device.estado,
-                "atributos": {}
-            }
-            # Coletar atributos específicos que devem ser persistidos
-            if isinstance(device, Luz):
-                dev_data["atributos"]["brilho"] = device.brilho
-                dev_data["atributos"]["cor"] = device.cor.name
-            elif isinstance(device, Tomada):
-                dev_data["atributos"]["potencia_w"] = device.potencia_w
-                # O consumo_wh é uma métrica, não um atributo de configuração
-            elif isinstance(device, Porta):
-                # Porta não tem atributos adicionais para persistir além do estado
-                pass
-            elif isinstance(device, Termostato):
-                dev_data["atributos"]["temperatura"] = device.temperatura
-                dev_data["atributos"]["modo"] = device.modo.name
-            elif isinstance(device, ArCondicionado):
-                dev_data["atributos"]["temperatura"] = device.temperatura
-                dev_data["atributos"]["ligado"] = device.ligado
-                dev_data["atributos"]["modo"] = device.modo.name
-            elif isinstance(device, CaixaSom):
-                dev_data["atributos"]["volume"] = device.volume
-
-            dispositivos_config.append(dev_data)
-
+        dispositivos_config = [self._configuracao_dispositivo(dev_id, device)
+                               for dev_id, device in self.dispositivos.items()]
         return {
-            "hub": {"nome": "Casa Exemplo", "versao": "1.0"},
+            "hub": dict(self.info_hub),
             "dispositivos": dispositivos_config,
             "rotinas": self.rotinas
         }
 
     # --- Implementação dos Relatórios ---
 
-    def gerar_relatorio_consumo_tomadas(self):
-        events = self.logger.read_events()
-        consumo_por_tomada = {}
-
-        for event in events:
-            if event['id_dispositivo'] in self.dispositivos and self.dispositivos[event['id_dispositivo']].tipo == TipoDispositivo.TOMADA:
-                if event['evento'] == 'ligar' and event['sucesso'] == 'True':
-                    # Registra o timestamp de ligar
-                    self.dispositivos[event['id_dispositivo']]._tempo_ligada_inicio = datetime.datetime.fromisoformat(event['timestamp'])
-                elif event['evento'] == 'desligar' and event['sucesso'] == 'True':
-                    # Calcula o consumo se a tomada estava ligada
-                    tomada = self.dispositivos[event['id_dispositivo']]
-                    if tomada._tempo_ligada_inicio:
-                        tempo_ligada_fim = datetime.datetime.fromisoformat(event['timestamp'])
-                        duracao_segundos = (tempo_ligada_fim - tomada._tempo_ligada_inicio).total_seconds()
-                        duracao_horas = duracao_segundos / 3600
-                        consumo_periodo = tomada.potencia_w * duracao_horas
-                        consumo_por_tomada.setdefault(tomada.id, 0.0)
-                        consumo_por_tomada[tomada.id] += consumo_periodo
-                        tomada._tempo_ligada_inicio = None # Reseta
-
-        relatorio = []
-        for dev_id, total_wh in consumo_por_tomada.items():
-            relatorio.append({
-                'id_dispositivo': dev_id,
-                'total_wh': total_wh
-            })
-        return relatorio
-
-    def gerar_relatorio_tempo_luz_ligada(self):
-        events = self.logger.read_events()
-        tempo_ligado_por_luz = {} # {id_luz: {'start_time': datetime, 'total_seconds': 0}}
-
-        for event in events:
-            if event['id_dispositivo'] in self.dispositivos and self.dispositivos[event['id_dispositivo']].tipo == TipoDispositivo.LUZ:
-                dev_id = event['id_dispositivo']
-                timestamp = datetime.datetime.fromisoformat(event['timestamp'])
-
-                if dev_id not in tempo_ligado_por_luz:
-                    tempo_ligado_por_luz[dev_id] = {'start_time': None, 'total_seconds': 0.0}
-
-                if event['evento'] == 'ligar' and event['sucesso'] == 'True':
-                    tempo_ligado_por_luz[dev_id]['start_time'] = timestamp
-                elif event['evento'] == 'desligar' and event['sucesso'] == 'True':
-                    if tempo_ligado_por_luz[dev_id]['start_time']:
-                        duration = (timestamp - tempo_ligado_por_luz[dev_id]['start_time']).total_seconds()
-                        tempo_ligado_por_luz[dev_id]['total_seconds'] += duration
-                        tempo_ligado_por_luz[dev_id]['start_time'] = None # Resetar para o próximo ciclo
-
-        relatorio = []
-        for dev_id, data in tempo_ligado_por_luz.items():
-            # Se a luz ainda estiver ligada no final dos logs, adiciona o tempo até agora
-            if data['start_time']:
-                duration = (datetime.datetime.now() - data['start_time']).total_seconds()
-                data['total_seconds'] += duration
-            
-            relatorio.append({
-                'id_dispositivo': dev_id,
-                'tempo_total_horas': data['total_seconds'] / 3600
-            })
-        return relatorio
+    def _assinatura_relatorios(self) -> tuple:
+        """Muda sempre que todos os relatorios podem mudar: log novo ou dispositivos adicionados/removidos.
+
+        Atributos alterados (ex.: potencia de uma tomada) nao entram aqui: a escrita
+        marca o id (marcar_alterado), que descarta so as entradas do cache que o leram.
+        """
+        return self.logger.assinatura(), self._versao_dispositivos, id(self.dispositivos), len(self.dispositivos)
+
+    def _consultar_cache(self):
+        """Aplica ao cache os dispositivos alterados desde a ultima consulta e devolve a assinatura atual."""
+        with self._lock_alteracoes:
+            alterados, self._alterados_relatorios = self._alterados_relatorios, set()
+        if alterados:
+            self.cache_relatorios.invalidar_dispositivos(alterados)
+        return self._assinatura_relatorios()
+
+    @staticmethod
+    def _com_periodo(agregador, linhas):
+        # Numa janela, cada linha leva os limites dela
+        if agregador.inicio_periodo is None and agregador.fim_periodo is None:
+            return linhas
+        return ({**linha, 'inicio_periodo': agregador.inicio_periodo, 'fim_periodo': agregador.fim_periodo}
+                for linha in linhas)
+
+    @classmethod
+    def _resultado(cls, agregador) -> object:
+        resultado = agregador.resultado()
+        if isinstance(resultado, list):
+            resultado = list(cls._com_periodo(agregador, resultado))
+        return resultado
+
+    def _gerar_relatorios(self, agregadores: list, inicio=None, fim=None) -> dict:
+        inicio, fim = normalizar_instante(inicio), normalizar_instante(fim)
+        cache = self.cache_relatorios
+        assinatura = self._consultar_cache() if cache is not None else None
+        relatorios = {}
+        faltando = []
+        for agregador in agregadores:
+            resultado = cache.obter((agregador.nome, inicio, fim), assinatura) if cache is not None else None
+            if resultado is None:
+                faltando.append(agregador)
+            else:
+                relatorios[agregador.nome] = resultado
+        if faltando:
+            for instancia in self._calcular_agregadores(faltando, inicio, fim):
+                resultado = self._resultado(instancia)
+                if cache is not None:
+                    # O que depende do instante atual e refeito a cada consulta, mas sem reler o log
+                    recalcular = partial(self._resultado, instancia) if instancia.depende_do_instante() else None
+                    cache.guardar((instancia.nome, inicio, fim), assinatura, resultado, recalcular,
+                                  instancia.dispositivos_lidos())
+                relatorios[instancia.nome] = resultado
+        return {agregador.nome: relatorios[agregador.nome] for agregador in agregadores}
+
+    def _calcular_agregadores(self, agregadores: list, inicio, fim) -> list:
+        """Agregadores alimentados com o log: os pedidos, numa janela, ou todos, pelo checkpoint."""
+        if inicio is not None or fim is not None:
+            return self._agregadores_periodo(agregadores, inicio, fim)
+        # O checkpoint cobre todos os agregadores, entao todos sao atualizados com a cauda nova do log
+        todos = [agregador(self.dispositivos) for agregador in AGREGADORES]
+        self.estado_relatorios.atualizar(self.logger, todos, self.backend_relatorios, self.processos_relatorios)
+        return todos
+
+    def _agregadores_periodo(self, agregadores: list, inicio: str, fim: str) -> list:
+        """Agregadores so com os eventos de [inicio, fim), sem usar nem mexer no checkpoint.
+
+        So o trecho da janela e lido (achado por busca binaria no log). Para
+        cortar intervalos que comecaram antes de `inicio`, o ultimo evento de
+        inicio/fim de cada dispositivo antes da janela e buscado pelo indice.
+        """
+        instancias = [agregador(self.dispositivos) for agregador in agregadores]
+        for agregador in instancias:
+            agregador.definir_periodo(inicio, fim)
+            if inicio is not None and isinstance(agregador, AgregadorIntervalos):
+                ids = [dev_id for dev_id, device in self.dispositivos.items() if device.tipo == agregador.tipo]
+                eventos = {agregador.evento_inicio, agregador.evento_fim}
+                for dev_id, event in self.logger.ultimos_eventos_antes(ids, inicio, eventos).items():
+                    if event['evento'] == agregador.evento_inicio:
+                        agregador.abrir_intervalo(dev_id)
+        self.logger.flush()
+        trechos = [(arquivo, self.logger.offset_do_instante(inicio, arquivo) if inicio is not None else 0)
+                   for arquivo in self.logger.arquivos_log(inicio, fim)]
+        MotorRelatorios(instancias).alimentar_log(self.logger, trechos, fim, self.backend_relatorios,
+                                                  self.processos_relatorios)
+        return instancias
+
+    def gerar_relatorio_consumo_tomadas(self, inicio=None, fim=None):
+        return self._gerar_relatorios([AgregadorConsumoTomadas], inicio, fim)[AgregadorConsumoTomadas.nome]
+
+    def gerar_relatorio_tempo_luz_ligada(self, inicio=None, fim=None):
+        return self._gerar_relatorios([AgregadorTempoLuzLigada], inicio, fim)[AgregadorTempoLuzLigada.nome]
 
     def gerar_relatorio_temperatura_media_termostato(self):
         termostatos = [d for d in self.dispositivos.values() if d.tipo == TipoDispositivo.TERMOSTATO]
@@ -257,58 +543,103 @@ class SmartHomeHub:
             return {"temperatura_media": media}
         return {"temperatura_media": None}
 
-    def gerar_relatorio_tempo_tocando_caixa_som(self):
-        events = self.logger.read_events()
-        tempo_tocando_por_caixa = {} # {id_caixa: {'start_time': datetime, 'total_seconds': 0}}
-
-        for event in events:
-            if event['id_dispositivo'] in self.dispositivos and self.dispositivos[event['id_dispositivo']].tipo == TipoDispositivo.CAIXA_SOM:
-                dev_id = event['id_dispositivo']
-                timestamp = datetime.datetime.fromisoformat(event['timestamp'])
-
-                if dev_id not in tempo_tocando_por_caixa:
-                    tempo_tocando_por_caixa[dev_id] = {'start_time': None, 'total_seconds': 0.0}
-
-                if event['evento'] == 'tocar' and event['sucesso'] == 'True':
-                    tempo_tocando_por_caixa[dev_id]['start_time'] = timestamp
-                elif event['evento'] == 'parar' and event['sucesso'] == 'True':
-                    if tempo_tocando_por_caixa[dev_id]['start_time']:
-                        duration = (timestamp - tempo_tocando_por_caixa[dev_id]['start_time']).total_seconds()
-                        tempo_tocando_por_caixa[dev_id]['total_seconds'] += duration
-                        tempo_tocando_por_caixa[dev_id]['start_time'] = None # Resetar
-
-        relatorio = []
-        for dev_id, data in tempo_tocando_por_caixa.items():
-            if data['start_time']: # Se ainda estiver tocando
-                duration = (datetime.datetime.now() - data['start_time']).total_seconds()
-                data['total_seconds'] += duration
-            relatorio.append({
-                'id_dispositivo': dev_id,
-                'tempo_total_segundos': data['total_seconds']
-            })
-        return relatorio
-
-    def gerar_relatorio_modos_ar_condicionado(self):
-        events = self.logger.read_events()
-        modos_ar_condicionado = []
-        for event in events:
-            if event['id_dispositivo'] in self.dispositivos and self.dispositivos[event['id_dispositivo']].tipo == TipoDispositivo.AR_CONDICIONADO:
-                if event['evento'] == 'alterar_modo' and event['sucesso'] == 'True':
-                    # O estado_destino do evento 'alterar_modo' contém o novo modo
-                    modos_ar_condicionado.append(event['estado_destino'])
-        
-        contagem = Counter(modos_ar_condicionado)
-        return dict(contagem)
-    
-    def gerar_relatorio_dispositivos_mais_usados(self):
-        events = self.logger.read_events()
-        event_counts = {}
-
-        for event in events:
-            dev_id = event['id_dispositivo']
-            if dev_id in self.dispositivos: # Garante que o dispositivo ainda existe
-                event_counts.setdefault(dev_id, 0)
-                event_counts[dev_id] += 1
-
-        sorted_devices = sorted(event_counts.items(), key=lambda item: item[1], reverse=True)
-        return [{'id_dispositivo': dev_id, 'num_eventos': count} for dev_id, count in sorted_devices]
+    def gerar_relatorio_tempo_tocando_caixa_som(self, inicio=None, fim=None):
+        return self._gerar_relatorios([AgregadorTempoCaixaSom], inicio, fim)[AgregadorTempoCaixaSom.nome]
+
+    def gerar_relatorio_modos_ar_condicionado(self, inicio=None, fim=None):
+        return self._gerar_relatorios([AgregadorModosArCondicionado], inicio, fim)[AgregadorModosArCondicionado.nome]
+
+    def gerar_relatorio_dispositivos_mais_usados(self, inicio=None, fim=None):
+        return self._gerar_relatorios([AgregadorDispositivosMaisUsados], inicio, fim)[AgregadorDispositivosMaisUsados.nome]
+
+    def linhas_relatorios(self, nomes: list = None, inicio=None, fim=None) -> dict:
+        """{nome: gerador das linhas (dicts)} dos relatorios pedidos (None = todos), com uma unica leitura do log.
+
+        As linhas saem do estado dos agregadores sob demanda, sem montar o
+        relatorio inteiro na memoria (ver exportacao). Nao passa pelo cache.
+        """
+        inicio, fim = normalizar_instante(inicio), normalizar_instante(fim)
+        todos = [agregador.nome for agregador in AGREGADORES] + ['temperatura_media_termostato']
+        nomes = todos if nomes is None else list(nomes)
+        for nome in nomes:
+            if nome not in todos:
+                raise ValueError(f"Relatorio '{nome}' nao existe.")
+        pedidos = [agregador for agregador in AGREGADORES if agregador.nome in nomes]
+        instancias = {agregador.nome: agregador for agregador in self._calcular_agregadores(pedidos, inicio, fim)} if pedidos else {}
+        linhas = {}
+        for nome in nomes:
+            if nome == 'temperatura_media_termostato':
+                linhas[nome] = iter([self.gerar_relatorio_temperatura_media_termostato()])
+            else:
+                linhas[nome] = self._com_periodo(instancias[nome], instancias[nome].linhas())
+        return linhas
+
+    def gerar_todos_relatorios(self, inicio=None, fim=None) -> dict:
+        """Gera todos os relatorios lendo o log de eventos uma unica vez.
+
+        `inicio`/`fim` (datetime ou ISO) limitam os relatorios do log a [inicio, fim);
+        a temperatura media dos termostatos e sempre a atual (nao fica no log).
+        """
+        relatorios = self._gerar_relatorios(AGREGADORES, inicio, fim)
+        relatorios['temperatura_media_termostato'] = self.gerar_relatorio_temperatura_media_termostato()
+        return relatorios
+
+
+# benchmarks: carregar uma configuracao grande (dispositivo a dispositivo e em lote)
+# e recusar comandos pela tabela de comandos; `python -m smart_home.core.hub [n] [carga|recusas]`
+if __name__ == '__main__':
+    import contextlib
+    import os
+    import sys
+    import tempfile
+
+    def medir_carga(config: dict, pasta: str, nulo) -> 'SmartHomeHub':
+        """Carrega `config` um a um e em lote; devolve o hub da carga em lote."""
+        for em_lote in (False, True):
+            hub = SmartHomeHub()
+            hub.observers = [ConsoleObserver(), FileObserver(os.path.join(pasta, 'eventos.log.csv'))]
+            with contextlib.redirect_stdout(nulo): # o ConsoleObserver imprime cada evento
+                hub.carregar_configuracao(config, em_lote=em_lote)
+            hub.observers[1].flush()
+            tempos = ' | '.join(f"{fase} {segundos * 1e3:.0f}ms" for fase, segundos in hub.metricas_carga.items())
+            print(f"{'em lote' if em_lote else 'um a um':>8}: {len(config['dispositivos'])} dispositivos | {tempos}")
+        return hub
+
+    def medir_recusas(hub: 'SmartHomeHub', n: int, nulo):
+        """Comandos recusados pela tabela de comandos: sem chamar o metodo nem gravar no log."""
+        hub.observers = []
+        registrados = hub.logger.registrados
+        for rotulo, comando, kwargs in [('comando inexistente', 'voar', {}),
+                                        ('estado invalido', 'definir_brilho', {'brilho': 10}),
+                                        ('argumento invalido', 'definir_brilho', {'brilho': 150})]:
+            if rotulo == 'argumento invalido':
+                with contextlib.redirect_stdout(nulo):
+                    hub.executar_comando('dev_0', 'ligar')
+                registrados += 1 # o 'ligar' e gravado
+            t = time.perf_counter()
+            for _ in range(n):
+                try:
+                    hub.executar_comando('dev_0', comando, **kwargs)
+                except (ComandoInvalido, TransicaoInvalida, ValidacaoAtributo):
+                    pass
+            print(f"{rotulo:>19}: {n} recusas em {(time.perf_counter() - t) * 1e3:.0f}ms")
+        print(f"linhas de log das recusas: {hub.logger.registrados - registrados}")
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    medicoes = sys.argv[2:] or ['carga', 'recusas']
+    tipos = [(TipoDispositivo.LUZ, 'off', {'brilho': 70, 'cor': 'QUENTE'}),
+             (TipoDispositivo.TOMADA, 'on', {'potencia_w': 120}),
+             (TipoDispositivo.PORTA, 'trancada', {})]
+    config = {'dispositivos': [{'id': f"dev_{i}", 'tipo': tipos[i % 3][0].name, 'nome': f"Dispositivo {i}",
+                                'estado': tipos[i % 3][1], 'atributos': tipos[i % 3][2]} for i in range(n)],
+              'rotinas': {}}
+    with tempfile.TemporaryDirectory() as pasta, open(os.devnull, 'w') as nulo:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        if 'carga' in medicoes:
+            hub = medir_carga(config, pasta, nulo)
+        else:
+            hub = SmartHomeHub()
+            hub.observers = []
+            hub.carregar_configuracao(config, em_lote=True)
+        if 'recusas' in medicoes:
+            medir_recusas(hub, n, nulo)
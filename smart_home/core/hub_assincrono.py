@@ -0,0 +1,206 @@
+# fachada asyncio sobre o SmartHomeHub
+import asyncio
+import contextlib
+import functools
+from smart_home.core.hub import SmartHomeHub
+from smart_home.core.eventos import Evento
+from smart_home.core.observers import Observer, ObserverAssincrono
+from smart_home.core.persistencia import Persistencia
+
+
+class _PonteAssincrona(Observer):
+    """Observer sincrono registrado no hub que repassa os eventos ao loop asyncio."""
+    def __init__(self, fachada):
+        self.fachada = fachada
+
+    def update(self, event: Evento):
+        loop = self.fachada._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.fachada._fila_eventos.put_nowait, event)
+
+
+class AsyncSmartHomeHub:
+    """Versao async do SmartHomeHub, para uso dentro de um loop asyncio.
+
+    Os metodos do hub (comandos, rotinas, relatorios, configuracao) rodam num
+    executor, entao os observers sincronos e o I/O de arquivos nao bloqueiam o
+    loop. Um semaforo limita quantas operacoes ocupam o executor ao mesmo
+    tempo; comandos no mesmo dispositivo sao serializados, na ordem de chegada.
+    Observers async (ObserverAssincrono) recebem os eventos no proprio loop,
+    na ordem em que o hub os emitiu.
+    """
+    def __init__(self, hub: SmartHomeHub = None, max_concorrencia: int = 100, executor=None):
+        if max_concorrencia < 1:
+            raise ValueError("max_concorrencia deve ser >= 1.")
+        self.hub = hub if hub is not None else SmartHomeHub()
+        self.max_concorrencia = max_concorrencia
+        self.executor = executor # None = executor padrao do loop
+        self.observers_assincronos = []
+        self.erros_observers = 0
+        self._semaforo = asyncio.Semaphore(max_concorrencia)
+        self._locks_dispositivos = {} # {dev_id: [asyncio.Lock, comandos usando o lock]}
+        self._loop = None
+        self._fila_eventos = None
+        self._entrega = None
+        self.hub.observers.append(_PonteAssincrona(self))
+
+    def adicionar_observer(self, observer: ObserverAssincrono):
+        self.observers_assincronos.append(observer)
+
+    def _iniciar(self):
+        # Liga a fachada ao loop na primeira chamada async
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._fila_eventos = asyncio.Queue()
+            self._entrega = self._loop.create_task(self._entregar_eventos())
+
+    async def _entregar_eventos(self):
+        while True:
+            evento = await self._fila_eventos.get()
+            try:
+                for observer in self.observers_assincronos:
+                    try:
+                        await observer.update(evento)
+                    except Exception:
+                        self.erros_observers += 1
+            finally:
+                self._fila_eventos.task_done()
+
+    async def _executar(self, func, *args, **kwargs):
+        self._iniciar()
+        async with self._semaforo:
+            return await self._loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    @contextlib.asynccontextmanager
+    async def _lock_dispositivo(self, dev_id: str):
+        # O lock so existe enquanto ha comandos no dispositivo: ids removidos ou usados uma vez nao acumulam
+        entrada = self._locks_dispositivos.get(dev_id)
+        if entrada is None:
+            entrada = self._locks_dispositivos[dev_id] = [asyncio.Lock(), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                yield
+        finally:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del self._locks_dispositivos[dev_id]
+
+    @contextlib.asynccontextmanager
+    async def _locks_dispositivos_de(self, dev_ids):
+        # Lotes e rotinas tocam varios dispositivos: os locks sao tomados em ordem de id, sem deadlock
+        async with contextlib.AsyncExitStack() as pilha:
+            for dev_id in sorted(set(dev_ids)):
+                await pilha.enter_async_context(self._lock_dispositivo(dev_id))
+            yield
+
+    async def executar_comando(self, dev_id: str, comando: str, **kwargs):
+        async with self._lock_dispositivo(dev_id):
+            return await self._executar(self.hub.executar_comando, dev_id, comando, **kwargs)
+
+    async def remover_dispositivo(self, dev_id: str):
+        async with self._lock_dispositivo(dev_id): # espera os comandos ja enfileirados no dispositivo
+            return await self._executar(self.hub.remover_dispositivo, dev_id)
+
+    async def executar_comandos_em_lote(self, comandos, parar_no_erro: bool = False):
+        comandos = list(comandos)
+        async with self._locks_dispositivos_de(dev_id for dev_id, _, _ in comandos):
+            return await self._executar(self.hub.executar_comandos_em_lote, comandos, parar_no_erro)
+
+    async def executar_rotina(self, rotina_nome: str, paralelo: bool = False, max_paralelismo: int = None):
+        acoes = self.hub.rotinas.get(rotina_nome, ()) # rotina inexistente: o hub levanta o erro
+        async with self._locks_dispositivos_de(acao['id'] for acao in acoes):
+            return await self._executar(self.hub.executar_rotina, rotina_nome, paralelo, max_paralelismo)
+
+    async def gerar_relatorio_consumo_tomadas(self, inicio=None, fim=None):
+        return await self._executar(self.hub.gerar_relatorio_consumo_tomadas, inicio, fim)
+
+    async def gerar_relatorio_tempo_luz_ligada(self, inicio=None, fim=None):
+        return await self._executar(self.hub.gerar_relatorio_tempo_luz_ligada, inicio, fim)
+
+    async def gerar_relatorio_temperatura_media_termostato(self):
+        return await self._executar(self.hub.gerar_relatorio_temperatura_media_termostato)
+
+    async def gerar_relatorio_tempo_tocando_caixa_som(self, inicio=None, fim=None):
+        return await self._executar(self.hub.gerar_relatorio_tempo_tocando_caixa_som, inicio, fim)
+
+    async def gerar_relatorio_modos_ar_condicionado(self, inicio=None, fim=None):
+        return await self._executar(self.hub.gerar_relatorio_modos_ar_condicionado, inicio, fim)
+
+    async def gerar_relatorio_dispositivos_mais_usados(self, inicio=None, fim=None):
+        return await self._executar(self.hub.gerar_relatorio_dispositivos_mais_usados, inicio, fim)
+
+    async def gerar_todos_relatorios(self, inicio=None, fim=None) -> dict:
+        return await self._executar(self.hub.gerar_todos_relatorios, inicio, fim)
+
+    async def carregar_configuracao(self, persistencia: Persistencia):
+        def carregar():
+            self.hub.carregar_configuracao(persistencia.carregar_configuracao())
+        await self._executar(carregar)
+
+    async def salvar_configuracao(self, persistencia: Persistencia):
+        def salvar():
+            persistencia.salvar_configuracao(self.hub.obter_configuracao())
+        await self._executar(salvar)
+
+    async def drain(self):
+        """Espera os observers async receberem todos os eventos ja emitidos."""
+        if self._fila_eventos is None:
+            return
+        # Os eventos chegam via call_soon_threadsafe: cede o loop uma vez antes do join
+        await asyncio.sleep(0)
+        await self._fila_eventos.join()
+
+    async def fechar(self):
+        await self.drain()
+        if self._entrega is not None:
+            self._entrega.cancel()
+            try:
+                await self._entrega
+            except asyncio.CancelledError:
+                pass
+        self._loop = self._fila_eventos = self._entrega = None
+
+
+# benchmark: muitas requisicoes concorrentes num unico loop
+if __name__ == '__main__':
+    import io
+    import os
+    import sys
+    import tempfile
+    import time
+    from smart_home.core.dispositivos import TipoDispositivo
+    from smart_home.core.logger import Durabilidade, Logger
+
+    class ContadorAssincrono(ObserverAssincrono):
+        def __init__(self):
+            self.total = 0
+
+        async def update(self, event):
+            self.total += 1
+
+    async def principal(n: int):
+        hub = SmartHomeHub()
+        hub.observers = [] # sem console/arquivo, para medir so a fachada
+        hub.logger.ativar_buffer(durabilidade=Durabilidade.NENHUMA)
+        for i in range(100):
+            hub.adicionar_dispositivo(f"luz_{i}", TipoDispositivo.LUZ, "Luz")
+        fachada = AsyncSmartHomeHub(hub, max_concorrencia=32)
+        contador = ContadorAssincrono()
+        fachada.adicionar_observer(contador)
+
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): # os dispositivos imprimem cada transicao
+            comandos = [fachada.executar_comando(f"luz_{i % 100}", 'ligar' if (i // 100) % 2 == 0 else 'desligar')
+                        for i in range(n)]
+            await asyncio.gather(*comandos)
+            await fachada.drain()
+        duracao = time.perf_counter() - inicio
+        print(f"{n} comandos concorrentes em {duracao:.2f}s ({n / duracao:,.0f}/s), "
+              f"{contador.total} eventos entregues aos observers async")
+        await fachada.fechar()
+        hub.logger.desativar_buffer()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        asyncio.run(principal(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000))
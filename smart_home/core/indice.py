@@ -0,0 +1,111 @@
+# indice lateral do log: id_dispositivo -> offsets das linhas
+import heapq
+import os
+from array import array
+
+
+class IndiceDispositivos:
+    """Offsets (inicio de cada linha/registro) dos eventos de cada dispositivo num arquivo de log.
+
+    Fica em memoria e num arquivo lateral `<log>.idx`, so com append:
+    linhas "offset id_dispositivo" seguidas de um marcador "# fim" com o byte
+    do log coberto ate ali; entradas depois do ultimo marcador sao ignoradas.
+    O indice e descartado e refeito se o log for substituido (outro inode)
+    ou truncado.
+    """
+    def __init__(self, arquivo_log: str):
+        self.arquivo_log = arquivo_log
+        self.caminho = arquivo_log + '.idx'
+        self.offsets = {}    # {dev_id: array('q') de offsets, em ordem crescente}
+        self.coberto_ate = 0 # bytes do log ja indexados
+        self.inode = None
+        self._pendentes = [] # (offset, dev_id) ainda nao gravados no .idx
+        self._carregar()
+
+    def _limpar(self):
+        self.offsets = {}
+        self.coberto_ate = 0
+        self._pendentes = []
+        if os.path.exists(self.caminho):
+            os.remove(self.caminho)
+
+    def _carregar(self):
+        if not os.path.exists(self.arquivo_log):
+            return
+        self.inode = os.stat(self.arquivo_log).st_ino
+        if not os.path.exists(self.caminho):
+            return
+        entradas = []
+        confirmadas = 0
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            cabecalho = f.readline().split()
+            if cabecalho != ['SHIDX', str(self.inode)]:
+                f.close()
+                self._limpar()
+                return
+            for linha in f:
+                if not linha.endswith('\n'):
+                    break # linha incompleta
+                offset, dev_id = linha[:-1].split(' ', 1)
+                if offset == '#':
+                    self.coberto_ate = int(dev_id)
+                    confirmadas = len(entradas)
+                else:
+                    entradas.append((int(offset), dev_id))
+        for offset, dev_id in entradas[:confirmadas]:
+            self._adicionar(dev_id, offset)
+
+    def _adicionar(self, dev_id: str, offset: int):
+        offsets = self.offsets.get(dev_id)
+        if offsets is None:
+            offsets = self.offsets[dev_id] = array('q')
+        offsets.append(offset)
+
+    def adicionar(self, linhas, fim: int):
+        """Registra pares (offset, dev_id) gravados no log em `coberto_ate`, que agora vai ate `fim`."""
+        for offset, dev_id in linhas:
+            self._adicionar(dev_id, offset)
+            self._pendentes.append((offset, dev_id))
+        self.coberto_ate = fim
+
+    def salvar(self):
+        """Grava no .idx as entradas pendentes e o novo marcador de cobertura."""
+        if not os.path.exists(self.arquivo_log) or (not self._pendentes and os.path.exists(self.caminho)):
+            return # log apagado (ex.: retencao de segmentos) ou nada novo
+        novo = not os.path.exists(self.caminho)
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            partes = [f"SHIDX {self.inode}\n"] if novo else []
+            partes.extend(f"{offset} {dev_id}\n" for offset, dev_id in self._pendentes)
+            partes.append(f"# {self.coberto_ate}\n")
+            f.write(''.join(partes))
+        self._pendentes = []
+
+    def atualizar(self, logger):
+        """Indexa o trecho do log ainda nao coberto (ou refaz o indice se o log mudou)."""
+        if not os.path.exists(self.arquivo_log):
+            return
+        info = os.stat(self.arquivo_log)
+        if info.st_ino != self.inode or info.st_size < self.coberto_ate:
+            self._limpar()
+            self.inode = info.st_ino
+        if info.st_size == self.coberto_ate:
+            return
+        linhas = []
+        fim = self.coberto_ate
+        for event, offset, fim in logger.iter_events_com_inicio(self.coberto_ate, self.arquivo_log):
+            linhas.append((offset, event['id_dispositivo']))
+        self.adicionar(linhas, fim)
+        self.salvar()
+
+    def reconstruir(self, logger):
+        """Descarta o indice e o refaz lendo o log inteiro."""
+        self._limpar()
+        self.inode = os.stat(self.arquivo_log).st_ino if os.path.exists(self.arquivo_log) else None
+        self.atualizar(logger)
+
+    def offsets_de(self, dev_ids) -> list:
+        """Offsets de todos os eventos dos dispositivos, na ordem do log."""
+        listas = [self.offsets[dev_id] for dev_id in dev_ids if dev_id in self.offsets]
+        if len(listas) == 1:
+            return listas[0]
+        return list(heapq.merge(*listas))
@@ -0,0 +1,391 @@
+# formato binario compacto do log de eventos
+#
+# Layout do arquivo:
+#   cabecalho (8 bytes): b'SHLB' + versao (uint16) + 2 bytes livres
+#   em seguida, uma sequencia de slots de 32 bytes, cada um comecando por uma tag:
+#   b'E' registro de evento:
+#        tag, sucesso (uint8), 2 bytes livres, timestamp em segundos desde a
+#        epoch (int64) e os ids (uint32) de dispositivo, evento, estado de
+#        origem, estado de destino e erro
+#   b'S' inicio de um bloco do dicionario de strings: tag, 3 bytes livres, id
+#        da primeira string (uint32), numero de slots de conteudo (uint32) e
+#        tamanho do conteudo em bytes (uint32)
+#   b'C' slot de conteudo do bloco: tag + 31 bytes das strings UTF-8, cada uma
+#        precedida do seu tamanho (uint32); o ultimo slot e completado com zeros
+#
+# Cada string nova e definida num bloco b'S' gravado na mesma escrita e logo
+# antes do primeiro registro que a usa, entao o arquivo continua sendo so
+# append. O id 0 e a string vazia (ex.: erro de um evento bem sucedido).
+# Como tudo e alinhado em slots, a partir de qualquer slot da para achar o
+# proximo registro (busca binaria por timestamp, ver offset_do_instante).
+# O formato supoe um unico processo escrevendo no arquivo.
+import csv
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+from functools import lru_cache
+
+MAGICO = b'SHLB'
+VERSAO = 2
+CABECALHO = struct.pack('<4sH2x', MAGICO, VERSAO)
+CAMPOS = ['timestamp', 'id_dispositivo', 'evento', 'estado_origem', 'estado_destino', 'sucesso', 'erro']
+
+_EVENTO = struct.Struct('<cB2xq5I')
+TAMANHO_REGISTRO = _EVENTO.size
+_BLOCO = struct.Struct('<c3xIII16x')
+_CONTEUDO = TAMANHO_REGISTRO - 1 # bytes de strings por slot b'C'
+_TAMANHO_STRING = struct.Struct('<I')
+_TIMESTAMP = struct.Struct('<q')
+_TAG_EVENTO = ord('E')
+_TAG_BLOCO = ord('S')
+_TAG_CONTEUDO = ord('C')
+
+
+@lru_cache(maxsize=4096)
+def _epoch(timestamp: str) -> int:
+    # os eventos de um mesmo segundo compartilham o timestamp ISO
+    return int(datetime.fromisoformat(timestamp).timestamp())
+
+
+@lru_cache(maxsize=4096)
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch).isoformat(timespec='seconds')
+
+
+class TabelaStrings:
+    """Dicionario de strings do log: id (posicao na lista) <-> string."""
+    def __init__(self):
+        self.limpar()
+
+    def limpar(self):
+        self.strings = ['']
+        self.ids = {'': 0}
+        self.lido_ate = len(CABECALHO) # bytes do arquivo ja percorridos em busca de blocos
+        self.inode = None
+
+    def id(self, texto: str, novas: list) -> int:
+        i = self.ids.get(texto)
+        if i is None:
+            i = self.ids[texto] = len(self.strings)
+            self.strings.append(sys.intern(texto))
+            novas.append(texto)
+        return i
+
+    def definir(self, primeiro: int, novas: list):
+        # Blocos ja conhecidos (primeiro id menor que o tamanho atual) sao ignorados
+        if primeiro == len(self.strings):
+            for texto in novas:
+                self.ids[texto] = len(self.strings)
+                self.strings.append(sys.intern(texto))
+
+    def percorrer(self, mm, inicio: int, fim: int) -> int:
+        """Le os blocos de strings entre inicio e fim, pulando os registros de evento.
+
+        So um slot b'S' comeca com b'S' num limite de slot, entao os blocos
+        sao achados com mm.find, sem visitar os registros um a um.
+        """
+        base = len(CABECALHO)
+        fim = min(fim, len(mm))
+        pos = lido = inicio
+        while pos < fim:
+            achado = mm.find(b'S', pos, fim)
+            if achado < 0:
+                break
+            desalinhado = (achado - base) % TAMANHO_REGISTRO
+            if desalinhado:
+                pos = achado + TAMANHO_REGISTRO - desalinhado # byte 'S' dentro de um registro
+                continue
+            proximo = self._ler_bloco(mm, achado)
+            if proximo is None:
+                return achado # bloco incompleto, ainda sendo escrito
+            pos = lido = proximo
+        return max(lido, base + (fim - base) // TAMANHO_REGISTRO * TAMANHO_REGISTRO)
+
+    def _ler_bloco(self, mm, pos: int):
+        if pos + _BLOCO.size > len(mm):
+            return None
+        _, primeiro, slots, tamanho = _BLOCO.unpack_from(mm, pos)
+        inicio = pos + _BLOCO.size
+        fim = inicio + slots * TAMANHO_REGISTRO
+        if fim > len(mm):
+            return None # bloco incompleto, ainda sendo escrito
+        conteudo = b''.join(mm[slot + 1:slot + TAMANHO_REGISTRO]
+                            for slot in range(inicio, fim, TAMANHO_REGISTRO))[:tamanho]
+        novas = []
+        i = 0
+        while i < tamanho:
+            n, = _TAMANHO_STRING.unpack_from(conteudo, i)
+            i += _TAMANHO_STRING.size
+            novas.append(conteudo[i:i + n].decode('utf-8'))
+            i += n
+        self.definir(primeiro, novas)
+        return fim
+
+    @classmethod
+    def do_arquivo(cls, caminho: str) -> 'TabelaStrings':
+        """Tabela com todas as strings ja definidas no arquivo (usada por quem vai escrever nele)."""
+        tabela = cls()
+        for _ in ler_registros(caminho, tabela, inicio=os.path.getsize(caminho) if os.path.exists(caminho) else 0):
+            pass
+        return tabela
+
+
+def codificar(rows, tabela: TabelaStrings) -> bytes:
+    """Converte linhas no formato do CSV (timestamp ISO, ids, sucesso, erro) em bytes do log binario."""
+    novas = []
+    primeiro = len(tabela.strings)
+    registros = []
+    for timestamp, id_dispositivo, evento, origem, destino, sucesso, erro in rows:
+        registros.append(_EVENTO.pack(
+            b'E', sucesso is True or sucesso == 'True', _epoch(timestamp),
+            tabela.id(id_dispositivo, novas), tabela.id(evento, novas), tabela.id(origem, novas),
+            tabela.id(destino, novas), tabela.id(erro or "", novas)))
+    if not novas:
+        return b''.join(registros)
+    conteudo = b''.join(_TAMANHO_STRING.pack(len(dados)) + dados
+                        for dados in (texto.encode('utf-8') for texto in novas))
+    slots = [b'C' + conteudo[i:i + _CONTEUDO].ljust(_CONTEUDO, b'\0') for i in range(0, len(conteudo), _CONTEUDO)]
+    return b''.join([_BLOCO.pack(b'S', primeiro, len(slots), len(conteudo)), *slots, *registros])
+
+
+class RegistroBinario(Mapping):
+    """Evento lido do log binario, com a mesma interface do dict lido do CSV.
+
+    Guarda so os numeros do registro; as strings sao as do dicionario,
+    compartilhadas por todos os registros, e o timestamp ISO e gerado sob demanda.
+    """
+    __slots__ = ('_campos', '_strings')
+    _INDICES = {'id_dispositivo': 2, 'evento': 3, 'estado_origem': 4, 'estado_destino': 5, 'erro': 6}
+
+    def __init__(self, campos: tuple, strings: list):
+        self._campos = campos # (sucesso, epoch, dispositivo, evento, origem, destino, erro)
+        self._strings = strings
+
+    def __getitem__(self, campo: str):
+        i = self._INDICES.get(campo)
+        if i is not None:
+            return self._strings[self._campos[i]]
+        if campo == 'sucesso':
+            return 'True' if self._campos[0] else 'False'
+        if campo == 'timestamp':
+            return _iso(self._campos[1])
+        raise KeyError(campo)
+
+    def __iter__(self):
+        return iter(CAMPOS)
+
+    def __len__(self):
+        return len(CAMPOS)
+
+    @property
+    def epoch(self) -> int:
+        return self._campos[1]
+
+    def __repr__(self):
+        return f"RegistroBinario({dict(self)})"
+
+
+def _verificar_cabecalho(mm, caminho: str):
+    magico, versao = struct.unpack_from('<4sH', mm)
+    if magico != MAGICO:
+        raise ValueError(f"'{caminho}' nao e um log binario.")
+    if versao != VERSAO:
+        raise ValueError(f"'{caminho}' usa a versao {versao} do log binario (suportada: {VERSAO}).")
+
+
+def ler_registros(caminho: str, tabela: TabelaStrings, inicio: int = 0):
+    """Gera pares (RegistroBinario, offset logo apos o registro) a partir do byte `inicio`.
+
+    O arquivo e mapeado em memoria e cada registro e lido direto do mapa,
+    sem decodificar texto. Registros e blocos incompletos no fim (ainda sendo
+    escritos) sao ignorados. `tabela` guarda o dicionario entre chamadas,
+    entao retomar de um offset so percorre o trecho ainda nao lido.
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) <= len(CABECALHO):
+        return
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _verificar_cabecalho(mm, caminho)
+        info = os.fstat(f.fileno())
+        if tabela.inode != info.st_ino or len(mm) < tabela.lido_ate:
+            tabela.limpar() # arquivo novo, truncado ou rotacionado
+            tabela.inode = info.st_ino
+        inicio = max(inicio, len(CABECALHO))
+        if inicio > tabela.lido_ate:
+            tabela.lido_ate = tabela.percorrer(mm, tabela.lido_ate, inicio)
+
+        tamanho = len(mm)
+        strings = tabela.strings
+        unpack = _EVENTO.unpack_from
+        pos = inicio
+        while pos < tamanho:
+            tag = mm[pos]
+            if tag == _TAG_EVENTO:
+                if pos + _EVENTO.size > tamanho:
+                    break
+                campos = unpack(mm, pos)[1:]
+                pos += _EVENTO.size
+                if pos > tabela.lido_ate:
+                    tabela.lido_ate = pos
+                yield RegistroBinario(campos, strings), pos
+            elif tag == _TAG_BLOCO:
+                proximo = tabela._ler_bloco(mm, pos)
+                if proximo is None:
+                    break
+                pos = proximo
+                if pos > tabela.lido_ate:
+                    tabela.lido_ate = pos
+            else:
+                raise ValueError(f"Log binario corrompido na posicao {pos}.")
+
+
+def ler_registros_em(caminho: str, tabela: TabelaStrings, offsets):
+    """Gera os registros que comecam em cada um dos `offsets` (em ordem crescente), sem ler o resto."""
+    if not offsets:
+        return
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        info = os.fstat(f.fileno())
+        if tabela.inode != info.st_ino or len(mm) < tabela.lido_ate:
+            tabela.limpar()
+            tabela.inode = info.st_ino
+        # As strings de um registro sao definidas antes dele no arquivo
+        ultimo = offsets[-1]
+        if ultimo > tabela.lido_ate:
+            tabela.lido_ate = tabela.percorrer(mm, tabela.lido_ate, ultimo)
+        unpack = _EVENTO.unpack_from
+        for offset in offsets:
+            yield RegistroBinario(unpack(mm, offset)[1:], tabela.strings)
+
+
+def offset_do_instante(caminho: str, instante: str) -> int:
+    """Offset do primeiro registro com timestamp >= `instante` (ISO), por busca binaria nos slots.
+
+    Supoe o log em ordem de tempo (como e gravado). Sem registro a partir do
+    instante, devolve o offset logo apos o ultimo slot completo.
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) <= len(CABECALHO):
+        return len(CABECALHO)
+    alvo = _epoch(instante)
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _verificar_cabecalho(mm, caminho)
+        base = len(CABECALHO)
+        n = (len(mm) - base) // TAMANHO_REGISTRO
+
+        def registro(slot: int) -> int:
+            # Primeiro slot de registro a partir de `slot` (n se nao houver)
+            while slot < n:
+                pos = base + slot * TAMANHO_REGISTRO
+                tag = mm[pos]
+                if tag == _TAG_EVENTO:
+                    return slot
+                if tag == _TAG_BLOCO:
+                    slot += 1 + _BLOCO.unpack_from(mm, pos)[2]
+                elif tag == _TAG_CONTEUDO:
+                    slot += 1
+                else:
+                    raise ValueError(f"Log binario corrompido na posicao {pos}.")
+            return n
+
+        inicio, fim = 0, n
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            slot = registro(meio)
+            if slot >= n or _TIMESTAMP.unpack_from(mm, base + slot * TAMANHO_REGISTRO + 4)[0] >= alvo:
+                fim = meio
+            else:
+                inicio = slot + 1
+        return base + min(registro(inicio), n) * TAMANHO_REGISTRO
+
+
+def dividir(caminho: str, inicio: int, partes: int) -> list:
+    """Divide o log a partir de `inicio` em ate `partes` faixas [a, b) de bytes, cada uma comecando num registro ou bloco."""
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        _verificar_cabecalho(mm, caminho)
+        base = len(CABECALHO)
+        inicio = max(inicio, base)
+        fim = base + (len(mm) - base) // TAMANHO_REGISTRO * TAMANHO_REGISTRO
+        limites = [inicio]
+        for i in range(1, partes):
+            pos = inicio + (fim - inicio) * i // partes
+            pos = base + -(-(pos - base) // TAMANHO_REGISTRO) * TAMANHO_REGISTRO # proximo limite de slot
+            while pos < fim and mm[pos] == _TAG_CONTEUDO:
+                pos += TAMANHO_REGISTRO
+            if limites[-1] < pos < fim:
+                limites.append(pos)
+    limites.append(max(fim, limites[-1]))
+    return [(a, b) for a, b in zip(limites, limites[1:]) if b > a]
+
+
+def converter_csv_para_binario(origem: str, destino: str, tamanho_lote: int = 10_000):
+    """Grava em `destino` (log binario) todos os eventos do CSV `origem`."""
+    tabela = TabelaStrings()
+    with open(origem, 'r', newline='', encoding='utf-8') as entrada, open(destino, 'wb') as saida:
+        saida.write(CABECALHO)
+        lote = []
+        for row in csv.reader(entrada):
+            if row == CAMPOS:
+                continue
+            lote.append(row)
+            if len(lote) >= tamanho_lote:
+                saida.write(codificar(lote, tabela))
+                lote.clear()
+        saida.write(codificar(lote, tabela))
+
+
+def converter_binario_para_csv(origem: str, destino: str):
+    """Grava em `destino` (CSV com cabecalho) todos os eventos do log binario `origem`."""
+    with open(destino, 'w', newline='', encoding='utf-8') as saida:
+        writer = csv.writer(saida)
+        writer.writerow(CAMPOS)
+        writer.writerows([event[campo] for campo in CAMPOS]
+                         for event, _ in ler_registros(origem, TabelaStrings()))
+
+
+# benchmark: tamanho do arquivo e tempo de leitura completa, CSV x binario
+if __name__ == '__main__':
+    import random
+    import tempfile
+    import time
+    from smart_home.core.relatorios import AGREGADORES, MotorRelatorios
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = os.path.join(pasta, 'eventos.csv')
+        caminho_bin = os.path.join(pasta, 'eventos.bin')
+        inicio = int(datetime(2024, 1, 1).timestamp())
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CAMPOS)
+            ligadas = set()
+            for i in range(n):
+                dev_id = f"luz_{random.randrange(500)}"
+                comando = 'desligar' if dev_id in ligadas else 'ligar'
+                ligadas.symmetric_difference_update([dev_id])
+                origem, destino = ('on', 'off') if comando == 'desligar' else ('off', 'on')
+                writer.writerow([_iso(inicio + i), dev_id, comando, origem, destino, True, ""])
+
+        t = time.perf_counter()
+        converter_csv_para_binario(caminho_csv, caminho_bin)
+        print(f"conversao CSV -> binario: {time.perf_counter() - t:.2f}s")
+        print(f"tamanho: CSV {os.path.getsize(caminho_csv) / 2 ** 20:.1f} MiB | "
+              f"binario {os.path.getsize(caminho_bin) / 2 ** 20:.1f} MiB")
+
+        def ler_csv():
+            with open(caminho_csv, 'r', newline='', encoding='utf-8') as f:
+                yield from csv.DictReader(f)
+
+        def ler_bin():
+            for event, _ in ler_registros(caminho_bin, TabelaStrings()):
+                yield event
+
+        dispositivos = {}
+        for nome, ler in [('CSV', ler_csv), ('binario', ler_bin)]:
+            t = time.perf_counter()
+            total = sum(1 for _ in ler())
+            varredura = time.perf_counter() - t
+            t = time.perf_counter()
+            MotorRelatorios([agregador(dispositivos) for agregador in AGREGADORES]).alimentar(ler())
+            relatorios = time.perf_counter() - t
+            print(f"{nome:>8}: varredura de {total} eventos {varredura:.2f}s | todos os agregadores {relatorios:.2f}s")
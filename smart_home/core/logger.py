@@ -1,44 +1,440 @@
-# Singleton para logging em CSV
+# Singleton para logging em CSV (ou no formato binario de log_binario)
+import atexit
+import bisect
 import csv
 import datetime
+import io
 import os
-from threading import Lock
+import time
+from enum import Enum
+from threading import Lock, RLock, Timer
+from smart_home.core import log_binario
+from smart_home.core.indice import IndiceDispositivos
+from smart_home.core.segmentos import (LogSegmentado, Particao, ler_csv, ler_csv_com_inicio, ler_csv_em,
+                                      normalizar_instante, offset_do_instante_csv)
+
+class Durabilidade(Enum):
+    """O que fazer com o arquivo a cada lote gravado pelo modo com buffer."""
+    NENHUMA = "NENHUMA" # so escreve no buffer do arquivo aberto
+    FLUSH = "FLUSH"     # descarrega o buffer para o sistema operacional
+    FSYNC = "FSYNC"     # flush + os.fsync, sobrevive a queda de energia
+
+class FormatoLog(Enum):
+    CSV = "CSV"
+    BINARIO = "BINARIO" # registros de largura fixa + dicionario de strings, ver log_binario
 
 class Logger:
     _instance = None
     _lock = Lock()
+    CAMPOS = ['timestamp', 'id_dispositivo', 'evento', 'estado_origem', 'estado_destino', 'sucesso', 'erro']
 
-    def __new__(cls, filename='data/eventos.csv'):
+    def __new__(cls, filename='data/eventos.csv', formato: FormatoLog = None):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super().__new__(cls)
                 cls._instance.filename = filename
+                # Sem formato explicito, arquivos .bin usam o formato binario
+                if formato is None:
+                    formato = FormatoLog.BINARIO if filename.endswith('.bin') else FormatoLog.CSV
+                cls._instance.formato = FormatoLog(formato)
+                cls._instance._tabela_escrita = None # dicionario de strings, carregado na primeira escrita
+                cls._instance._tabelas_leitura = {} # {arquivo: TabelaStrings} para retomar leituras binarias
+                cls._instance._segmentos = None # None = um unico arquivo, ver ativar_segmentacao
+                cls._instance._indices = {} # {arquivo: IndiceDispositivos}, criados na primeira consulta por dispositivo
+                cls._instance._buffer = None # None = modo padrao, uma escrita por evento
+                cls._instance._buffer_lock = RLock()
+                cls._instance._registrados = 0 # eventos recebidos por log_event/log_events
                 cls._instance._initialize_csv()
             return cls._instance
 
     def _initialize_csv(self):
         # Cria o arquivo CSV com cabeçalho se ele não existir
         if not os.path.exists(self.filename):
+            if self.formato == FormatoLog.BINARIO:
+                with open(self.filename, 'wb') as f:
+                    f.write(log_binario.CABECALHO)
+                self._tabela_escrita = log_binario.TabelaStrings()
+                return
             with open(self.filename, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow(['timestamp', 'id_dispositivo', 'evento', 'estado_origem', 'estado_destino', 'sucesso', 'erro'])
+                writer.writerow(self.CAMPOS)
+
+    def _abrir_para_escrita(self):
+        # Binario tambem para o CSV: f.tell() da o offset exato de cada linha para o indice
+        return open(self.filename, 'ab')
+
+    def _escrever(self, f, rows: list):
+        """Grava as linhas no arquivo aberto com uma unica escrita, atualizando o indice se houver."""
+        indice = self._indices.get(self.filename)
+        inicio = f.tell() if indice is not None else None
+        if self.formato == FormatoLog.BINARIO:
+            if self._tabela_escrita is None:
+                self._tabela_escrita = log_binario.TabelaStrings.do_arquivo(self.filename)
+            dados = log_binario.codificar(rows, self._tabela_escrita)
+            # Os registros de largura fixa ficam no fim, depois de um eventual bloco de strings
+            primeiro = inicio + len(dados) - len(rows) * log_binario.TAMANHO_REGISTRO if inicio is not None else 0
+            offsets = range(primeiro, primeiro + len(rows) * log_binario.TAMANHO_REGISTRO, log_binario.TAMANHO_REGISTRO)
+        else:
+            texto = io.StringIO()
+            writer = csv.writer(texto)
+            if inicio is None:
+                writer.writerows(rows)
+                dados = texto.getvalue().encode('utf-8')
+            else:
+                linhas = []
+                for row in rows:
+                    writer.writerow(row)
+                    linhas.append(texto.getvalue().encode('utf-8'))
+                    texto.seek(0)
+                    texto.truncate()
+                dados = b''.join(linhas)
+                offsets = []
+                posicao = inicio
+                for linha in linhas:
+                    offsets.append(posicao)
+                    posicao += len(linha)
+        f.write(dados)
+        # So mantem o indice se ele ja cobria o log ate aqui; senao atualizar() completa na leitura
+        if indice is not None and indice.coberto_ate == inicio:
+            indice.adicionar(zip(offsets, (row[1] for row in rows)), inicio + len(dados))
 
     def log_event(self, id_dispositivo: str, evento: str, estado_origem: str, estado_destino: str, sucesso: bool = True, erro: str = ""):
         timestamp = datetime.datetime.now().isoformat(timespec='seconds')
-        with open(self.filename, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, id_dispositivo, evento, estado_origem, estado_destino, sucesso, erro])
+        row = [timestamp, id_dispositivo, evento, estado_origem, estado_destino, sucesso, erro]
+        self._registrar([row])
 
-    def read_events(self):
-        """Lê todos os eventos do arquivo CSV."""
-        events = []
-        if not os.path.exists(self.filename):
-            return events
-        with open(self.filename, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                events.append(row)
-        return events
+    def log_events(self, linhas: list):
+        """Registra varios eventos com uma unica escrita.
+
+        Cada linha e (id_dispositivo, evento, estado_origem, estado_destino, sucesso, erro).
+        """
+        if not linhas:
+            return
+        timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+        rows = [[timestamp, *linha] for linha in linhas]
+        self._registrar(rows)
+
+    def _registrar(self, rows: list):
+        # Conta e grava sob o mesmo lock: threads concorrentes nao perdem incrementos do contador
+        with self._buffer_lock:
+            self._registrados += len(rows)
+            if self._buffer is not None:
+                self._bufferizar(rows)
+            else:
+                self._gravar_direto(rows)
+
+    def _gravar_direto(self, rows: list):
+        # Sem buffer: grava e descarrega na hora (o lock protege dicionario de strings e segmentos)
+        with self._buffer_lock:
+            if self._segmentos is not None:
+                self._segmentos.gravar(rows)
+                self._segmentos.flush()
+                return
+            with self._abrir_para_escrita() as f:
+                self._escrever(f, rows)
+
+    # --- Log segmentado ---
+
+    def ativar_segmentacao(self, pasta: str = None, particao: Particao = Particao.DIA, max_bytes: int = None,
+                           retencao_dias: float = None, max_segmentos: int = None):
+        """Passa a gravar em segmentos por periodo/tamanho, com manifesto e retencao.
+
+        Por padrao os segmentos ficam numa pasta com o nome do arquivo de log
+        (data/eventos.csv -> data/eventos/). O arquivo unico anterior nao e
+        migrado nem lido enquanto a segmentacao estiver ativa.
+        """
+        with self._buffer_lock:
+            self.desativar_segmentacao()
+            if self._buffer is not None:
+                self._gravar_lote(self.durabilidade)
+                self._arquivo.close()
+                self._arquivo = None
+            base, _ = os.path.splitext(self.filename)
+            self._segmentos = LogSegmentado(
+                pasta or base, prefixo=os.path.basename(base), binario=self.formato == FormatoLog.BINARIO,
+                particao=particao, max_bytes=max_bytes, retencao_dias=retencao_dias, max_segmentos=max_segmentos)
+            self._segmentos.aplicar_retencao()
+        if not getattr(self, '_atexit_segmentos', False):
+            atexit.register(self.desativar_segmentacao)
+            self._atexit_segmentos = True
+
+    def desativar_segmentacao(self):
+        """Fecha o segmento atual, salva o manifesto e volta a gravar no arquivo unico."""
+        with self._buffer_lock:
+            if self._segmentos is None:
+                return
+            if self._buffer is not None:
+                self._gravar_lote(self.durabilidade)
+                self._arquivo = self._abrir_para_escrita()
+            self._segmentos.fechar()
+            self._segmentos = None
+
+    # --- Modo com buffer (group commit) ---
+
+    def ativar_buffer(self, max_linhas: int = 500, intervalo: float = 1.0,
+                      durabilidade: Durabilidade = Durabilidade.FLUSH):
+        """Mantem o arquivo de log aberto e grava as linhas em lotes.
+
+        Um lote e gravado quando o buffer chega a `max_linhas`, quando passam
+        `intervalo` segundos desde a primeira linha pendente ou em flush().
+        """
+        if max_linhas < 1 or intervalo <= 0:
+            raise ValueError("max_linhas deve ser >= 1 e intervalo > 0.")
+        with self._buffer_lock:
+            self.desativar_buffer()
+            self.max_linhas = max_linhas
+            self.intervalo = intervalo
+            self.durabilidade = Durabilidade(durabilidade)
+            # Com segmentacao, o LogSegmentado mantem o arquivo do segmento atual aberto
+            self._arquivo = self._abrir_para_escrita() if self._segmentos is None else None
+            self._timer = None
+            self._buffer = []
+        if not getattr(self, '_atexit_registrado', False):
+            atexit.register(self.desativar_buffer)
+            self._atexit_registrado = True
+
+    def desativar_buffer(self):
+        """Grava o que estiver pendente, fecha o arquivo e volta ao modo de uma escrita por evento."""
+        with self._buffer_lock:
+            if self._buffer is None:
+                return
+            self.flush()
+            if self._arquivo is not None:
+                self._arquivo.close()
+            self._buffer = None
+
+    def _bufferizar(self, rows: list):
+        with self._buffer_lock:
+            if self._buffer is None: # buffer desativado por outra thread
+                self._gravar_direto(rows)
+                return
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.max_linhas:
+                self._gravar_lote(self.durabilidade)
+            elif self._timer is None:
+                self._timer = Timer(self.intervalo, self._flush_por_tempo)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_por_tempo(self):
+        with self._buffer_lock:
+            self._timer = None
+            if self._buffer:
+                self._gravar_lote(self.durabilidade)
+
+    def _gravar_lote(self, durabilidade: Durabilidade):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._segmentos is not None:
+            if self._buffer:
+                self._segmentos.gravar(self._buffer)
+                self._buffer.clear()
+            if durabilidade != Durabilidade.NENHUMA:
+                self._segmentos.flush(fsync=durabilidade == Durabilidade.FSYNC)
+            return
+        if self._buffer:
+            self._escrever(self._arquivo, self._buffer)
+            self._buffer.clear()
+        if durabilidade != Durabilidade.NENHUMA:
+            self._arquivo.flush()
+        if durabilidade == Durabilidade.FSYNC:
+            os.fsync(self._arquivo.fileno())
+
+    def flush(self):
+        """Grava imediatamente as linhas pendentes, deixando-as visiveis para leitura."""
+        with self._buffer_lock:
+            if self._buffer is not None:
+                self._gravar_lote(Durabilidade.FSYNC if self.durabilidade == Durabilidade.FSYNC else Durabilidade.FLUSH)
+            self._salvar_indices()
+
+    def _salvar_indices(self):
+        with self._buffer_lock:
+            for indice in self._indices.values():
+                indice.salvar()
+
+    @property
+    def registrados(self) -> int:
+        """Eventos recebidos por log_event/log_events neste processo (inclusive os ainda no buffer)."""
+        return self._registrados
+
+    def assinatura(self) -> tuple:
+        """Resumo do estado do log que muda sempre que ele muda, sem le-lo.
+
+        Junta os eventos recebidos por este processo (inclusive os ainda no
+        buffer) com arquivo, inode, tamanho e mtime do arquivo atual, para
+        perceber tambem escritas de outros processos, rotacao e truncamento.
+        """
+        with self._buffer_lock:
+            if self._segmentos is None:
+                arquivo, segmentos = self.filename, None
+            else:
+                lista = self._segmentos.segmentos
+                arquivo = self._segmentos.caminho(lista[-1]) if lista else None
+                segmentos = (len(lista), lista[0]['arquivo'] if lista else None)
+            registrados = self._registrados
+        try:
+            info = os.stat(arquivo)
+            arquivo = (arquivo, info.st_ino, info.st_size, info.st_mtime_ns)
+        except (OSError, TypeError):
+            pass # sem arquivo ainda
+        return registrados, segmentos, arquivo
+
+    def arquivos_log(self, desde=None, ate=None, dev_id: str = None) -> list:
+        """Arquivos do log em ordem de gravacao; com segmentacao, so os que podem ter eventos do filtro."""
+        if self._segmentos is None:
+            return [self.filename] if os.path.exists(self.filename) else []
+        with self._buffer_lock:
+            return [self._segmentos.caminho(segmento)
+                    for segmento in self._segmentos.selecionar(desde, ate, dev_id)]
+
+    def iter_events(self, inicio: int = 0, desde=None, ate=None, dev_id: str = None):
+        """Gera os eventos do log um a um, sem carregar o arquivo inteiro.
+
+        `inicio` e um offset em bytes no arquivo unico. `desde`/`ate` (datetime
+        ou ISO) limitam os eventos a [desde, ate): o comeco da janela em cada
+        arquivo e achado por busca binaria (ver offset_do_instante) e a leitura
+        para no primeiro evento em `ate` ou depois. Com `dev_id`, so as linhas
+        desse dispositivo sao lidas, pelo indice (ver iter_events_for); com
+        segmentacao, segmentos que nao podem ter os eventos nem sao abertos.
+        """
+        self.flush()
+        desde, ate = normalizar_instante(desde), normalizar_instante(ate)
+        if dev_id is not None:
+            for event in self.iter_events_for([dev_id], inicio, desde, ate):
+                if desde is not None and event['timestamp'] < desde:
+                    continue
+                if ate is not None and event['timestamp'] >= ate:
+                    continue
+                yield event
+            return
+        for arquivo in self.arquivos_log(desde, ate):
+            offset = inicio if self._segmentos is None else 0
+            if desde is not None:
+                offset = max(offset, self.offset_do_instante(desde, arquivo))
+            for event, _ in self.iter_events_com_offset(offset, arquivo):
+                if ate is not None and event['timestamp'] >= ate:
+                    return # log em ordem de tempo: o resto esta fora da janela
+                yield event
+
+    def offset_do_instante(self, instante, arquivo: str = None) -> int:
+        """Offset do primeiro evento com timestamp >= `instante` (datetime ou ISO) em `arquivo`.
+
+        Busca binaria nas posicoes do arquivo, realinhando cada ponto no
+        comeco de uma linha/registro: o custo e logaritmico no tamanho do log.
+        """
+        arquivo = arquivo or self.filename
+        if self.formato == FormatoLog.BINARIO:
+            return log_binario.offset_do_instante(arquivo, normalizar_instante(instante))
+        return offset_do_instante_csv(arquivo, normalizar_instante(instante))
+
+    def ultimos_eventos_antes(self, dev_ids, instante, eventos=None) -> dict:
+        """{dev_id: ultimo evento bem sucedido antes de `instante`} para cada dispositivo que tiver um.
+
+        Com `eventos`, so contam eventos com esses nomes (ex.: {'ligar', 'desligar'}).
+        Os arquivos sao lidos de tras para frente pelo indice por dispositivo,
+        a partir do offset do instante, ate achar o evento de cada um.
+        """
+        self.flush()
+        instante = normalizar_instante(instante)
+        faltando = set(dev_ids)
+        encontrados = {}
+        for arquivo in reversed(self.arquivos_log(ate=instante)):
+            if not faltando:
+                break
+            limite = self.offset_do_instante(instante, arquivo)
+            with self._buffer_lock:
+                indice = self._indice(arquivo)
+                indice.atualizar(self)
+                listas = {dev_id: indice.offsets[dev_id][:] for dev_id in faltando if dev_id in indice.offsets}
+            for dev_id, offsets in listas.items():
+                fim = bisect.bisect_left(offsets, limite)
+                while fim > 0 and dev_id in faltando:
+                    comeco = max(fim - 16, 0)
+                    for event in reversed(list(self._ler_em(arquivo, offsets[comeco:fim]))):
+                        if event['sucesso'] == 'True' and (eventos is None or event['evento'] in eventos):
+                            encontrados[dev_id] = event
+                            faltando.discard(dev_id)
+                            break
+                    fim = comeco
+        return encontrados
+
+    def iter_events_for(self, dev_ids, inicio: int = 0, desde=None, ate=None):
+        """Gera, na ordem do log, so os eventos dos dispositivos em `dev_ids` (um id ou uma colecao).
+
+        Usa o indice lateral de cada arquivo (<arquivo>.idx) para ir direto as
+        linhas de cada dispositivo: o custo e proporcional aos eventos deles,
+        nao ao tamanho do log. `desde`/`ate` so escolhem os segmentos; o filtro
+        de tempo das linhas fica com iter_events.
+        """
+        if isinstance(dev_ids, str):
+            dev_ids = [dev_ids]
+        self.flush()
+        arquivos = []
+        for dev_id in dev_ids:
+            arquivos.extend(arquivo for arquivo in self.arquivos_log(desde, ate, dev_id) if arquivo not in arquivos)
+        if self._segmentos is not None:
+            ordem = {arquivo: i for i, arquivo in enumerate(self.arquivos_log())}
+            arquivos.sort(key=ordem.get)
+        for arquivo in arquivos:
+            with self._buffer_lock:
+                indice = self._indice(arquivo)
+                indice.atualizar(self)
+                offsets = indice.offsets_de(dev_ids)[:] # copia: escritas concorrentes continuam no indice
+            if inicio and self._segmentos is None:
+                offsets = offsets[bisect.bisect_left(offsets, inicio):]
+            yield from self._ler_em(arquivo, offsets)
+
+    def _ler_em(self, arquivo: str, offsets):
+        if self.formato == FormatoLog.BINARIO:
+            return log_binario.ler_registros_em(arquivo, self._tabela_leitura(arquivo), offsets)
+        return ler_csv_em(arquivo, offsets)
+
+    def _indice(self, arquivo: str) -> IndiceDispositivos:
+        indice = self._indices.get(arquivo)
+        if indice is None:
+            if not self._indices:
+                atexit.register(self._salvar_indices)
+            indice = self._indices[arquivo] = IndiceDispositivos(arquivo)
+        return indice
+
+    def reconstruir_indice(self):
+        """Refaz do zero o indice por dispositivo de todos os arquivos do log (ex.: CSV antigo ou editado)."""
+        self.flush()
+        with self._buffer_lock:
+            for arquivo in self.arquivos_log():
+                self._indice(arquivo).reconstruir(self)
+
+    def _tabela_leitura(self, arquivo: str) -> log_binario.TabelaStrings:
+        tabela = self._tabelas_leitura.get(arquivo)
+        if tabela is None:
+            tabela = self._tabelas_leitura[arquivo] = log_binario.TabelaStrings()
+        return tabela
+
+    def iter_events_com_offset(self, inicio: int = 0, arquivo: str = None):
+        """Gera pares (evento, offset em bytes logo apos a linha) a partir do byte `inicio`.
+
+        `arquivo` e um dos arquivos de arquivos_log(); por padrao, o arquivo unico.
+        """
+        self.flush() # linhas ainda no buffer tambem devem ser lidas
+        arquivo = arquivo or self.filename
+        if self.formato == FormatoLog.BINARIO:
+            yield from log_binario.ler_registros(arquivo, self._tabela_leitura(arquivo), inicio)
+            return
+        yield from ler_csv(arquivo, inicio)
+
+    def iter_events_com_inicio(self, inicio: int = 0, arquivo: str = None):
+        """Como iter_events_com_offset, mas gera (evento, offset do inicio da linha, offset logo apos)."""
+        if self.formato == FormatoLog.BINARIO:
+            for event, fim in self.iter_events_com_offset(inicio, arquivo):
+                yield event, fim - log_binario.TAMANHO_REGISTRO, fim
+            return
+        self.flush()
+        yield from ler_csv_com_inicio(arquivo or self.filename, inicio)
+
+    def read_events(self, desde=None, ate=None, dev_id: str = None):
+        """Lê todos os eventos do arquivo de log (ou so os do filtro, ver iter_events)."""
+        return list(self.iter_events(desde=desde, ate=ate, dev_id=dev_id))
 
 # testes
 if __name__ == '__main__':
@@ -53,3 +449,19 @@ if __name__ == '__main__':
     print("\nEventos registrados:")
     for event in logger1.read_events():
         print(event)
+
+    # benchmark: uma escrita por evento x modo com buffer
+    import tempfile
+    n = 20000
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in [None, Durabilidade.NENHUMA, Durabilidade.FLUSH, Durabilidade.FSYNC]:
+            logger1.filename = os.path.join(pasta, f"bench_{modo.name if modo else 'padrao'}.csv")
+            logger1._initialize_csv()
+            if modo:
+                logger1.ativar_buffer(max_linhas=500, durabilidade=modo)
+            inicio = time.perf_counter()
+            for i in range(n):
+                logger1.log_event(f"luz_{i % 50}", "ligar", "off", "on")
+            logger1.desativar_buffer()
+            decorrido = time.perf_counter() - inicio
+            print(f"{modo.name if modo else 'por evento':>10}: {n / decorrido:>10.0f} eventos/s ({decorrido:.3f}s)")
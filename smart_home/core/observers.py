@@ -1,32 +1,120 @@
-
 from abc import ABC, abstractmethod
-from smart_home.core.eventos import Evento, EventoDispositivo, EventoHub
-import json
+from smart_home.core.eventos import Evento, EventoDispositivo, EventoHub, EventoLote
+from threading import RLock, Timer
+import atexit
+import os
+import weakref
 
 class Observer(ABC):
     @abstractmethod
     def update(self, event: Evento):
         pass
 
+class ObserverAssincrono(ABC):
+    """Observer com update async, usado pelo AsyncSmartHomeHub."""
+    @abstractmethod
+    async def update(self, event: Evento):
+        pass
+
 class ConsoleObserver(Observer):
+    @staticmethod
+    def _linha_dispositivo(event: EventoDispositivo) -> str:
+        return f"[EVENTO] Dispositivo: {event.id_dispositivo} | Comando: {event.comando} | De: {event.estado_origem} | Para: {event.estado_destino} | Args: {event.args}"
+
     def update(self, event: Evento):
         if isinstance(event, EventoDispositivo):
-            print(f"[EVENTO] Dispositivo: {event.id_dispositivo} | Comando: {event.comando} | De: {event.estado_origem} | Para: {event.estado_destino} | Args: {event.args}")
+            print(self._linha_dispositivo(event))
+        elif isinstance(event, EventoLote):
+            print("\n".join(map(self._linha_dispositivo, event.eventos)))
         elif isinstance(event, EventoHub):
             print(f"[EVENTO] Hub: {event.tipo} | Dados: {event.detalhes}") # Corrigido para usar event.detalhes
         else:
             print(f"[EVENTO] Generico: {event.tipo} | Dados: {event.dados}")
 
+# FileObservers com arquivo aberto ou eventos na fila; sem referencia forte, nao impedem a coleta
+_PENDENTES = weakref.WeakSet()
+
+@atexit.register
+def _fechar_pendentes():
+    for observer in list(_PENDENTES):
+        observer.fechar()
+
 class FileObserver(Observer):
-    def __init__(self, filename: str):
+    """Grava os eventos em JSON (uma linha por evento) mantendo o arquivo aberto.
+
+    update() apenas enfileira o evento; a serializacao e a escrita acontecem
+    em lote, com um unico write, quando a fila chega a `tamanho_lote`, quando
+    passam `intervalo` segundos ou em flush(). Com `max_bytes` o arquivo e
+    rotacionado (eventos.log.csv -> eventos.log.csv.1 -> ...), mantendo
+    `backups` arquivos antigos.
+    """
+    def __init__(self, filename: str, tamanho_lote: int = 50, intervalo: float = 1.0,
+                 max_bytes: int = None, backups: int = 3):
         self.filename = filename
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._fila = []
+        self._arquivo = None # aberto so na primeira escrita
+        self._timer = None
+        self._lock = RLock()
 
     def update(self, event: Evento):
-        with open(self.filename, 'a') as f:
-            # Formato JSON para facilitar a leitura e parsing
-            log_entry = {
-                "timestamp": event.timestamp.isoformat(),
-                "tipo": event.tipo,
-                "dados": event.dados
-            }
-            f.write(json.dumps(log_entry) + '\n')
+        with self._lock:
+            if isinstance(event, EventoLote):
+                self._fila.extend(event.eventos) # uma linha por evento do lote
+            else:
+                self._fila.append(event)
+            if len(self._fila) >= self.tamanho_lote:
+                self._gravar_lote()
+            elif self._timer is None:
+                _PENDENTES.add(self) # ate o timer disparar, ele mantem o observer vivo
+                self._timer = Timer(self.intervalo, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _abrir(self):
+        os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+        self._arquivo = open(self.filename, 'ab') # binario: tell() e len() do lote em bytes, para max_bytes
+        _PENDENTES.add(self)
+
+    def _rotacionar(self):
+        self._arquivo.close()
+        for i in range(self.backups - 1, 0, -1):
+            origem = f"{self.filename}.{i}"
+            if os.path.exists(origem):
+                os.replace(origem, f"{self.filename}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self._abrir()
+
+    def _gravar_lote(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._fila:
+            return
+        lote = ''.join(event.serializar() + '\n' for event in self._fila).encode('utf-8')
+        self._fila.clear()
+        if self._arquivo is None:
+            self._abrir()
+        if self.max_bytes and self._arquivo.tell() > 0 and self._arquivo.tell() + len(lote) > self.max_bytes:
+            self._rotacionar()
+        self._arquivo.write(lote)
+        self._arquivo.flush()
+
+    def flush(self):
+        """Grava imediatamente os eventos enfileirados."""
+        with self._lock:
+            self._gravar_lote()
+
+    def fechar(self):
+        with self._lock:
+            self._gravar_lote()
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+            _PENDENTES.discard(self)
@@ -1,11 +1,26 @@
+import atexit
 import json
 import os
+import time
+from threading import Lock, Timer
 from smart_home.core.erros import ConfigInvalida
 
 # carregar/salvar configuração em JSON
 class Persistencia:
-    def __init__(self, config_path: str):
+    """Le e grava a configuracao do hub em JSON.
+
+    Com atomica=True (padrao) o arquivo e escrito num temporario e renomeado:
+    uma queda no meio da escrita deixa a configuracao anterior intacta. Com
+    compacta=True o JSON sai sem indentacao nem espacos (configs grandes).
+    salvar_alteracoes re-serializa so os dispositivos e rotinas alterados.
+    """
+    def __init__(self, config_path: str, atomica: bool = True, compacta: bool = False):
         self.config_path = config_path
+        self.atomica = atomica
+        self.compacta = compacta
+        self._dispositivos = {} # {dev_id: trecho JSON} do ultimo salvar_alteracoes
+        self._rotinas = {}      # {nome: trecho JSON}
+        self._lock = Lock()
 
     def carregar_configuracao(self) -> dict:
         if not os.path.exists(self.config_path):
@@ -21,16 +36,212 @@ class Persistencia:
             raise ConfigInvalida(f"Erro ao decodificar JSON: {e}")
         except Exception as e:
             raise ConfigInvalida(f"Erro inesperado ao carregar configuracao: {e}")
+
+    def _codificar(self, valor, nivel: int) -> str:
+        """JSON de um valor que fica `nivel` niveis dentro do documento (mesma saida de json.dump com indent=2)."""
+        if self.compacta:
+            return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+        return json.dumps(valor, indent=2, ensure_ascii=False).replace('\n', '\n' + '  ' * nivel)
+
+    def _gravar(self, texto: str):
+        # Garante que o diretório 'data' existe
+        os.makedirs(os.path.dirname(self.config_path) or '.', exist_ok=True)
+        if not self.atomica:
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                f.write(texto)
+            return
+        temporario = self.config_path + '.tmp'
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                f.write(texto)
+                f.flush()
+                os.fsync(f.fileno()) # o conteudo chega ao disco antes da troca de nomes
+            os.replace(temporario, self.config_path)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
     def salvar_configuracao(self, config: dict):
         try:
-            # Garante que o diretório 'data' existe
-            os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
+            self._gravar(self._codificar(config, 0))
         except Exception as e:
             raise Exception(f"Erro ao salvar configuracao: {e}")
 
-#teste
+    def salvar_alteracoes(self, hub) -> int:
+        """Salva a configuracao do hub re-serializando so o que mudou desde o ultimo salvamento.
+
+        Os trechos JSON de cada dispositivo e rotina ficam guardados; so os
+        marcados como alterados no hub (SmartHomeHub.retirar_alteracoes) sao
+        refeitos. Devolve quantos trechos foram refeitos.
+        """
+        with self._lock:
+            try:
+                dispositivos_alterados, rotinas_alteradas, tudo = hub.retirar_alteracoes()
+                if tudo:
+                    self._dispositivos.clear()
+                    self._rotinas.clear()
+                refeitos = 0
+                dispositivos = {}
+                for dev_id in list(hub.dispositivos):
+                    trecho = None if dev_id in dispositivos_alterados else self._dispositivos.get(dev_id)
+                    if trecho is None:
+                        dev_data = hub.configuracao_dispositivo(dev_id)
+                        if dev_data is None: # removido durante o salvamento
+                            continue
+                        trecho = self._codificar(dev_data, 2)
+                        refeitos += 1
+                    dispositivos[dev_id] = trecho
+                rotinas = {}
+                for nome, acoes in list(hub.rotinas.items()):
+                    trecho = None if nome in rotinas_alteradas else self._rotinas.get(nome)
+                    if trecho is None:
+                        trecho = self._codificar(acoes, 2)
+                        refeitos += 1
+                    rotinas[nome] = trecho
+                self._dispositivos, self._rotinas = dispositivos, rotinas
+                self._gravar(self._montar(hub.info_hub, dispositivos.values(), rotinas))
+                return refeitos
+            except Exception as e:
+                raise Exception(f"Erro ao salvar configuracao: {e}")
+
+    def _montar(self, info_hub: dict, dispositivos, rotinas: dict) -> str:
+        """Junta os trechos no mesmo documento que salvar_configuracao gravaria."""
+        separador = ':' if self.compacta else ': '
+        rotinas = [json.dumps(nome, ensure_ascii=False) + separador + trecho for nome, trecho in rotinas.items()]
+        if self.compacta:
+            return '{"hub":%s,"dispositivos":[%s],"rotinas":{%s}}' % (
+                self._codificar(info_hub, 1), ','.join(dispositivos), ','.join(rotinas))
+        dispositivos = ',\n    '.join(dispositivos)
+        rotinas = ',\n    '.join(rotinas)
+        return ('{\n'
+                f'  "hub": {self._codificar(info_hub, 1)},\n'
+                f'  "dispositivos": ' + (f'[\n    {dispositivos}\n  ]' if dispositivos else '[]') + ',\n'
+                f'  "rotinas": ' + (f'{{\n    {rotinas}\n  }}' if rotinas else '{}') + '\n'
+                '}')
+
+
+class SalvamentoAutomatico:
+    """Salva as alteracoes do hub em segundo plano, agrupando rajadas de mudancas numa unica escrita.
+
+    agendar() (chamado pelo hub a cada alteracao) so anota o instante; um
+    Timer salva quando passam `atraso` segundos sem novas alteracoes, ou no
+    maximo `atraso_maximo` segundos depois da primeira alteracao pendente.
+    """
+    def __init__(self, hub, persistencia: Persistencia, atraso: float = 2.0, atraso_maximo: float = 30.0):
+        self.hub = hub
+        self.persistencia = persistencia
+        self.atraso = atraso
+        self.atraso_maximo = atraso_maximo
+        self.salvamentos = 0
+        self.erros = 0
+        self._primeira = None # instante da primeira alteracao ainda nao salva
+        self._ultima = None
+        self._timer = None
+        self._lock = Lock()
+        atexit.register(self.parar)
+
+    def agendar(self):
+        with self._lock:
+            agora = time.monotonic()
+            self._ultima = agora
+            if self._primeira is None:
+                self._primeira = agora
+            if self._timer is None:
+                self._iniciar_timer(self.atraso)
+
+    def _iniciar_timer(self, espera: float):
+        self._timer = Timer(espera, self._verificar)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _verificar(self):
+        with self._lock:
+            if self._primeira is None:
+                self._timer = None
+                return
+            agora = time.monotonic()
+            espera = min(self._ultima + self.atraso, self._primeira + self.atraso_maximo) - agora
+            if espera > 0: # ainda chegando alteracoes: adia
+                self._iniciar_timer(espera)
+                return
+            self._timer = None
+        self.salvar()
+
+    def salvar(self):
+        """Salva imediatamente as alteracoes pendentes."""
+        with self._lock:
+            self._primeira = self._ultima = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        try:
+            self.persistencia.salvar_alteracoes(self.hub)
+            self.salvamentos += 1
+        except Exception as e:
+            self.erros += 1
+            print(f"Erro no salvamento automatico: {e}")
+
+    def pendente(self) -> bool:
+        with self._lock:
+            return self._primeira is not None
+
+    def parar(self):
+        """Cancela o timer e grava o que estiver pendente."""
+        if self.pendente():
+            self.salvar()
+        atexit.unregister(self.parar)
+
+
+# benchmark: latencia de salvar uma configuracao de 50 mil dispositivos
 if __name__ == '__main__':
-    test_config_path = 'data/config.json'
-    persistencia = Persistencia(test_config_path)
\ No newline at end of file
+    import contextlib
+    import sys
+    import tempfile
+    from smart_home.core.hub import SmartHomeHub
+    from smart_home.core.logger import Logger
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    tipos = [('LUZ', 'off', {'brilho': 70, 'cor': 'QUENTE'}), ('TOMADA', 'on', {'potencia_w': 120}),
+             ('TERMOSTATO', 'aquecimento', {'temperatura': 22})]
+    config = {'dispositivos': [{'id': f"dev_{i}", 'tipo': tipos[i % 3][0], 'nome': f"Dispositivo {i}",
+                                'estado': tipos[i % 3][1], 'atributos': dict(tipos[i % 3][2])} for i in range(n)],
+              'rotinas': {'noite': [{'id': 'dev_0', 'comando': 'desligar'}]}}
+    with tempfile.TemporaryDirectory() as pasta, open(os.devnull, 'w') as nulo:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        hub = SmartHomeHub()
+        hub.observers = []
+        hub.carregar_configuracao(config)
+
+        def medir(rotulo, salvar, repeticoes=5):
+            t = time.perf_counter()
+            for _ in range(repeticoes):
+                with contextlib.redirect_stdout(nulo): # os dispositivos imprimem cada transicao
+                    hub.executar_comando('dev_1', 'desligar' if hub.dispositivos['dev_1'].estado == 'on' else 'ligar')
+                salvar()
+            media = (time.perf_counter() - t) / repeticoes
+            tamanho = os.path.getsize(os.path.join(pasta, 'configuracao.json'))
+            print(f"{rotulo:>24}: {media * 1e3:7.1f}ms por salvamento | {tamanho / 2 ** 20:.1f} MiB")
+
+        caminho = os.path.join(pasta, 'configuracao.json')
+        for compacta in (False, True):
+            completa = Persistencia(caminho, atomica=False, compacta=compacta)
+            medir(f"completa{' compacta' if compacta else ''}",
+                  lambda: completa.salvar_configuracao(hub.obter_configuracao()))
+            atomica = Persistencia(caminho, compacta=compacta)
+            medir(f"atomica{' compacta' if compacta else ''}",
+                  lambda: atomica.salvar_configuracao(hub.obter_configuracao()))
+            incremental = Persistencia(caminho, compacta=compacta)
+            incremental.salvar_alteracoes(hub) # primeira vez: serializa tudo
+            medir(f"incremental{' compacta' if compacta else ''}", lambda: incremental.salvar_alteracoes(hub))
+
+        # rajada de comandos com salvamento automatico: uma unica escrita
+        persistencia = Persistencia(caminho)
+        persistencia.salvar_alteracoes(hub)
+        hub.ativar_salvamento_automatico(persistencia, atraso=0.2)
+        with contextlib.redirect_stdout(nulo):
+            for i in range(200): # desliga e religa 100 tomadas
+                hub.executar_comando(f"dev_{3 * (i % 100) + 1}", 'desligar' if i < 100 else 'ligar')
+        time.sleep(1.0)
+        print(f"rajada de 200 comandos: {hub.salvamento.salvamentos} salvamento(s) automatico(s)")
+        hub.desativar_salvamento_automatico()
@@ -0,0 +1,142 @@
+# registro dos tipos de dispositivo: o modulo de cada tipo so e importado no primeiro uso
+import importlib
+import time
+from threading import RLock
+from smart_home.core.dispositivos import TipoDispositivo
+
+# Grupo de entry points de pacotes de terceiros: nome = tipo, valor = 'modulo:Classe'
+GRUPO_ENTRY_POINTS = 'smart_home.dispositivos'
+
+_NATIVOS = {
+    TipoDispositivo.PORTA: 'smart_home.dispositivos.porta:Porta',
+    TipoDispositivo.LUZ: 'smart_home.dispositivos.luz:Luz',
+    TipoDispositivo.TOMADA: 'smart_home.dispositivos.tomada:Tomada',
+    TipoDispositivo.TERMOSTATO: 'smart_home.dispositivos.termostato:Termostato',
+    TipoDispositivo.AR_CONDICIONADO: 'smart_home.dispositivos.arCondicionado:ArCondicionado',
+    TipoDispositivo.CAIXA_SOM: 'smart_home.dispositivos.caixaSom:CaixaSom',
+}
+
+
+def _nome_tipo(tipo) -> str:
+    # TipoDispositivo, o Enum de tipo de um plugin ou o nome (ex.: vindo da configuracao)
+    return tipo if isinstance(tipo, str) else tipo.name
+
+
+class RegistroTipos:
+    """Tipo de dispositivo -> classe, com o modulo da classe importado sob demanda.
+
+    Os tipos sao registrados como 'modulo:Classe' (ou direto pela classe);
+    classe() importa o modulo na primeira chamada para o tipo e guarda o
+    resultado. Tipos desconhecidos sao procurados nos entry points do grupo
+    GRUPO_ENTRY_POINTS, lidos uma unica vez, so quando preciso. Um tipo de
+    plugin fora de TipoDispositivo usa o proprio Enum; basta que `tipo.name`
+    seja o nome registrado.
+    """
+    def __init__(self, nativos: dict = None):
+        self._fabricas = {} # {nome do tipo: 'modulo:Classe' ou classe}
+        self._classes = {}  # {nome do tipo: classe ja importada}
+        self._entry_points_lidos = False
+        self._lock = RLock()
+        self.tempo_importacao = 0.0 # segundos importando modulos de tipos (classes, tabelas FSM e esquemas)
+        for tipo, caminho in (nativos or {}).items():
+            self.registrar(tipo, caminho)
+
+    def registrar(self, tipo, fabrica):
+        """Registra (ou substitui) a classe de um tipo: a propria classe ou 'modulo:Classe'."""
+        nome = _nome_tipo(tipo)
+        with self._lock:
+            self._fabricas[nome] = fabrica
+            self._classes.pop(nome, None)
+
+    def _ler_entry_points(self):
+        from importlib import metadata # importacao cara (~70ms): so quando algum tipo nao e nativo
+        self._entry_points_lidos = True
+        for entry_point in metadata.entry_points(group=GRUPO_ENTRY_POINTS):
+            self._fabricas.setdefault(entry_point.name, entry_point.value)
+
+    def classe(self, tipo):
+        """Classe do tipo, importando o modulo dela se ainda nao foi; ValueError se o tipo nao existe."""
+        nome = _nome_tipo(tipo)
+        classe = self._classes.get(nome)
+        if classe is not None:
+            return classe
+        with self._lock:
+            if nome not in self._fabricas and not self._entry_points_lidos:
+                self._ler_entry_points()
+            fabrica = self._fabricas.get(nome)
+            if fabrica is None:
+                raise ValueError(f"Tipo de dispositivo '{nome}' nao suportado.")
+            if isinstance(fabrica, str):
+                modulo, _, atributo = fabrica.partition(':')
+                inicio = time.perf_counter()
+                fabrica = getattr(importlib.import_module(modulo), atributo)
+                self.tempo_importacao += time.perf_counter() - inicio
+            self._classes[nome] = fabrica
+            return fabrica
+
+    def carregada(self, tipo):
+        """Classe do tipo se o modulo ja foi importado, senao None (nao importa nada)."""
+        return self._classes.get(_nome_tipo(tipo))
+
+    def nomes(self) -> list:
+        """Nomes de todos os tipos, incluindo os de entry points."""
+        with self._lock:
+            if not self._entry_points_lidos:
+                self._ler_entry_points()
+            return list(self._fabricas)
+
+
+TIPOS = RegistroTipos(_NATIVOS)
+
+
+def registrar_tipo(tipo, fabrica):
+    """Registra um tipo de dispositivo no registro global (ver RegistroTipos.registrar)."""
+    TIPOS.registrar(tipo, fabrica)
+
+
+def classe_do_tipo(tipo):
+    return TIPOS.classe(tipo)
+
+
+# benchmark: tempo de importacao e carga a frio, com uma configuracao so de luzes
+if __name__ == '__main__':
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    raiz = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    config = {'dispositivos': [{'id': f"luz_{i}", 'tipo': 'LUZ', 'nome': f"Luz {i}"} for i in range(n)], 'rotinas': {}}
+    # Cada medicao roda num interpretador novo, para pegar a importacao a frio
+    script = '''
+import json, sys, time
+inicio = time.perf_counter()
+if sys.argv[2] == 'todos':
+    import smart_home.dispositivos.porta, smart_home.dispositivos.luz, smart_home.dispositivos.tomada
+    import smart_home.dispositivos.termostato, smart_home.dispositivos.arCondicionado, smart_home.dispositivos.caixaSom
+from smart_home.core.hub import SmartHomeHub
+importado = time.perf_counter()
+hub = SmartHomeHub()
+hub.observers = []
+with open(sys.argv[1], encoding='utf-8') as f:
+    hub.carregar_configuracao(json.load(f))
+fim = time.perf_counter()
+print(json.dumps([importado - inicio, fim - inicio,
+                  sorted(m.rsplit('.', 1)[1] for m in sys.modules if m.startswith('smart_home.dispositivos.'))]))
+'''
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'configuracao.json')
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        os.makedirs(os.path.join(pasta, 'data')) # o Logger grava em data/eventos.csv
+        for modo in ('todos', 'sob demanda'):
+            medicoes = [json.loads(subprocess.run([sys.executable, '-c', script, caminho, modo], cwd=pasta,
+                                                  capture_output=True, text=True, check=True,
+                                                  env={**os.environ, 'PYTHONPATH': raiz}).stdout)
+                        for _ in range(7)]
+            importacao = min(m[0] for m in medicoes)
+            carga = min(m[1] for m in medicoes)
+            print(f"{modo:>12}: importacao {importacao * 1e3:.1f}ms | ate a configuracao carregada {carga * 1e3:.1f}ms "
+                  f"(melhor de 7) | modulos de dispositivos: {', '.join(medicoes[0][2])}")
@@ -0,0 +1,608 @@
+# agregadores de relatorios sobre o log de eventos
+import json
+import os
+from itertools import chain
+from abc import ABC, abstractmethod
+from datetime import datetime
+from enum import Enum
+from threading import Lock
+from smart_home.core import log_binario
+from smart_home.core.dispositivos import TipoDispositivo
+from smart_home.core.logger import FormatoLog
+from smart_home.core.segmentos import dividir_csv, ler_csv_com_inicio
+
+
+class BackendRelatorios(Enum):
+    """Como os agregadores consomem o log."""
+    PYTHON = "PYTHON" # evento a evento
+    NUMPY = "NUMPY"   # o trecho inteiro em colunas (relatorios_numpy); sem NumPy, cai no PYTHON
+
+
+class Agregador(ABC):
+    """Recebe os eventos do log, um a um, e acumula o estado de um relatorio.
+
+    O estado acumulado nao depende dos dispositivos cadastrados: o filtro por
+    tipo so e aplicado em resultado(), para que o estado possa ser salvo e
+    retomado mesmo que o hub mude entre uma leitura e outra.
+    """
+    nome = None
+    colunas = ()       # campos de cada linha do relatorio (ver linhas() e exportacao)
+    campos_estado = ()
+    inicio_periodo = None # janela [inicio_periodo, fim_periodo) em ISO; None = todo o log
+    fim_periodo = None
+
+    def __init__(self, dispositivos: dict):
+        self.dispositivos = dispositivos
+
+    def definir_periodo(self, inicio: str = None, fim: str = None):
+        """Limita o relatorio a uma janela; quem alimenta o agregador passa so os eventos dela."""
+        self.inicio_periodo = inicio
+        self.fim_periodo = fim
+
+    def _do_tipo(self, dev_id: str, tipo: TipoDispositivo) -> bool:
+        device = self.dispositivos.get(dev_id)
+        return device is not None and device.tipo == tipo
+
+    def exportar_estado(self) -> dict:
+        return {campo: getattr(self, campo) for campo in self.campos_estado}
+
+    def restaurar_estado(self, estado: dict):
+        for campo in self.campos_estado:
+            setattr(self, campo, estado[campo])
+
+    @abstractmethod
+    def processar(self, event: dict):
+        pass
+
+    def processar_colunas(self, colunas):
+        """Equivalente vetorizado de processar para um trecho inteiro do log (ver relatorios_numpy)."""
+        raise NotImplementedError
+
+    # Processamento em fatias (ver MotorRelatorios.alimentar_em_processos): um agregador novo
+    # processa uma fatia do log sem saber o que veio antes dela e exporta um estado parcial,
+    # que o agregador principal mescla na ordem do log.
+
+    def processar_parcial(self, event: dict):
+        self.processar(event)
+
+    def exportar_parcial(self) -> dict:
+        return self.exportar_estado()
+
+    def mesclar(self, parcial: dict):
+        """Aplica o estado parcial de uma fatia como se os eventos dela fossem processados agora."""
+        raise NotImplementedError
+
+    def depende_do_instante(self) -> bool:
+        """True se o resultado muda com o tempo mesmo sem eventos novos (ver CacheRelatorios)."""
+        return False
+
+    def dispositivos_lidos(self) -> frozenset:
+        """Ids dos dispositivos cujos atributos entram no resultado (ver CacheRelatorios.invalidar_dispositivos)."""
+        return frozenset()
+
+    @abstractmethod
+    def linhas(self):
+        """Gera as linhas (dicts com `colunas`) do relatorio sob demanda, sem montar a lista inteira."""
+        pass
+
+    def resultado(self):
+        return list(self.linhas())
+
+
+class AgregadorIntervalos(Agregador):
+    """Soma o tempo entre um evento de inicio e um de fim (ex.: ligar/desligar)."""
+    tipo = None
+    evento_inicio = None
+    evento_fim = None
+    registra_sem_intervalo = True # dispositivo entra no relatorio ao aparecer no log, mesmo sem intervalo
+    campos_estado = ('inicio', 'segundos')
+
+    def __init__(self, dispositivos: dict):
+        super().__init__(dispositivos)
+        self.inicio = {}   # {dev_id: timestamp ISO do ultimo inicio em aberto}
+        self.segundos = {} # {dev_id: total de segundos em intervalos fechados}
+        self._posicao = 0  # estado parcial (processar_parcial): eventos vistos na fatia,
+        self._registrados = {} # dispositivos na ordem em que apareceram
+        self._fatia = {}   # e o resumo dos intervalos de cada dispositivo
+
+    @staticmethod
+    def _duracao(inicio: str, fim: str) -> float:
+        return (datetime.fromisoformat(fim) - datetime.fromisoformat(inicio)).total_seconds()
+
+    def processar(self, event: dict):
+        dev_id = event['id_dispositivo']
+        self._registrar(dev_id)
+        if event['sucesso'] != 'True':
+            return
+        if event['evento'] == self.evento_inicio:
+            self.inicio[dev_id] = event['timestamp']
+        elif event['evento'] == self.evento_fim and self.inicio.get(dev_id):
+            duracao = self._duracao(self.inicio[dev_id], event['timestamp'])
+            self.segundos[dev_id] = self.segundos.get(dev_id, 0.0) + duracao
+            self.inicio[dev_id] = None
+
+    def processar_parcial(self, event: dict):
+        # Por dispositivo: o primeiro fim antes de qualquer inicio (fecha um intervalo aberto numa
+        # fatia anterior, se houver), as posicoes da primeira abertura e do primeiro fechamento,
+        # os segundos fechados dentro da fatia e o inicio ainda aberto no fim dela
+        posicao = self._posicao
+        self._posicao += 1
+        dev_id = event['id_dispositivo']
+        if self.registra_sem_intervalo:
+            self._registrados.setdefault(dev_id)
+        if event['sucesso'] != 'True' or event['evento'] not in (self.evento_inicio, self.evento_fim):
+            return
+        fatia = self._fatia.get(dev_id)
+        if fatia is None:
+            fatia = self._fatia[dev_id] = {'fim_inicial': None, 'abertura': None, 'fechamento': None,
+                                           'segundos': 0.0, 'aberto': None}
+        if event['evento'] == self.evento_inicio:
+            if fatia['abertura'] is None:
+                fatia['abertura'] = posicao
+            fatia['aberto'] = event['timestamp']
+        elif fatia['aberto']:
+            fatia['segundos'] += self._duracao(fatia['aberto'], event['timestamp'])
+            if fatia['fechamento'] is None:
+                fatia['fechamento'] = posicao
+            fatia['aberto'] = None
+        elif fatia['abertura'] is None and fatia['fim_inicial'] is None:
+            fatia['fim_inicial'] = (posicao, event['timestamp'])
+
+    def exportar_parcial(self) -> dict:
+        return {'registrados': list(self._registrados), 'dispositivos': self._fatia}
+
+    def mesclar(self, parcial: dict):
+        for dev_id in parcial['registrados']:
+            self._registrar(dev_id)
+        fechamentos, aberturas, finais = [], [], {}
+        for dev_id, fatia in parcial['dispositivos'].items():
+            segundos, primeiro = fatia['segundos'], fatia['fechamento']
+            if fatia['fim_inicial'] is not None and self.inicio.get(dev_id):
+                posicao, timestamp = fatia['fim_inicial']
+                segundos += self._duracao(self.inicio[dev_id], timestamp)
+                primeiro = posicao
+            if primeiro is not None:
+                fechamentos.append((primeiro, dev_id, segundos))
+            if fatia['abertura'] is not None:
+                aberturas.append((fatia['abertura'], dev_id))
+            if fatia['aberto'] or primeiro is not None:
+                finais[dev_id] = fatia['aberto']
+        # Chaves novas entram na mesma ordem em que processar as criaria
+        for _, dev_id, segundos in sorted(fechamentos):
+            self.segundos[dev_id] = self.segundos.get(dev_id, 0.0) + segundos
+        for _, dev_id in sorted(aberturas):
+            self.inicio.setdefault(dev_id, None)
+        self.inicio.update(finais)
+
+    def processar_colunas(self, colunas):
+        from smart_home.core import relatorios_numpy
+        relatorios_numpy.somar_intervalos(self, colunas)
+
+    def _registrar(self, dev_id: str):
+        if self.registra_sem_intervalo:
+            self.segundos.setdefault(dev_id, 0.0)
+
+    def abrir_intervalo(self, dev_id: str):
+        """Marca o dispositivo como ja em um intervalo no comeco da janela (cortado em inicio_periodo)."""
+        self._registrar(dev_id)
+        self.inicio[dev_id] = self.inicio_periodo
+
+    def depende_do_instante(self) -> bool:
+        # Intervalos abertos contam ate agora, a menos que a janela ja tenha terminado
+        return (any(self.inicio.values())
+                and (self.fim_periodo is None or datetime.fromisoformat(self.fim_periodo) > datetime.now()))
+
+    def _segundos_totais(self):
+        """Gera (dev_id, segundos) dos dispositivos do tipo, com os intervalos abertos contando ate agora (ou ate o fim da janela)."""
+        agora = datetime.now()
+        if self.fim_periodo is not None:
+            agora = min(agora, datetime.fromisoformat(self.fim_periodo))
+        abertos = (dev_id for dev_id, inicio in self.inicio.items() if inicio and dev_id not in self.segundos)
+        for dev_id in chain(self.segundos, abertos):
+            if self._do_tipo(dev_id, self.tipo):
+                inicio = self.inicio.get(dev_id)
+                aberto = max((agora - datetime.fromisoformat(inicio)).total_seconds(), 0.0) if inicio else 0.0
+                yield dev_id, self.segundos.get(dev_id, 0.0) + aberto
+
+
+class AgregadorConsumoTomadas(AgregadorIntervalos):
+    nome = 'consumo_tomadas'
+    colunas = ('id_dispositivo', 'total_wh')
+    tipo = TipoDispositivo.TOMADA
+    evento_inicio = 'ligar'
+    evento_fim = 'desligar'
+    registra_sem_intervalo = False # so entram no relatorio tomadas com ao menos um intervalo fechado
+
+    def depende_do_instante(self) -> bool:
+        return self.fim_periodo is not None and super().depende_do_instante()
+
+    def dispositivos_lidos(self) -> frozenset:
+        # potencia_w de cada tomada no relatorio (o estado guarda ids de todos os tipos)
+        return frozenset(dev_id for dev_id in chain(self.segundos, self.inicio) if self._do_tipo(dev_id, self.tipo))
+
+    def linhas(self):
+        # Numa janela, o intervalo que passa do fim dela conta ate o fim
+        if self.fim_periodo is not None:
+            segundos = self._segundos_totais()
+        else:
+            segundos = ((dev_id, total) for dev_id, total in self.segundos.items() if self._do_tipo(dev_id, self.tipo))
+        for dev_id, total in segundos:
+            yield {'id_dispositivo': dev_id, 'total_wh': self.dispositivos[dev_id].potencia_w * total / 3600}
+
+
+class AgregadorTempoLuzLigada(AgregadorIntervalos):
+    nome = 'tempo_luz_ligada'
+    colunas = ('id_dispositivo', 'tempo_total_horas')
+    tipo = TipoDispositivo.LUZ
+    evento_inicio = 'ligar'
+    evento_fim = 'desligar'
+
+    def linhas(self):
+        for dev_id, total in self._segundos_totais():
+            yield {'id_dispositivo': dev_id, 'tempo_total_horas': total / 3600}
+
+
+class AgregadorTempoCaixaSom(AgregadorIntervalos):
+    nome = 'tempo_tocando_caixa_som'
+    colunas = ('id_dispositivo', 'tempo_total_segundos')
+    tipo = TipoDispositivo.CAIXA_SOM
+    evento_inicio = 'tocar'
+    evento_fim = 'parar'
+
+    def linhas(self):
+        for dev_id, total in self._segundos_totais():
+            yield {'id_dispositivo': dev_id, 'tempo_total_segundos': total}
+
+
+class AgregadorModosArCondicionado(Agregador):
+    nome = 'modos_ar_condicionado'
+    colunas = ('modo', 'usos')
+    campos_estado = ('modos',)
+
+    def __init__(self, dispositivos: dict):
+        super().__init__(dispositivos)
+        self.modos = {} # {dev_id: {modo: contagem}}
+
+    def processar(self, event: dict):
+        if event['evento'] == 'alterar_modo' and event['sucesso'] == 'True':
+            # O estado_destino do evento 'alterar_modo' contém o novo modo
+            contagem = self.modos.setdefault(event['id_dispositivo'], {})
+            contagem[event['estado_destino']] = contagem.get(event['estado_destino'], 0) + 1
+
+    def processar_colunas(self, colunas):
+        from smart_home.core import relatorios_numpy
+        relatorios_numpy.contar_modos(self, colunas)
+
+    def mesclar(self, parcial: dict):
+        for dev_id, modos in parcial['modos'].items():
+            contagem = self.modos.setdefault(dev_id, {})
+            for modo, count in modos.items():
+                contagem[modo] = contagem.get(modo, 0) + count
+
+    def linhas(self):
+        for modo, count in self.resultado().items():
+            yield {'modo': modo, 'usos': count}
+
+    def resultado(self):
+        contagem = {}
+        for dev_id, modos in self.modos.items():
+            if self._do_tipo(dev_id, TipoDispositivo.AR_CONDICIONADO):
+                for modo, count in modos.items():
+                    contagem[modo] = contagem.get(modo, 0) + count
+        return contagem
+
+
+class AgregadorDispositivosMaisUsados(Agregador):
+    nome = 'dispositivos_mais_usados'
+    colunas = ('id_dispositivo', 'num_eventos')
+    campos_estado = ('contagem',)
+
+    def __init__(self, dispositivos: dict):
+        super().__init__(dispositivos)
+        self.contagem = {}
+
+    def processar(self, event: dict):
+        dev_id = event['id_dispositivo']
+        self.contagem[dev_id] = self.contagem.get(dev_id, 0) + 1
+
+    def processar_colunas(self, colunas):
+        from smart_home.core import relatorios_numpy
+        relatorios_numpy.contar_eventos(self, colunas)
+
+    def mesclar(self, parcial: dict):
+        for dev_id, count in parcial['contagem'].items():
+            self.contagem[dev_id] = self.contagem.get(dev_id, 0) + count
+
+    def linhas(self):
+        # So entram dispositivos que ainda existem
+        existentes = filter(lambda item: item[0] in self.dispositivos, self.contagem.items())
+        for dev_id, count in sorted(existentes, key=lambda item: item[1], reverse=True):
+            yield {'id_dispositivo': dev_id, 'num_eventos': count}
+
+
+AGREGADORES = [
+    AgregadorConsumoTomadas,
+    AgregadorTempoLuzLigada,
+    AgregadorTempoCaixaSom,
+    AgregadorModosArCondicionado,
+    AgregadorDispositivosMaisUsados,
+]
+
+
+def _processar_fatia(classes: list, binario: bool, arquivo: str, inicio: int, fim: int, ate: str = None):
+    """Executada em outro processo: estados parciais de agregadores novos para a faixa [inicio, fim) do arquivo.
+
+    Devolve (parciais, offset logo apos o ultimo evento lido, True se parou num evento em `ate`).
+    """
+    agregadores = [classe({}) for classe in classes]
+    processadores = [agregador.processar_parcial for agregador in agregadores]
+    if binario:
+        eventos = ((event, final - log_binario.TAMANHO_REGISTRO, final)
+                   for event, final in log_binario.ler_registros(arquivo, log_binario.TabelaStrings(), inicio))
+    else:
+        eventos = ler_csv_com_inicio(arquivo, inicio)
+    lido, parou = inicio, False
+    for event, comeco, final in eventos:
+        if comeco >= fim:
+            break
+        if ate is not None and event['timestamp'] >= ate:
+            parou = True
+            break
+        for processar in processadores:
+            processar(event)
+        lido = final
+    return [agregador.exportar_parcial() for agregador in agregadores], lido, parou
+
+
+class MotorRelatorios:
+    """Percorre o log uma unica vez alimentando varios agregadores ao mesmo tempo."""
+    def __init__(self, agregadores: list):
+        self.agregadores = agregadores
+
+    def alimentar(self, eventos):
+        processadores = [agregador.processar for agregador in self.agregadores]
+        for event in eventos:
+            for processar in processadores:
+                processar(event)
+
+    def alimentar_colunas(self, colunas):
+        for agregador in self.agregadores:
+            agregador.processar_colunas(colunas)
+
+    def alimentar_em_processos(self, logger, trechos: list, processos: int, ate: str = None):
+        """Divide os trechos [(arquivo, offset inicial)] em faixas de linhas inteiras e processa cada
+        faixa em um processo; os estados parciais sao mesclados na ordem do log.
+
+        Devolve (arquivo, offset) logo apos o ultimo evento lido, ou None.
+        """
+        logger.flush()
+        binario = logger.formato == FormatoLog.BINARIO
+        dividir = log_binario.dividir if binario else dividir_csv
+        trechos = [(arquivo, inicio) for arquivo, inicio in trechos if os.path.exists(arquivo)]
+        restantes = [max(os.path.getsize(arquivo) - inicio, 0) for arquivo, inicio in trechos]
+        total = sum(restantes) or 1
+        # Algumas faixas por processo, repartidas pelo tamanho de cada arquivo, equilibram a carga
+        faixas = [(arquivo, a, b) for (arquivo, inicio), restante in zip(trechos, restantes)
+                  for a, b in dividir(arquivo, inicio, max(1, round(processos * 4 * restante / total)))]
+        classes = [type(agregador) for agregador in self.agregadores]
+        from concurrent.futures import ProcessPoolExecutor # ~25ms: so quando ha mais de um processo
+        posicao = None
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = [executor.submit(_processar_fatia, classes, binario, arquivo, a, b, ate)
+                       for arquivo, a, b in faixas]
+            for (arquivo, _, _), futuro in zip(faixas, futuros):
+                parciais, lido, parou = futuro.result()
+                for agregador, parcial in zip(self.agregadores, parciais):
+                    agregador.mesclar(parcial)
+                posicao = (arquivo, lido)
+                if parou: # como na leitura sequencial, o resto do log e ignorado
+                    for restante in futuros:
+                        restante.cancel()
+                    break
+        return posicao
+
+    def alimentar_log(self, logger, trechos: list, ate: str = None,
+                      backend: BackendRelatorios = BackendRelatorios.PYTHON, processos: int = 1):
+        """Alimenta os agregadores com os trechos [(arquivo, offset inicial)] do log, ate o primeiro evento em `ate`.
+
+        Os eventos sao lidos em faixas por varios processos (processos > 1),
+        em colunas (backend NumPy) ou um a um. Devolve (arquivo, offset) logo
+        apos o ultimo evento lido, ou None se nenhum trecho foi lido.
+        """
+        if processos > 1 and self.paralelizavel():
+            return self.alimentar_em_processos(logger, trechos, processos, ate)
+        if self.vetorizado(backend):
+            from smart_home.core import relatorios_numpy
+            colunas = relatorios_numpy.carregar_colunas(logger, trechos, ate)
+            self.alimentar_colunas(colunas)
+            return colunas.fim
+        posicao = None
+        def eventos():
+            nonlocal posicao
+            for arquivo, inicio in trechos:
+                posicao = (arquivo, inicio)
+                for event, fim in logger.iter_events_com_offset(inicio, arquivo):
+                    if ate is not None and event['timestamp'] >= ate:
+                        return
+                    posicao = (arquivo, fim)
+                    yield event
+        self.alimentar(eventos())
+        return posicao
+
+    def vetorizado(self, backend: BackendRelatorios) -> bool:
+        """True se o backend pedido e o NumPy e ele pode ser usado (instalado e suportado por todos)."""
+        if BackendRelatorios(backend) != BackendRelatorios.NUMPY:
+            return False
+        # NumPy (~100ms de importacao) so e carregado quando o backend NUMPY e pedido
+        from smart_home.core import relatorios_numpy
+        return (relatorios_numpy.DISPONIVEL
+                and all(type(a).processar_colunas is not Agregador.processar_colunas for a in self.agregadores))
+
+    def paralelizavel(self) -> bool:
+        """True se todos os agregadores sabem mesclar estados parciais."""
+        return all(type(a).mesclar is not Agregador.mesclar for a in self.agregadores)
+
+    def resultados(self) -> dict:
+        return {agregador.nome: agregador.resultado() for agregador in self.agregadores}
+
+    def processar(self, eventos) -> dict:
+        self.alimentar(eventos)
+        return self.resultados()
+
+
+# Bytes antes da posicao salva que identificam o log ja lido (algumas linhas de evento)
+BYTES_IMPRESSAO = 512
+
+
+class EstadoRelatorios:
+    """Guarda o estado dos agregadores e a posicao do log ja consumida.
+
+    Como o log so cresce por append, a cada pedido de relatorio apenas a cauda
+    nova e lida. A posicao e o arquivo (o log unico ou o ultimo segmento lido)
+    e o offset dentro dele; com o log segmentado, a leitura segue pelos
+    segmentos seguintes. O estado e descartado se o arquivo foi truncado ou
+    substituido (inode diferente ou tamanho menor que o offset salvo) ou se
+    os bytes logo antes do offset mudaram (arquivo reescrito no lugar, que
+    voltou a crescer alem do offset).
+    Com caminho=None o estado fica apenas em memoria.
+    """
+    def __init__(self, caminho: str = 'data/relatorios.estado.json'):
+        self.caminho = caminho
+        self._estado = None
+        self._lock = Lock()
+
+    def _ler(self) -> dict:
+        if self._estado is None and self.caminho and os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, 'r', encoding='utf-8') as f:
+                    self._estado = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._estado = None # estado corrompido: recomeca do inicio do log
+        return self._estado
+
+    def _retomar(self, estado: dict, arquivos: list, agregadores: list):
+        """(indice em arquivos, offset) de onde continuar a leitura, ou None se o estado nao serve."""
+        if not estado or any(agregador.nome not in estado['agregadores'] for agregador in agregadores):
+            return None
+        arquivo = estado.get('arquivo')
+        if arquivo not in arquivos:
+            # Segmento ja apagado pela retencao: continua no primeiro segmento mais novo
+            for i, outro in enumerate(arquivos):
+                if os.path.dirname(outro) == os.path.dirname(arquivo) and os.path.basename(outro) > os.path.basename(arquivo):
+                    return i, 0
+            return None
+        try:
+            info = os.stat(arquivo)
+        except FileNotFoundError:
+            return None
+        if info.st_ino != estado['inode'] or info.st_size < estado['offset']:
+            return None
+        if estado.get('impressao') != self._impressao(arquivo, estado['offset']):
+            return None
+        return arquivos.index(arquivo), estado['offset']
+
+    @staticmethod
+    def _impressao(arquivo: str, offset: int) -> str:
+        """Hash dos BYTES_IMPRESSAO bytes do log logo antes de offset (os ultimos eventos ja lidos)."""
+        import hashlib # so na leitura de relatorios, fora da inicializacao
+        inicio = max(offset - BYTES_IMPRESSAO, 0)
+        with open(arquivo, 'rb') as f:
+            f.seek(inicio)
+            return hashlib.blake2b(f.read(offset - inicio), digest_size=16).hexdigest()
+
+    def _salvar(self, arquivo_log: str, agregadores: list, offset: int):
+        info = os.stat(arquivo_log)
+        self._estado = {
+            'arquivo': arquivo_log,
+            'inode': info.st_ino,
+            'offset': offset,
+            'impressao': self._impressao(arquivo_log, offset),
+            'agregadores': {agregador.nome: agregador.exportar_estado() for agregador in agregadores},
+        }
+        if not self.caminho:
+            return
+        os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self._estado, f)
+        os.replace(temporario, self.caminho)
+
+    def atualizar(self, logger, agregadores: list, backend: BackendRelatorios = BackendRelatorios.PYTHON,
+                  processos: int = 1):
+        """Restaura os agregadores, consome so a parte nova do log e salva o novo checkpoint."""
+        with self._lock:
+            arquivos = logger.arquivos_log()
+            if not arquivos:
+                return
+            estado = self._ler()
+            indice, offset = 0, 0
+            retomar = self._retomar(estado, arquivos, agregadores)
+            if retomar is not None:
+                indice, offset = retomar
+                for agregador in agregadores:
+                    agregador.restaurar_estado(estado['agregadores'][agregador.nome])
+
+            trechos = [(arquivos[i], offset if i == indice else 0) for i in range(indice, len(arquivos))]
+            try:
+                posicao = MotorRelatorios(agregadores).alimentar_log(logger, trechos, backend=backend,
+                                                                     processos=processos)
+            except Exception:
+                self._estado = None # estado em memoria ficou parcial; volta ao ultimo checkpoint salvo
+                raise
+            ultimo, fim = posicao or (arquivos[indice], offset)
+            if os.path.exists(ultimo):
+                self._salvar(ultimo, agregadores, fim)
+
+    def limpar(self):
+        """Descarta o checkpoint; o proximo relatorio rele o log inteiro."""
+        with self._lock:
+            self._estado = None
+            if self.caminho and os.path.exists(self.caminho):
+                os.remove(self.caminho)
+
+
+# benchmark: relatorios em varios processos
+if __name__ == '__main__':
+    import csv
+    import random
+    import sys
+    import tempfile
+    import time
+    from datetime import timedelta
+    from smart_home.core.logger import Logger
+    from smart_home.core.segmentos import CAMPOS
+    # Os processos recebem funcoes e classes por nome, entao usa as do modulo importado, nao as de __main__
+    from smart_home.core.relatorios import AGREGADORES, MotorRelatorios
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = os.path.join(pasta, 'eventos.csv')
+        inicio = datetime(2024, 1, 1)
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CAMPOS)
+            for i in range(n):
+                dev_id, eventos = random.choice([(f"luz_{random.randrange(300)}", ('ligar', 'desligar')),
+                                                 (f"tomada_{random.randrange(200)}", ('ligar', 'desligar')),
+                                                 (f"caixa_{random.randrange(50)}", ('tocar', 'parar'))])
+                sucesso = random.random() > 0.05
+                writer.writerow([(inicio + timedelta(seconds=i * 7)).isoformat(), dev_id, random.choice(eventos),
+                                 'off', 'on', sucesso, "" if sucesso else "falha"])
+        caminho_bin = os.path.join(pasta, 'eventos.bin')
+        log_binario.converter_csv_para_binario(caminho_csv, caminho_bin)
+
+        logger = Logger(caminho_csv)
+        print(f"{os.cpu_count()} CPUs, {n} eventos")
+        for caminho, formato in [(caminho_csv, FormatoLog.CSV), (caminho_bin, FormatoLog.BINARIO)]:
+            logger.filename, logger.formato = caminho, formato
+            referencia = None
+            for processos in sorted({1, 2, 4, os.cpu_count() or 1}):
+                agregadores = [agregador({}) for agregador in AGREGADORES]
+                t = time.perf_counter()
+                MotorRelatorios(agregadores).alimentar_log(logger, [(caminho, 0)], processos=processos)
+                tempo = time.perf_counter() - t
+                estado = [agregador.exportar_estado() for agregador in agregadores]
+                if referencia is None:
+                    referencia = (tempo, estado)
+                print(f"{formato.name:>8}: {processos} processo(s) {tempo:.2f}s ({referencia[0] / tempo:.1f}x) "
+                      f"| mesmo estado: {estado == referencia[1]}")
@@ -0,0 +1,268 @@
+# backend vetorizado (NumPy) dos relatorios: o log vira colunas e os agregadores
+# calculam o mesmo estado de relatorios.py com operacoes sobre arrays
+import csv
+import io
+import mmap
+import os
+from datetime import datetime, timedelta
+from smart_home.core import log_binario
+from smart_home.core.logger import FormatoLog
+
+try:
+    import numpy as np
+except ImportError: # NumPy e opcional: sem ele os relatorios usam o motor em Python puro
+    np = None
+
+DISPONIVEL = np is not None
+CAMPOS = log_binario.CAMPOS
+_EPOCA = datetime(1970, 1, 1)
+_BALDE_FUSO = 900 # mudancas de fuso horario acontecem em multiplos de 15 minutos
+
+if DISPONIVEL:
+    _SLOT = np.dtype([('tag', 'S1'), ('sucesso', 'u1'), ('livre', 'V2'), ('epoch', '<i8'),
+                      ('dispositivo', '<u4'), ('evento', '<u4'), ('origem', '<u4'),
+                      ('destino', '<u4'), ('erro', '<u4')])
+
+
+class Colunas:
+    """Trecho do log em arrays, uma posicao por evento, na ordem do log.
+
+    `tempo` e em segundos desde 1970-01-01 na hora local sem fuso (a mesma
+    aritmetica de datetime.fromisoformat nos timestamps do log). Dispositivo,
+    evento e estado de destino sao codigos em `strings`. `fim` e o
+    (arquivo, offset) logo apos o ultimo evento lido.
+    """
+    def __init__(self, tempo, dispositivo, evento, destino, sucesso, strings: list, fim: tuple):
+        self.tempo = tempo
+        self.dispositivo = dispositivo
+        self.evento = evento
+        self.destino = destino
+        self.sucesso = sucesso
+        self.strings = strings
+        self.fim = fim
+        self._codigos = {texto: i for i, texto in enumerate(strings)}
+
+    def __len__(self):
+        return len(self.tempo)
+
+    def codigo(self, texto: str) -> int:
+        """Codigo da string, ou -1 se ela nao aparece no trecho."""
+        return self._codigos.get(texto, -1)
+
+    def por_primeira_ocorrencia(self, codigos, posicoes):
+        """(codigos distintos, quantas vezes cada um aparece), na ordem da primeira ocorrencia no log.
+
+        `posicoes` e a posicao no log de cada item de `codigos`; dentro de um
+        mesmo codigo, os itens devem estar em ordem de log.
+        """
+        unicos, primeira, contagens = np.unique(codigos, return_index=True, return_counts=True)
+        ordem = np.argsort(posicoes[primeira], kind='stable')
+        return unicos[ordem].tolist(), contagens[ordem].tolist()
+
+
+def _segundos(timestamp: str) -> int:
+    return int((datetime.fromisoformat(timestamp) - _EPOCA).total_seconds())
+
+
+def _iso(segundos: int) -> str:
+    return (_EPOCA + timedelta(seconds=segundos)).isoformat(timespec='seconds')
+
+
+def _hora_local(epoch):
+    # epoch UTC -> segundos na hora local, como datetime.fromtimestamp; um calculo de fuso por balde
+    if not len(epoch):
+        return epoch
+    baldes, inverso = np.unique(epoch // _BALDE_FUSO, return_inverse=True)
+    deslocamentos = np.array([_segundos(datetime.fromtimestamp(balde * _BALDE_FUSO).isoformat()) - balde * _BALDE_FUSO
+                              for balde in baldes.tolist()], dtype=np.int64)
+    return epoch + deslocamentos[inverso]
+
+
+def _ler_csv(arquivo: str, inicio: int):
+    with open(arquivo, 'rb') as f:
+        f.seek(inicio)
+        dados = f.read()
+    dados = dados[:dados.rfind(b'\n') + 1] # linha incompleta, ainda sendo escrita
+    rows = [row for row in csv.reader(io.StringIO(dados.decode('utf-8'))) if row != CAMPOS]
+    fim = inicio + len(dados)
+    if not rows:
+        return None, fim
+    ids = {}
+    codigos = [np.fromiter((ids.setdefault(row[i], len(ids)) for row in rows), dtype=np.int64, count=len(rows))
+               for i in (1, 2, 4)] # dispositivo, evento, destino
+    tempo = np.array([row[0] for row in rows], dtype='datetime64[s]').astype(np.int64)
+    sucesso = np.array([row[5] == 'True' for row in rows], dtype=bool)
+    return (tempo, *codigos, sucesso, list(ids)), fim
+
+
+def _ler_binario(arquivo: str, inicio: int):
+    with open(arquivo, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        log_binario._verificar_cabecalho(mm, arquivo)
+        tabela = log_binario.TabelaStrings()
+        inicio = max(inicio, len(log_binario.CABECALHO))
+        # percorrer para no comeco de um bloco incompleto: nada depois dele e lido
+        limite = tabela.percorrer(mm, len(log_binario.CABECALHO), len(mm))
+        n = max(limite - inicio, 0) // log_binario.TAMANHO_REGISTRO
+        slots = np.frombuffer(mm, dtype=_SLOT, count=n, offset=inicio)
+        registros = slots[slots['tag'] == b'E'] # copia: o mmap pode ser fechado
+        del slots
+    fim = inicio + n * log_binario.TAMANHO_REGISTRO
+    if not len(registros):
+        return None, fim
+    return (_hora_local(registros['epoch'].astype(np.int64)), registros['dispositivo'].astype(np.int64),
+            registros['evento'].astype(np.int64), registros['destino'].astype(np.int64),
+            registros['sucesso'].astype(bool), tabela.strings), fim
+
+
+def carregar_colunas(logger, trechos, ate=None) -> Colunas:
+    """Le os `trechos` [(arquivo, offset inicial), ...] do log em colunas.
+
+    Com `ate` (ISO), a leitura para no primeiro evento em `ate` ou depois,
+    como Logger.iter_events.
+    """
+    logger.flush()
+    ler = _ler_binario if logger.formato == FormatoLog.BINARIO else _ler_csv
+    ids = {}
+    partes = []
+    fim = None
+    for arquivo, inicio in trechos:
+        if not os.path.exists(arquivo):
+            continue
+        parte, offset = ler(arquivo, inicio)
+        fim = (arquivo, offset)
+        if parte is None:
+            continue
+        *colunas, sucesso, locais = parte
+        traducao = np.array([ids.setdefault(texto, len(ids)) for texto in locais], dtype=np.int64)
+        partes.append((colunas[0], *(traducao[codigos] for codigos in colunas[1:]), sucesso))
+    if partes:
+        tempo, dispositivo, evento, destino, sucesso = (np.concatenate(coluna) for coluna in zip(*partes))
+    else:
+        tempo = dispositivo = evento = destino = np.zeros(0, dtype=np.int64)
+        sucesso = np.zeros(0, dtype=bool)
+    if ate is not None:
+        depois = np.flatnonzero(tempo >= _segundos(ate))
+        if len(depois):
+            corte = depois[0]
+            tempo, dispositivo, evento, destino, sucesso = (coluna[:corte] for coluna in
+                                                             (tempo, dispositivo, evento, destino, sucesso))
+    return Colunas(tempo, dispositivo, evento, destino, sucesso, list(ids), fim)
+
+
+def somar_intervalos(agregador, colunas: Colunas):
+    """AgregadorIntervalos.processar aplicado a todas as colunas de uma vez."""
+    if agregador.registra_sem_intervalo and len(colunas):
+        for codigo in colunas.por_primeira_ocorrencia(colunas.dispositivo, np.arange(len(colunas)))[0]:
+            agregador._registrar(colunas.strings[codigo])
+
+    codigo_inicio, codigo_fim = colunas.codigo(agregador.evento_inicio), colunas.codigo(agregador.evento_fim)
+    relevantes = np.flatnonzero(colunas.sucesso & ((colunas.evento == codigo_inicio) | (colunas.evento == codigo_fim)))
+    # Agrupa por dispositivo mantendo a ordem do log dentro de cada um
+    relevantes = relevantes[np.argsort(colunas.dispositivo[relevantes], kind='stable')]
+    dispositivo = colunas.dispositivo[relevantes]
+    tempo = colunas.tempo[relevantes]
+    abre = colunas.evento[relevantes] == codigo_inicio
+    if not len(relevantes):
+        return
+
+    # Evento anterior de cada evento no mesmo dispositivo; o primeiro de cada um
+    # usa o intervalo em aberto que o agregador ja tinha (checkpoint ou janela)
+    mesmo = dispositivo[1:] == dispositivo[:-1]
+    anterior_abre = np.zeros(len(relevantes), dtype=bool)
+    anterior_tempo = np.zeros(len(relevantes), dtype=np.int64)
+    anterior_abre[1:] = abre[:-1] & mesmo
+    anterior_tempo[1:] = tempo[:-1]
+    primeiros = np.flatnonzero(np.r_[True, ~mesmo])
+    for i in primeiros.tolist():
+        aberto = agregador.inicio.get(colunas.strings[dispositivo[i]])
+        if aberto:
+            anterior_abre[i] = True
+            anterior_tempo[i] = _segundos(aberto)
+
+    fecha = ~abre & anterior_abre
+    if fecha.any():
+        fechados = dispositivo[fecha]
+        totais = np.bincount(fechados, weights=(tempo[fecha] - anterior_tempo[fecha]).astype(np.float64),
+                             minlength=len(colunas.strings))
+        for codigo in colunas.por_primeira_ocorrencia(fechados, relevantes[fecha])[0]:
+            dev_id = colunas.strings[codigo]
+            agregador.segundos[dev_id] = agregador.segundos.get(dev_id, 0.0) + float(totais[codigo])
+    com_fechamento = set(np.unique(dispositivo[fecha]).tolist())
+
+    # Mesma ordem de chaves de processar: cada dispositivo entra em `inicio` no seu primeiro evento de inicio
+    for codigo in colunas.por_primeira_ocorrencia(dispositivo[abre], relevantes[abre])[0]:
+        agregador.inicio.setdefault(colunas.strings[codigo], None)
+    for i in np.flatnonzero(np.r_[~mesmo, True]).tolist(): # ultimo evento de cada dispositivo
+        codigo = int(dispositivo[i])
+        if abre[i]:
+            agregador.inicio[colunas.strings[codigo]] = _iso(int(tempo[i]))
+        elif codigo in com_fechamento:
+            agregador.inicio[colunas.strings[codigo]] = None
+
+
+def contar_modos(agregador, colunas: Colunas):
+    """AgregadorModosArCondicionado.processar aplicado a todas as colunas de uma vez."""
+    linhas = np.flatnonzero(colunas.sucesso & (colunas.evento == colunas.codigo('alterar_modo')))
+    if not len(linhas):
+        return
+    n = len(colunas.strings)
+    pares = colunas.dispositivo[linhas] * n + colunas.destino[linhas]
+    for par, quantidade in zip(*colunas.por_primeira_ocorrencia(pares, linhas)):
+        contagem = agregador.modos.setdefault(colunas.strings[par // n], {})
+        modo = colunas.strings[par % n]
+        contagem[modo] = contagem.get(modo, 0) + quantidade
+
+
+def contar_eventos(agregador, colunas: Colunas):
+    """AgregadorDispositivosMaisUsados.processar aplicado a todas as colunas de uma vez."""
+    if not len(colunas):
+        return
+    for codigo, quantidade in zip(*colunas.por_primeira_ocorrencia(colunas.dispositivo, np.arange(len(colunas)))):
+        dev_id = colunas.strings[codigo]
+        agregador.contagem[dev_id] = agregador.contagem.get(dev_id, 0) + quantidade
+
+
+# benchmark: agregadores evento a evento x vetorizados, log CSV e binario
+if __name__ == '__main__':
+    import random
+    import sys
+    import tempfile
+    import time
+    from smart_home.core.logger import Logger
+    from smart_home.core.relatorios import AGREGADORES, MotorRelatorios
+
+    if not DISPONIVEL:
+        sys.exit("NumPy nao instalado.")
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = os.path.join(pasta, 'eventos.csv')
+        inicio = datetime(2024, 1, 1)
+        with open(caminho_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CAMPOS)
+            for i in range(n):
+                dev_id, eventos = random.choice([(f"luz_{random.randrange(300)}", ('ligar', 'desligar')),
+                                                 (f"tomada_{random.randrange(200)}", ('ligar', 'desligar')),
+                                                 (f"caixa_{random.randrange(50)}", ('tocar', 'parar'))])
+                sucesso = random.random() > 0.05
+                writer.writerow([(inicio + timedelta(seconds=i * 7)).isoformat(), dev_id, random.choice(eventos),
+                                 'off', 'on', sucesso, "" if sucesso else "falha"])
+        caminho_bin = os.path.join(pasta, 'eventos.bin')
+        log_binario.converter_csv_para_binario(caminho_csv, caminho_bin)
+
+        logger = Logger(caminho_csv)
+        for caminho, formato in [(caminho_csv, FormatoLog.CSV), (caminho_bin, FormatoLog.BINARIO)]:
+            logger.filename, logger.formato = caminho, formato
+            estados = []
+            tempos = []
+            for vetorizado in (False, True):
+                agregadores = [agregador({}) for agregador in AGREGADORES]
+                t = time.perf_counter()
+                if vetorizado:
+                    MotorRelatorios(agregadores).alimentar_colunas(carregar_colunas(logger, [(caminho, 0)]))
+                else:
+                    MotorRelatorios(agregadores).alimentar(logger.iter_events())
+                tempos.append(time.perf_counter() - t)
+                estados.append([agregador.exportar_estado() for agregador in agregadores])
+            print(f"{formato.name:>8}: {n} eventos | Python {tempos[0]:.2f}s | NumPy {tempos[1]:.2f}s "
+                  f"({tempos[0] / tempos[1]:.1f}x) | mesmo estado: {estados[0] == estados[1]}")
@@ -0,0 +1,335 @@
+# log de eventos dividido em segmentos por periodo, com rotacao e retencao
+import csv
+import datetime
+import io
+import json
+import os
+import re
+from enum import Enum
+from smart_home.core import log_binario
+
+CAMPOS = log_binario.CAMPOS
+_INICIO_EVENTO = re.compile(rb'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d,') # comeco de uma linha de evento no CSV
+
+
+class Particao(Enum):
+    """Periodo coberto por cada segmento (alem do limite de tamanho)."""
+    DIA = 10     # tamanho do prefixo do timestamp ISO que identifica o periodo
+    HORA = 13
+    NENHUMA = 0  # so rotacao por tamanho
+
+
+def normalizar_instante(instante) -> str:
+    """Instante (datetime ou ISO) como ISO em segundos, o formato dos timestamps do log; None fica None."""
+    if instante is None or isinstance(instante, str):
+        return instante
+    return instante.isoformat(timespec='seconds')
+
+
+class LogSegmentado:
+    """Escreve o log em varios arquivos (segmentos) e mantem um manifesto deles.
+
+    Um segmento novo e aberto quando o periodo da particao muda ou quando o
+    atual passa de `max_bytes`. O manifesto (manifesto.json na pasta) guarda,
+    por segmento, o arquivo, o primeiro e o ultimo timestamp, o numero de
+    linhas e os ids de dispositivo presentes; os leitores usam essas
+    informacoes para pular segmentos fora de um intervalo ou dispositivo.
+    A retencao apaga segmentos fechados mais antigos que `retencao_dias` ou
+    alem dos `max_segmentos` mais recentes.
+
+    O manifesto e salvo a cada rotacao e em fechar(); ao reabrir a pasta, as
+    informacoes do ultimo segmento sao recalculadas a partir do arquivo.
+    """
+    def __init__(self, pasta: str, prefixo: str = 'eventos', binario: bool = False,
+                 particao: Particao = Particao.DIA, max_bytes: int = None,
+                 retencao_dias: float = None, max_segmentos: int = None):
+        self.pasta = pasta
+        self.prefixo = prefixo
+        self.binario = binario
+        self.extensao = '.bin' if binario else '.csv'
+        self.particao = Particao(particao)
+        self.max_bytes = max_bytes
+        self.retencao_dias = retencao_dias
+        self.max_segmentos = max_segmentos
+        self.caminho_manifesto = os.path.join(pasta, 'manifesto.json')
+        self.segmentos = [] # entradas do manifesto, do mais antigo ao atual
+        self._proximo = 0   # numero do proximo segmento, sempre crescente
+        self._arquivo = None
+        self._tabela = None # dicionario de strings do segmento atual (formato binario)
+        self._dispositivos = set() # ids do segmento atual
+        self._conjuntos = {} # {arquivo: set de ids} dos segmentos fechados, montado sob demanda
+        os.makedirs(pasta, exist_ok=True)
+        self._carregar_manifesto()
+
+    # --- Manifesto ---
+
+    def _carregar_manifesto(self):
+        if not os.path.exists(self.caminho_manifesto):
+            return
+        with open(self.caminho_manifesto, 'r', encoding='utf-8') as f:
+            manifesto = json.load(f)
+        self._proximo = manifesto['proximo']
+        self.segmentos = [s for s in manifesto['segmentos'] if os.path.exists(self.caminho(s))]
+        if self.segmentos:
+            # O ultimo segmento pode ter recebido linhas depois do ultimo salvamento
+            self._recalcular(self.segmentos[-1])
+
+    def salvar_manifesto(self):
+        if self.segmentos:
+            self.segmentos[-1]['dispositivos'] = sorted(self._dispositivos)
+        temporario = self.caminho_manifesto + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({'proximo': self._proximo, 'segmentos': self.segmentos}, f)
+        os.replace(temporario, self.caminho_manifesto)
+
+    def _recalcular(self, segmento: dict):
+        segmento.update(inicio=None, fim=None, linhas=0)
+        self._dispositivos = set()
+        for event, _ in self.ler(segmento):
+            self._registrar(segmento, [[event[campo] for campo in CAMPOS]])
+        segmento['bytes'] = os.path.getsize(self.caminho(segmento))
+
+    def _registrar(self, segmento: dict, rows: list):
+        # rows vem em ordem de gravacao: o primeiro e o ultimo definem a faixa de tempo
+        if segmento['inicio'] is None or rows[0][0] < segmento['inicio']:
+            segmento['inicio'] = rows[0][0]
+        if segmento['fim'] is None or rows[-1][0] > segmento['fim']:
+            segmento['fim'] = rows[-1][0]
+        segmento['linhas'] += len(rows)
+        self._dispositivos.update(row[1] for row in rows)
+
+    def caminho(self, segmento: dict) -> str:
+        return os.path.join(self.pasta, segmento['arquivo'])
+
+    # --- Escrita ---
+
+    def _chave(self, timestamp: str) -> str:
+        return timestamp[:self.particao.value]
+
+    def _abrir(self, chave: str):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+        if self.segmentos:
+            self.segmentos[-1]['dispositivos'] = sorted(self._dispositivos)
+        sufixo = f"-{chave.replace(':', '')}" if chave else ''
+        segmento = {'arquivo': f"{self.prefixo}-{self._proximo:06d}{sufixo}{self.extensao}", 'chave': chave,
+                    'inicio': None, 'fim': None, 'linhas': 0, 'bytes': 0, 'dispositivos': []}
+        self._proximo += 1
+        self.segmentos.append(segmento)
+        self._dispositivos = set()
+        self._arquivo = open(self.caminho(segmento), 'ab')
+        if self.binario:
+            self._arquivo.write(log_binario.CABECALHO)
+            self._tabela = log_binario.TabelaStrings()
+        else:
+            self._arquivo.write(','.join(CAMPOS).encode('utf-8') + b'\r\n')
+        segmento['bytes'] = self._arquivo.tell()
+        self.aplicar_retencao()
+        self.salvar_manifesto()
+
+    def _segmento_para(self, chave: str) -> dict:
+        atual = self.segmentos[-1] if self.segmentos else None
+        if (atual is None or atual['chave'] != chave
+                or (self.max_bytes and atual['linhas'] and atual['bytes'] >= self.max_bytes)):
+            self._abrir(chave)
+        elif self._arquivo is None:
+            # Retoma o ultimo segmento de uma execucao anterior
+            self._arquivo = open(self.caminho(atual), 'ab')
+            if self.binario:
+                self._tabela = log_binario.TabelaStrings.do_arquivo(self.caminho(atual))
+        return self.segmentos[-1]
+
+    def _codificar(self, rows: list) -> bytes:
+        if self.binario:
+            return log_binario.codificar(rows, self._tabela)
+        texto = io.StringIO()
+        csv.writer(texto).writerows(rows)
+        return texto.getvalue().encode('utf-8')
+
+    def gravar(self, rows: list):
+        """Grava as linhas, uma escrita por grupo de linhas consecutivas do mesmo periodo."""
+        inicio = 0
+        while inicio < len(rows):
+            chave = self._chave(rows[inicio][0])
+            fim = inicio + 1
+            while fim < len(rows) and self._chave(rows[fim][0]) == chave:
+                fim += 1
+            grupo = rows[inicio:fim]
+            segmento = self._segmento_para(chave)
+            self._arquivo.write(self._codificar(grupo))
+            segmento['bytes'] = self._arquivo.tell()
+            self._registrar(segmento, grupo)
+            inicio = fim
+
+    def flush(self, fsync: bool = False):
+        if self._arquivo is not None:
+            self._arquivo.flush()
+            if fsync:
+                os.fsync(self._arquivo.fileno())
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+        self.salvar_manifesto()
+
+    def aplicar_retencao(self):
+        """Apaga segmentos fechados fora da politica de retencao (o atual nunca e apagado)."""
+        fechados = self.segmentos[:-1]
+        apagar = set()
+        if self.retencao_dias is not None:
+            limite = normalizar_instante(datetime.datetime.now() - datetime.timedelta(days=self.retencao_dias))
+            apagar.update(i for i, s in enumerate(fechados) if s['fim'] is None or s['fim'] < limite)
+        if self.max_segmentos is not None and len(self.segmentos) > self.max_segmentos:
+            apagar.update(range(len(self.segmentos) - max(self.max_segmentos, 1)))
+        if not apagar:
+            return
+        for i in apagar:
+            for caminho in (self.caminho(self.segmentos[i]), self.caminho(self.segmentos[i]) + '.idx'):
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+        for i in apagar:
+            self._conjuntos.pop(self.segmentos[i]['arquivo'], None)
+        self.segmentos = [s for i, s in enumerate(self.segmentos) if i not in apagar]
+
+    # --- Leitura ---
+
+    def selecionar(self, desde=None, ate=None, dev_id: str = None) -> list:
+        """Segmentos que podem ter eventos em [desde, ate) e do dispositivo `dev_id`."""
+        desde, ate = normalizar_instante(desde), normalizar_instante(ate)
+        selecionados = []
+        for i, segmento in enumerate(self.segmentos):
+            atual = i == len(self.segmentos) - 1
+            if segmento['linhas'] == 0:
+                continue
+            if desde is not None and segmento['fim'] < desde:
+                continue
+            if ate is not None and segmento['inicio'] >= ate:
+                continue
+            if dev_id is not None and dev_id not in (self._dispositivos if atual else self._ids(segmento)):
+                continue
+            selecionados.append(segmento)
+        return selecionados
+
+    def _ids(self, segmento: dict) -> set:
+        ids = self._conjuntos.get(segmento['arquivo'])
+        if ids is None:
+            ids = self._conjuntos[segmento['arquivo']] = set(segmento['dispositivos'])
+        return ids
+
+    def ler(self, segmento: dict, inicio: int = 0, tabela: log_binario.TabelaStrings = None):
+        """Gera pares (evento, offset) de um segmento, a partir do byte `inicio`."""
+        caminho = self.caminho(segmento)
+        if self.binario:
+            yield from log_binario.ler_registros(caminho, tabela or log_binario.TabelaStrings(), inicio)
+        else:
+            yield from ler_csv(caminho, inicio)
+
+
+def ler_csv(caminho: str, inicio: int = 0):
+    """Gera pares (evento, offset em bytes logo apos a linha) de um CSV de log."""
+    for event, _, fim in ler_csv_com_inicio(caminho, inicio):
+        yield event, fim
+
+
+def ler_csv_com_inicio(caminho: str, inicio: int = 0):
+    """Como ler_csv, mas gera (evento, offset do inicio da linha, offset logo apos a linha)."""
+    if not os.path.exists(caminho):
+        return
+    with open(caminho, 'rb') as f:
+        f.seek(inicio)
+        posicao = inicio
+
+        def linhas():
+            nonlocal posicao
+            for linha in f:
+                if not linha.endswith(b'\n'):
+                    return # linha incompleta, ainda sendo escrita
+                posicao += len(linha)
+                yield linha.decode('utf-8')
+
+        anterior = inicio
+        for row in csv.reader(linhas()):
+            if row != CAMPOS: # cabecalho
+                yield dict(zip(CAMPOS, row)), anterior, posicao
+            anterior = posicao
+
+
+def ler_csv_em(caminho: str, offsets):
+    """Gera os eventos que comecam em cada um dos `offsets` (em ordem crescente) do CSV."""
+    with open(caminho, 'rb') as f:
+        def linhas():
+            for linha in f:
+                yield linha.decode('utf-8')
+
+        for offset in offsets:
+            f.seek(offset)
+            yield dict(zip(CAMPOS, next(csv.reader(linhas()))))
+
+
+def _linha_evento_em(f, pos: int):
+    # (offset, timestamp) da primeira linha de evento que comeca em pos ou depois;
+    # linhas de continuacao de um campo com quebra de linha sao puladas
+    f.seek(max(pos - 1, 0))
+    if pos > 0:
+        f.readline() # termina a linha em que pos - 1 caiu
+    while True:
+        inicio = f.tell()
+        linha = f.readline()
+        if not linha.endswith(b'\n'):
+            return inicio, None # fim do arquivo ou linha incompleta
+        if _INICIO_EVENTO.match(linha):
+            return inicio, linha[:19]
+
+
+def _fim_ultima_linha(f, tamanho: int) -> int:
+    # Offset logo apos o ultimo b'\n' (a linha final pode estar incompleta, ainda sendo escrita)
+    fim = tamanho
+    while fim > 0:
+        inicio = max(fim - 65536, 0)
+        f.seek(inicio)
+        i = f.read(fim - inicio).rfind(b'\n')
+        if i >= 0:
+            return inicio + i + 1
+        fim = inicio
+    return 0
+
+
+def offset_do_instante_csv(caminho: str, instante: str) -> int:
+    """Offset da primeira linha com timestamp >= `instante` (ISO), por busca binaria nos bytes do CSV.
+
+    Cada ponto da busca e realinhado no comeco da proxima linha de evento.
+    Supoe o log em ordem de tempo. Sem linha a partir do instante, devolve
+    o fim da ultima linha completa.
+    """
+    if not os.path.exists(caminho):
+        return 0
+    alvo = instante.encode('ascii')
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        inicio, fim = 0, tamanho
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            pos, timestamp = _linha_evento_em(f, meio)
+            if timestamp is None or timestamp >= alvo:
+                fim = meio
+            else:
+                inicio = pos + 1
+        return _linha_evento_em(f, inicio)[0]
+
+
+def dividir_csv(caminho: str, inicio: int, partes: int) -> list:
+    """Divide o CSV a partir de `inicio` em ate `partes` faixas [a, b) de bytes, cada uma comecando numa linha de evento."""
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        limites = [inicio]
+        for i in range(1, partes):
+            limite = _linha_evento_em(f, inicio + (tamanho - inicio) * i // partes)[0]
+            if limite > limites[-1]:
+                limites.append(limite)
+        fim = _fim_ultima_linha(f, tamanho)
+    limites.append(max(fim, limites[-1]))
+    return [(a, b) for a, b in zip(limites, limites[1:]) if b > a]
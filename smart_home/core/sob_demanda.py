@@ -0,0 +1,168 @@
+# dispositivos criados sob demanda, para casas grandes em que poucos dispositivos sao usados
+from threading import Lock
+
+_ATRIBUTOS_BASE = ('id', 'nome', 'tipo', '_estado_codigo')
+
+
+class _Molde:
+    """O que um registro precisa da classe do dispositivo: tipo, FSM, valores padrao e propriedades."""
+    __slots__ = ('classe', 'tipo', 'fsm', 'padroes', 'validadores', 'propriedades')
+
+    def __init__(self, classe):
+        # Um prototipo define o tipo e os valores padrao (como em colunar.ColunasTipo)
+        prototipo = classe('_prototipo', '')
+        self.classe = classe
+        self.tipo = prototipo.tipo
+        self.fsm = classe._fsm
+        self.padroes = {nome: valor for nome, valor in vars(prototipo).items() if nome not in _ATRIBUTOS_BASE}
+        self.validadores = classe.esquema.validadores # {atributo: ValidarInteiro/ValidarEnum}
+        self.propriedades = {} # {atributo: property}, ex.: ligado do ar-condicionado
+        for base in reversed(classe.__mro__):
+            for nome, valor in vars(base).items():
+                if isinstance(valor, property):
+                    self.propriedades[nome] = valor
+
+
+_MOLDES = {} # {classe: _Molde}
+
+
+class RegistroDispositivo:
+    """Dados de um dispositivo ainda nao usado: id, nome, estado e o dict de atributos da configuracao.
+
+    Le tipo, estado e atributos como o dispositivo (os nao configurados tem o
+    valor padrao da classe), entao listagens, relatorios e obter_configuracao
+    funcionam sem criar o objeto. Os atributos sao validados uma vez, por
+    EsquemaDispositivo.validar, e guardados sem copia. Comandos so existem
+    no dispositivo real, criado por materializar().
+    """
+    __slots__ = ('id', 'nome', '_molde', '_estado_codigo', '_atributos')
+
+    def __init__(self, dev_id: str, nome: str, classe, atributos: dict = None):
+        molde = _MOLDES.get(classe)
+        if molde is None:
+            molde = _MOLDES[classe] = _Molde(classe)
+        self.id = dev_id
+        self.nome = nome
+        self._molde = molde
+        self._estado_codigo = molde.fsm.inicial
+        self._atributos = atributos
+
+    @property
+    def classe(self):
+        return self._molde.classe
+
+    @property
+    def tipo(self):
+        return self._molde.tipo
+
+    @property
+    def esquema(self):
+        return self._molde.classe.esquema
+
+    @property
+    def comandos(self):
+        return self._molde.classe.comandos
+
+    @property
+    def estado(self):
+        return self._molde.fsm.estados[self._estado_codigo]
+
+    @estado.setter
+    def estado(self, value):
+        self._estado_codigo = self._molde.fsm.codigo(value)
+
+    def __getattr__(self, nome):
+        if nome in RegistroDispositivo.__slots__:
+            raise AttributeError(nome)
+        molde = self._molde
+        propriedade = molde.propriedades.get(nome)
+        if propriedade is not None:
+            return propriedade.__get__(self)
+        if self._atributos and nome in self._atributos:
+            validador = molde.validadores.get(nome)
+            valor = self._atributos[nome]
+            return validador.validar(valor) if validador is not None else valor # ex.: 'QUENTE' -> CorLuz.QUENTE
+        if nome in molde.padroes:
+            return molde.padroes[nome]
+        raise AttributeError(f"'{nome}' so esta disponivel no dispositivo '{self.id}' materializado.")
+
+    def materializar(self):
+        """Cria o dispositivo real com os mesmos dados."""
+        device = self._molde.classe(self.id, self.nome)
+        if self._atributos:
+            device.esquema.decodificar(device, self._atributos)
+        device._estado_codigo = self._estado_codigo
+        return device
+
+    def __repr__(self):
+        return f"{self.tipo.name}(id='{self.id}', nome='{self.nome}', estado='{self.estado}')"
+
+
+class ArmazemSobDemanda(dict):
+    """Substituto de `SmartHomeHub.dispositivos` que guarda RegistroDispositivo ate o primeiro uso.
+
+    E um dict {dev_id: registro ou dispositivo}: items(), values() e get()
+    devolvem o registro dos dispositivos ainda nao usados, sem cria-los.
+    materializar() troca o registro pelo dispositivo real, na mesma posicao.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.materializados = 0
+        self.ao_alterar = None # ligado em cada dispositivo criado (ver Dispositivo._ao_alterar)
+        self._lock = Lock()
+
+    def materializar(self, dev_id: str):
+        """Dispositivo real com este id (criado agora, se ainda era registro), ou None."""
+        device = self.get(dev_id)
+        if not isinstance(device, RegistroDispositivo):
+            return device
+        # Confere de novo sob o lock: duas threads no mesmo registro recebem o mesmo dispositivo
+        with self._lock:
+            device = self.get(dev_id)
+            if isinstance(device, RegistroDispositivo):
+                device = device.materializar()
+                device._ao_alterar = self.ao_alterar
+                self[dev_id] = device
+                self.materializados += 1
+        return device
+
+
+# benchmark: carga a frio e memoria de uma casa grande em que so 1% dos dispositivos e usado
+if __name__ == '__main__':
+    import gc
+    import os
+    import sys
+    import tempfile
+    import time
+    import tracemalloc
+    from smart_home.core.hub import SmartHomeHub
+    from smart_home.core.logger import Logger
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tipos = [('LUZ', 'off', {'brilho': 70, 'cor': 'QUENTE'}), ('TOMADA', 'on', {'potencia_w': 120}),
+             ('TERMOSTATO', 'aquecimento', {'temperatura': 22})]
+    config = {'dispositivos': [{'id': f"dev_{i}", 'tipo': tipos[i % 3][0], 'nome': f"Dispositivo {i}",
+                                'estado': tipos[i % 3][1], 'atributos': dict(tipos[i % 3][2])} for i in range(n)],
+              'rotinas': {}}
+    usados = [f"dev_{i}" for i in range(0, n, 100)]
+    with tempfile.TemporaryDirectory() as pasta:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        for sob_demanda in (False, True):
+            hub = SmartHomeHub(sob_demanda=sob_demanda)
+            hub.observers = []
+            gc.collect()
+            tracemalloc.start()
+            t = time.perf_counter()
+            hub.carregar_configuracao(config)
+            carga = time.perf_counter() - t
+            memoria = tracemalloc.get_traced_memory()[0]
+            t = time.perf_counter()
+            for dev_id in usados:
+                hub.obter_dispositivo(dev_id)
+            uso = time.perf_counter() - t
+            memoria_uso = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"{'sob demanda' if sob_demanda else 'imediato':>11}: carga de {n} em {carga * 1e3:.0f}ms, "
+                  f"{memoria / 2 ** 20:.1f} MiB | {len(usados)} usados em {uso * 1e3:.1f}ms, "
+                  f"{memoria_uso / 2 ** 20:.1f} MiB")
+            del hub
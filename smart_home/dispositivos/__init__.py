@@ -1,8 +1,20 @@
-from core.eventos import EventoDispositivo, EventoHub
-from core.hub import Hub
-from core.logger import Logger              
-from core.erros import ConfiguracaoInvalida
-from core.dispositivos import Dispositivo, TipoDispositivo
-from core.cli import CLI
-from core.observers import Observer
-from core.persistencia import Persistencia
\ No newline at end of file
+# Os modulos dos dispositivos sao importados sob demanda pelo registro de tipos (core/registro.py);
+# `from smart_home.dispositivos import Luz` tambem importa so o modulo da Luz.
+from smart_home.core.dispositivos import Dispositivo, TipoDispositivo
+from smart_home.core.erros import ValidacaoAtributo
+
+_CLASSES = {
+    'Porta': TipoDispositivo.PORTA,
+    'Luz': TipoDispositivo.LUZ,
+    'Tomada': TipoDispositivo.TOMADA,
+    'Termostato': TipoDispositivo.TERMOSTATO,
+    'ArCondicionado': TipoDispositivo.AR_CONDICIONADO,
+    'CaixaSom': TipoDispositivo.CAIXA_SOM,
+}
+
+
+def __getattr__(nome):
+    if nome in _CLASSES:
+        from smart_home.core.registro import TIPOS
+        return TIPOS.classe(_CLASSES[nome])
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
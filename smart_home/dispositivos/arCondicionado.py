@@ -1,58 +1,104 @@
 from smart_home.core.dispositivos import Dispositivo, TipoDispositivo, ValidarInteiro, ValidarEnum
 from smart_home.core.erros import TransicaoInvalida
-from transitions import Machine
+from enum import Enum
 
-from smart_home.core.eventos import EventoDispositivo
+class ModoArCondicionado(Enum):
+    FRIO = "FRIO"
+    QUENTE = "QUENTE"
+    VENTILAR = "VENTILAR"
 
-class ArCondicionado:
-    def __init__(self, id_dispositivo: str, temperatura: int = 24, ligado: bool = False, modo: str = "frio"):
-        self.id_dispositivo = id_dispositivo
-        self.temperatura = temperatura
-        self.ligado = ligado
-        self.modo = modo
+class ArCondicionado(Dispositivo):
+    temperatura = ValidarInteiro(min_val=16, max_val=30)
+    modo = ValidarEnum(ModoArCondicionado)
+    persistidos = ('temperatura', 'ligado', 'modo')
+    argumentos_comandos = {'nova_temp': 'temperatura', 'novo_modo': 'modo'}
+    # O evento de alterar_modo vai de modo a modo (ver AgregadorModosArCondicionado)
+    atributos_eventos = {'alterar_modo': 'modo'}
+
+    estados = ['desligado', 'ligado']
+    estado_inicial = 'desligado'
+    transicoes = [
+        {'trigger': 'ligar', 'source': 'desligado', 'dest': 'ligado'},
+        {'trigger': 'desligar', 'source': 'ligado', 'dest': 'desligado'},
+        {'trigger': 'alterar_temperatura', 'source': 'ligado', 'dest': None}, # Permanece no estado 'ligado'
+        {'trigger': 'alterar_modo', 'source': 'ligado', 'dest': None} # Permanece no estado 'ligado'
+    ]
+
+    def __init__(self, id: str, nome: str):
+        super().__init__(id, nome, TipoDispositivo.AR_CONDICIONADO)
+        # Definir valores iniciais via descritores
+        self.temperatura = 24
+        self.modo = ModoArCondicionado.FRIO
+
+    # Mantido por compatibilidade com configuracoes que salvam 'ligado'
+    @property
+    def ligado(self) -> bool:
+        return self.estado == 'ligado'
+
+    @ligado.setter
+    def ligado(self, value: bool):
+        self.estado = 'ligado' if value else 'desligado'
 
     def ligar(self):
-        if not self.ligado:
-            evento = EventoDispositivo(
-                id_dispositivo=self.id_dispositivo,
-                comando="ligar",
-                estado_origem="desligado",
-                estado_destino="ligado",
-                args={"temperatura": self.temperatura, "modo": self.modo}
-            )
-            self.ligado = True
-            return evento
+        try:
+            self.disparar('ligar')
+        except Exception as e:
+            raise TransicaoInvalida(f"Falha ao ligar ar condicionado: {e}")
 
     def desligar(self):
-        if self.ligado:
-            evento = EventoDispositivo(
-                id_dispositivo=self.id_dispositivo,
-                comando="desligar",
-                estado_origem="ligado",
-                estado_destino="desligado",
-                args={"temperatura": self.temperatura, "modo": self.modo}
-            )
-            self.ligado = False
-            return evento
+        try:
+            self.disparar('desligar')
+        except Exception as e:
+            raise TransicaoInvalida(f"Falha ao desligar ar condicionado: {e}")
 
     def alterar_temperatura(self, nova_temp: int):
-        evento = EventoDispositivo(
-            id_dispositivo=self.id_dispositivo,
-            comando="alterar_temperatura",
-            estado_origem=f"{self.temperatura}°C",
-            estado_destino=f"{nova_temp}°C",
-            args={"modo": self.modo}
-        )
-        self.temperatura = nova_temp
-        return evento
+        if self.estado != 'ligado':
+            raise TransicaoInvalida("Nao e possivel alterar a temperatura com o ar condicionado desligado.")
+        try:
+            self.temperatura = nova_temp # A validação ocorre via descritor
+            self.disparar('alterar_temperatura')
+        except Exception as e:
+            raise TransicaoInvalida(f"Falha ao alterar temperatura: {e}")
 
     def alterar_modo(self, novo_modo: str):
-        evento = EventoDispositivo(
-            id_dispositivo=self.id_dispositivo,
-            comando="alterar_modo",
-            estado_origem=self.modo,
-            estado_destino=novo_modo,
-            args={"temperatura": self.temperatura}
-        )
-        self.modo = novo_modo
-        return evento
\ No newline at end of file
+        if self.estado != 'ligado':
+            raise TransicaoInvalida("Nao e possivel alterar o modo com o ar condicionado desligado.")
+        try:
+            self.modo = novo_modo # validação com descriptor
+            self.disparar('alterar_modo')
+        except Exception as e:
+            raise TransicaoInvalida(f"Falha ao alterar modo: {e}")
+
+#teste
+if __name__ == '__main__':
+    ar = ArCondicionado("ar_quarto", "Ar do Quarto")
+    print(f"Estado inicial: {ar.estado}, Temperatura: {ar.temperatura}, Modo: {ar.modo.name}")
+    ar.ligar()
+    ar.alterar_temperatura(20)
+    ar.alterar_modo("QUENTE")
+    print(f"Temperatura: {ar.temperatura}, Modo: {ar.modo.name}")
+    try:
+        ar.alterar_temperatura(50)
+    except TransicaoInvalida as e:
+        print(f"Erro ao definir temperatura invalida: {e}")
+    ar.desligar()
+    print(f"Estado apos desligar: {ar.estado}")
+
+    # Cada troca de modo pelo hub conta no relatorio de modos com o modo novo
+    import os
+    import tempfile
+    from smart_home.core.hub import SmartHomeHub
+    from smart_home.core.logger import Logger
+    from smart_home.core.relatorios import EstadoRelatorios
+    with tempfile.TemporaryDirectory() as pasta:
+        Logger(os.path.join(pasta, 'eventos.csv'))
+        hub = SmartHomeHub()
+        hub.observers = []
+        hub.estado_relatorios = EstadoRelatorios(None)
+        hub.adicionar_dispositivo("ar_sala", TipoDispositivo.AR_CONDICIONADO, "Ar da Sala")
+        hub.executar_comando("ar_sala", "ligar")
+        for modo in ("QUENTE", "FRIO", "QUENTE"):
+            hub.executar_comando("ar_sala", "alterar_modo", novo_modo=modo)
+        modos = hub.gerar_relatorio_modos_ar_condicionado()
+        print(f"Relatorio de modos: {modos}")
+        assert modos == {'QUENTE': 2, 'FRIO': 1}, modos
@@ -1,65 +1,60 @@
 
-from transitions import Machine
-from core import Dispositivo, TipoDispositivo, ValidarInteiro
-from core.erros import TransicaoInvalida
+from smart_home.core.dispositivos import Dispositivo, TipoDispositivo, ValidarInteiro
+from smart_home.core.erros import TransicaoInvalida
 
 
 class CaixaSom(Dispositivo):
     volume = ValidarInteiro(min_val=0, max_val=100)
 
+    estados = ['desligado', 'ligado', 'tocando']
+    estado_inicial = 'desligado'
+    transicoes = [
+        {'trigger': 'ligar', 'source': 'desligado', 'dest': 'ligado'},
+        {'trigger': 'desligar', 'source': ['ligado', 'tocando'], 'dest': 'desligado'},
+        {'trigger': 'tocar', 'source': 'ligado', 'dest': 'tocando'},
+        {'trigger': 'parar', 'source': 'tocando', 'dest': 'ligado'},
+        {'trigger': 'aumentar_volume', 'source': ['ligado', 'tocando'], 'dest': None, 'after': 'incrementar_volume'},
+        {'trigger': 'diminuir_volume', 'source': ['ligado', 'tocando'], 'dest': None, 'after': 'decrementar_volume'}
+    ]
+
     def __init__(self, id: str, nome: str):
         super().__init__(id, nome, TipoDispositivo.CAIXA_SOM) 
-        self._volume = 50  # Valor padrão antes da validação
-        self._setup_fsm()
         self.volume = 50
 
-    def _setup_fsm(self):
-        states = ['desligado', 'ligado', 'tocando']
-        transitions = [
-            {'trigger': 'ligar', 'source': 'desligado', 'dest': 'ligado'},
-            {'trigger': 'desligar', 'source': ['ligado', 'tocando'], 'dest': 'desligado'},
-            {'trigger': 'tocar', 'source': 'ligado', 'dest': 'tocando'},
-            {'trigger': 'parar', 'source': 'tocando', 'dest': 'ligado'},
-            {'trigger': 'aumentar_volume', 'source': ['ligado', 'tocando'], 'dest': None, 'after': 'incrementar_volume'},
-            {'trigger': 'diminuir_volume', 'source': ['ligado', 'tocando'], 'dest': None, 'after': 'decrementar_volume'}
-        ]
-        self.machine = Machine(model=self, states=states, initial='desligado', transitions=transitions,
-                               after='on_enter_state', before='on_exit_state')
-
     # Métodos de comando: ligar/desligar/tocar/parar/...
     def ligar(self):
         try:
-            self.machine.ligar()
+            self.disparar('ligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao ligar caixa de som: {e}")
 
     def desligar(self):
         try:
-            self.machine.desligar()
+            self.disparar('desligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao desligar caixa de som: {e}")
 
     def tocar(self):
         try:
-            self.machine.tocar()
+            self.disparar('tocar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao iniciar reprodução: {e}")
 
     def parar(self):
         try:
-            self.machine.parar()
+            self.disparar('parar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao parar reprodução: {e}")
 
     def aumentar_volume(self):
         try:
-            self.machine.aumentar_volume()
+            self.disparar('aumentar_volume')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao aumentar volume: {e}")
 
     def diminuir_volume(self):
         try:
-            self.machine.diminuir_volume()
+            self.disparar('diminuir_volume')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao diminuir volume: {e}")
 
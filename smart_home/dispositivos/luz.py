@@ -1,5 +1,4 @@
 
-from transitions import Machine
 from enum import Enum
 
 from smart_home.core.dispositivos import Dispositivo, TipoDispositivo, ValidarEnum, ValidarInteiro
@@ -15,37 +14,31 @@ class Luz(Dispositivo):
     brilho = ValidarInteiro(min_val=0, max_val=100)
     cor = ValidarEnum(CorLuz)
 
+    estados = ['off', 'on']
+    estado_inicial = 'off'
+    transicoes = [
+        {'trigger': 'ligar', 'source': 'off', 'dest': 'on'},
+        {'trigger': 'desligar', 'source': 'on', 'dest': 'off'},
+        {'trigger': 'definir_brilho', 'source': 'on', 'dest': 'on'}, # Permanece no estado 'on'
+        {'trigger': 'definir_cor', 'source': 'on', 'dest': 'on'} # Permanece no estado 'on'
+    ]
+
     def __init__(self, id: str, nome: str):
             super().__init__(id, nome, TipoDispositivo.LUZ)
-            self._brilho = 0 # Valor padrão antes da validação
-            self._cor = CorLuz.NEUTRA # Valor padrão antes da validação
-            self._setup_fsm()
-            # Definir valores iniciais após a FSM ser configurada e descritores estarem prontos
+            # Definir valores iniciais via descritores
             self.brilho = 50
             self.cor = CorLuz.NEUTRA
 
-    def _setup_fsm(self):
-        estados = ['off', 'on']
-
-        transicoes = [
-            {'trigger': 'ligar', 'source': 'off', 'dest': 'on'},
-            {'trigger': 'desligar', 'source': 'on', 'dest': 'off'},
-            {'trigger': 'definir_brilho', 'source': 'on', 'dest': 'on'}, # Permanece no estado 'on'
-            {'trigger': 'definir_cor', 'source': 'on', 'dest': 'on'} # Permanece no estado 'on'
-        ]
-        self.machine = Machine(model=self, states=estados, initial='off', transitions=transicoes,
-                               after='on_enter_state', before='on_exit_state')
-    
     # Métodos ligar/desligar/definir_brilho
     def ligar(self):
         try:
-            self.machine.ligar()
+            self.disparar('ligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao ligar luz: {e}")
         
     def desligar(self):
         try:
-            self.machine.desligar()
+            self.disparar('desligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao desligar luz: {e}")
         
@@ -54,7 +47,7 @@ class Luz(Dispositivo):
             raise TransicaoInvalida("Nao e possivel definir brilho com a luz desligada.")
         try:
             self.brilho = brilho # A validação ocorre via descritor
-            self.machine.definir_brilho() # Dispara a transição para registrar o evento
+            self.disparar('definir_brilho') # Dispara a transição para registrar o evento
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao definir brilho: {e}")
         
@@ -63,7 +56,7 @@ class Luz(Dispositivo):
             raise TransicaoInvalida("Não e possivel definir cor com a luz desligada.")
         try:
             self.cor = cor # validação com descriptor
-            self.machine.definir_cor() # Dispara a transição para registrar o evento
+            self.disparar('definir_cor') # Dispara a transição para registrar o evento
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao definir cor: {e}")
         
@@ -1,28 +1,22 @@
 
 from smart_home.core.dispositivos import Dispositivo, TipoDispositivo
-from transitions import Machine
 from smart_home.core.erros import TransicaoInvalida
 
 #Porta herda de dispostivo
 class Porta(Dispositivo):
+    estados = ['trancada', 'destrancada', 'aberta']
+    estado_inicial = 'trancada'
+    transicoes = [
+        {'trigger': 'destrancar', 'source': 'trancada', 'dest': 'destrancada'},
+        {'trigger': 'trancar', 'source': 'destrancada', 'dest': 'trancada', 'before': 'check_if_closed'},
+        {'trigger': 'abrir', 'source': 'destrancada', 'dest': 'aberta'},
+        {'trigger': 'fechar', 'source': 'aberta', 'dest': 'destrancada'}
+    ]
+
     def __init__(self, id: str, nome: str):
         super().__init__(id, nome, TipoDispositivo.PORTA)
         self.tentativas_invalidas = 0
-        self._setup_fsm()
-
-    def _setup_fsm(self):
-        estados = ['trancada', 'destrancada', 'aberta']
 
-        transitions = [
-            {'trigger': 'destrancar', 'source': 'trancada', 'dest': 'destrancada'},
-            {'trigger': 'trancar', 'source': 'destrancada', 'dest': 'trancada', 'before': 'check_if_closed'},
-            {'trigger': 'abrir', 'source': 'destrancada', 'dest': 'aberta'},
-            {'trigger': 'fechar', 'source': 'aberta', 'dest': 'destrancada'}
-        ]
-
-        self.machine = Machine(model=self, states=estados, initial='trancada', transitions=transitions,
-                               after='on_enter_state', before='on_exit_state')
-        
     def check_if_closed(self):
         """Verifica se a porta está fechada antes de trancar."""
         if self.estado == 'aberta':
@@ -33,25 +27,25 @@ class Porta(Dispositivo):
     # Métodos destrancar/trancar/abrir/fechar
     def destrancar(self):
         try:
-            self.machine.destrancar()
+            self.disparar('destrancar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao destrancar porta: {e}")
         
     def trancar(self):
         try:
-            self.machine.trancar()
+            self.disparar('trancar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao trancar porta: {e}")
         
     def abrir(self):
         try:
-            self.machine.abrir()
+            self.disparar('abrir')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao abrir porta: {e}")
         
     def fechar(self):
         try:
-            self.machine.fechar()
+            self.disparar('fechar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao fechar porta: {e}")
 
@@ -1,27 +1,23 @@
 from smart_home.core.dispositivos import Dispositivo, TipoDispositivo, ValidarInteiro
 from smart_home.core.erros import TransicaoInvalida
-from transitions import Machine
 import datetime, time
 
 class Tomada(Dispositivo):
     potencia_w = ValidarInteiro(min_val=0)
+
+    estados = ['off', 'on']
+    estado_inicial = 'off'
+    transicoes = [
+        {'trigger': 'ligar', 'source': 'off', 'dest': 'on', 'after': 'on_ligar'},
+        {'trigger': 'desligar', 'source': 'on', 'dest': 'off', 'after': 'on_desligar'}
+    ]
+
     def __init__(self, id: str, nome: str):
         super().__init__(id, nome, TipoDispositivo.TOMADA)
-        self._potencia_w = 0 # Valor padrão antes da validação
         self.consumo_wh = 0.0
         self._tempo_ligada_inicio = None # Para calcular o consumo
-        self._setup_fsm()
         self.potencia_w = 0 # Define o valor inicial via descritor
 
-    def _setup_fsm(self):
-        estados = ['off', 'on']
-        transicoes = [
-            {'trigger': 'ligar', 'source': 'off', 'dest': 'on', 'after': 'on_ligar'},
-            {'trigger': 'desligar', 'source': 'on', 'dest': 'off', 'after': 'on_desligar'}
-        ]
-        self.machine = Machine(model=self, states=estados, initial='off', transitions=transicoes,
-                               after_='on_enter_state', before='on_exit_state')
-        
     def on_ligar(self):
         """Registra o tempo de início quando a tomada é ligada."""
         self._tempo_ligada_inicio = datetime.datetime.now()
@@ -39,12 +35,12 @@ class Tomada(Dispositivo):
     # Métodos ligar/desligar
     def ligar(self):
         try:
-            self.machine.ligar()
+            self.disparar('ligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao ligar tomada: {e}")
     def desligar(self):
         try:
-            self.machine.desligar()
+            self.disparar('desligar')
         except Exception as e:
             raise TransicaoInvalida(f"Falha ao desligar tomada: {e}")
 